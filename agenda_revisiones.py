@@ -0,0 +1,154 @@
+"""
+AGENDA DE REVISIONES DEL MANIFIESTO
+Guarda, para cada libro del manifiesto, el día en que su fecha más próxima
+entra en la ventana de alerta, en una cola de prioridad (montículo) por
+fecha. En cada ejecución solo se descargan y escanean los libros que ya
+vencen, los nuevos y los que han cambiado; el resto no se toca hasta su día
+"""
+
+from datetime import date, timedelta
+import hashlib
+import heapq
+import json
+import os
+
+from bitacora import log
+
+RUTA_AGENDA = os.environ.get('RUTA_AGENDA', '.cache_alertas/agenda_revisiones.json')
+# Aunque no tenga nada cerca, cada libro se revisa al menos cada tantos días (cambios en Drive)
+REVISION_MAXIMA = int(os.environ.get('REVISION_MAXIMA_DIAS', '7'))
+
+def firma_entrada(entrada, ruta_local):
+    """
+    Lo que cambia cuando cambia el libro: tamaño y sha256 del contenido del
+    archivo local (la fecha cambia con cada checkout aunque el libro sea el
+    mismo), o el sha256/la versión declarados en el manifiesto para los de Drive
+    """
+    if entrada.get('file_id'):
+        return f"drive:{entrada['file_id']}:{entrada.get('sha256') or entrada.get('version') or ''}"
+    sha = hashlib.sha256()
+    try:
+        with open(ruta_local, 'rb') as archivo:
+            for bloque in iter(lambda: archivo.read(1024 * 1024), b''):
+                sha.update(bloque)
+            tamano = archivo.tell()
+    except OSError:
+        return 'ausente'
+    return f"local:{tamano}:{sha.hexdigest()}"
+
+def ruta_agenda(fragmento=None):
+    """
+    Archivo de la agenda; cada fragmento i/N lleva el suyo, porque los
+    fragmentos se ejecutan a la vez y solo ven su parte del manifiesto
+    """
+    if not fragmento:
+        return RUTA_AGENDA
+    base, extension = os.path.splitext(RUTA_AGENDA)
+    return f"{base}_fragmento_{fragmento[0]}_de_{fragmento[1]}{extension}"
+
+def proxima_revision(hojas, dias_alerta, fecha_hoy=None):
+    """
+    Día en que hay que volver a escanear el libro: cuando la primera fecha
+    futura entra en la ventana de alerta, y como tarde REVISION_MAXIMA días
+    """
+    fecha_hoy = fecha_hoy or date.today()
+    manana = fecha_hoy + timedelta(days=1)
+    limite = fecha_hoy + timedelta(days=REVISION_MAXIMA)
+    # Una fecha avisa desde dias_alerta - 1 días antes; las que ya avisan hoy siguen mañana
+    inicios_aviso = [fila['fecha'] - timedelta(days=dias_alerta - 1)
+                     for hoja in hojas for fila in hoja['filas'] if fila['fecha'] >= manana]
+    if not inicios_aviso:
+        return limite
+    return min(max(min(inicios_aviso), manana), limite)
+
+class AgendaRevisiones:
+    """
+    Cola de prioridad por fecha de revisión. Las entradas reprogramadas dejan la
+    anterior en el montículo; se descarta al salir porque ya no coincide con la fecha vigente
+    """
+
+    def __init__(self, ruta=None, dias_alerta=1):
+        self.ruta = ruta or RUTA_AGENDA
+        self.dias_alerta = dias_alerta
+        self.libros = {}   # id -> {'proxima', 'firma', 'revisado'}
+        self.cola = []     # montículo de [proxima ISO, id]
+        self._vencidos = []
+        try:
+            with open(self.ruta, 'r', encoding='utf-8') as archivo:
+                datos = json.load(archivo)
+            self.libros, self.cola = datos['libros'], datos['cola']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def guardar(self):
+        """Escritura atómica: la cola se guarda ya ordenada como montículo"""
+        directorio = os.path.dirname(self.ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        ruta_temporal = f"{self.ruta}.tmp"
+        with open(ruta_temporal, 'w', encoding='utf-8') as archivo:
+            json.dump({'libros': self.libros, 'cola': self.cola}, archivo, ensure_ascii=False)
+        os.replace(ruta_temporal, self.ruta)
+
+    def pendientes(self, entradas, ruta_libro, fecha_hoy=None, ids_manifiesto=None):
+        """
+        Entradas del manifiesto que toca revisar hoy: vencidas en la cola, nuevas o con el libro cambiado.
+        Si `entradas` es solo una parte del manifiesto (un fragmento), ids_manifiesto son los ids
+        del manifiesto completo: los libros de las otras partes se conservan en la agenda
+        """
+        fecha_hoy = fecha_hoy or date.today()
+        hoy = fecha_hoy.isoformat()
+        por_id = {entrada['id']: entrada for entrada in entradas}
+        ids_manifiesto = set(por_id) if ids_manifiesto is None else set(ids_manifiesto) | set(por_id)
+
+        # Solo se miran las que vencen: el resto del montículo no se recorre
+        vencidos = set()
+        ajenos = []
+        while self.cola and self.cola[0][0] <= hoy:
+            proxima, id_libro = heapq.heappop(self.cola)
+            if self.libros.get(id_libro, {}).get('proxima') != proxima:
+                continue
+            if id_libro in por_id:
+                vencidos.add(id_libro)
+            elif id_libro in ids_manifiesto:
+                ajenos.append([proxima, id_libro])
+        # Los vencidos de otras partes del manifiesto vuelven a la cola para su ejecución
+        for elemento in ajenos:
+            heapq.heappush(self.cola, elemento)
+
+        # Libros nuevos en el manifiesto o cuyo archivo ha cambiado desde la última revisión
+        cambiados = {
+            entrada['id'] for entrada in entradas
+            if entrada['id'] not in self.libros
+            or self.libros[entrada['id']]['firma'] != firma_entrada(entrada, ruta_libro(entrada))
+        }
+
+        # Los que salieron del manifiesto se olvidan
+        for id_libro in set(self.libros) - ids_manifiesto:
+            del self.libros[id_libro]
+
+        self._vencidos = [por_id[id_libro] for id_libro in por_id if id_libro in vencidos | cambiados]
+        log(f"📅 Agenda: {len(vencidos)} libros vencen hoy, {len(cambiados - vencidos)} nuevos o cambiados, "
+            f"{len(entradas) - len(self._vencidos)} sin revisar hasta su fecha")
+        return self._vencidos
+
+    def programar(self, entrada, ruta_local, hojas, fecha_hoy=None):
+        """Anota la próxima revisión de un libro recién escaneado"""
+        proxima = proxima_revision(hojas, self.dias_alerta, fecha_hoy).isoformat()
+        self.libros[entrada['id']] = {
+            'proxima': proxima,
+            'firma': firma_entrada(entrada, ruta_local),
+            'revisado': (fecha_hoy or date.today()).isoformat(),
+        }
+        heapq.heappush(self.cola, [proxima, entrada['id']])
+
+    def reintentar(self, fecha_hoy=None):
+        """Los libros pendientes que no se pudieron revisar (descarga o lectura fallida) vuelven mañana"""
+        manana = ((fecha_hoy or date.today()) + timedelta(days=1)).isoformat()
+        hoy = (fecha_hoy or date.today()).isoformat()
+        for entrada in self._vencidos:
+            anotado = self.libros.get(entrada['id'])
+            if anotado is None or anotado.get('revisado') != hoy:
+                # Sin firma: al día siguiente cuenta como cambiado aunque no haya pasado por la cola
+                self.libros[entrada['id']] = {'proxima': manana, 'firma': '', 'revisado': None}
+                heapq.heappush(self.cola, [manana, entrada['id']])
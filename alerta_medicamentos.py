@@ -4,113 +4,130 @@ Versión con diseño personalizado según PDF
 Lee datos desde Google Drive
 """
 
-import openpyxl
 from datetime import datetime, date
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
+import argparse
 import os
 import sys
-import requests
-import gdown
+
+from bitacora import log
+from cache_alertas import calcular_hash
+from flujo_alertas import FlujoAlertas, anadir_opciones_exportacion, destinos_exportacion, leer_adjunto
+from etapas import GrafoEtapas
+from registros import FilaMedicamento, alerta_de_fila
+from formulas_fecha import completar_hojas
+from fechas import normalizar_fecha
+from prevision_agotamiento import crear_prevision, parametros_prevision
+from esquema_columnas import Esquema, esquema_de_hoja, parametros_esquema
+from libro_memoria import LibroEnMemoria
+from tablas_csv_ods import cargar_libro
+from fragmentos import DIRECTORIO_RESULTADOS, leer_fragmento
+
+# openpyxl, PIL, smtplib, requests y gdown se importan dentro de cada etapa:
+# en los días sin alertas el proceso termina sin llegar a cargarlos
 
 # Configuración desde variables de entorno
 GMAIL_USUARIO = os.environ.get('GMAIL_USUARIO')
 GMAIL_PASSWORD = os.environ.get('GMAIL_PASSWORD')
+GMAIL_CUENTAS = os.environ.get('GMAIL_CUENTAS', '')  # 'usuario1:clave1,usuario2:clave2' para repartir envíos
 EMAIL_DESTINO = os.environ.get('EMAIL_DESTINO')
 WHATSAPP_API_KEY = os.environ.get('WHATSAPP_API_KEY', '')
 FILE_ID_MEDICAMENTOS = os.environ.get('FILE_ID_MEDICAMENTOS')
+MANIFIESTO = os.environ.get('MANIFIESTO_PACIENTES')
 
 # Archivo Excel
 RUTA_EXCEL = "CONTROL DE MEDICAMENTOS.xlsx"
+RUTA_INDICE = os.environ.get('RUTA_INDICE_ALERTAS', '.cache_alertas/indice_alerta_medicamentos.json')
+RUTA_INDICE_HOJAS = os.environ.get('RUTA_INDICE_HOJAS', '.cache_alertas/indice_alerta_medicamentos_hojas.json')
 
 # Configuración
 DIAS_ALERTA = 3
 FILA_INICIO = 18
+COLUMNA_FECHA = 10  # Columna J
+HILOS_ESCANEO = 4  # Hojas escaneadas a la vez en el modo --todas-hojas
+
+# Pasos comunes a los dos scripts (flujo_alertas.py)
+flujo = FlujoAlertas(sys.modules[__name__])
 
-def descargar_desde_drive():
-    """Descarga el archivo Excel desde Google Drive"""
+def descargar_desde_drive(file_id=None):
+    """Descarga el archivo Excel desde Google Drive a memoria; devuelve un LibroEnMemoria o None"""
     try:
-        if not FILE_ID_MEDICAMENTOS:
+        import gdown
+        import io
+        
+        file_id = file_id or FILE_ID_MEDICAMENTOS
+        
+        if not file_id:
             log("ERROR: FILE_ID_MEDICAMENTOS no configurado")
-            return False
+            return None
         
-        url = f"https://drive.google.com/uc?id={FILE_ID_MEDICAMENTOS}"
+        url = f"https://drive.google.com/uc?id={file_id}"
         log(f"Descargando archivo desde Google Drive...")
         
-        gdown.download(url, RUTA_EXCEL, quiet=False)
+        # El libro no se escribe en el directorio de trabajo: todas las etapas leen este buffer
+        buffer = io.BytesIO()
+        gdown.download(url, buffer, quiet=False)
         
-        if os.path.exists(RUTA_EXCEL):
-            log(f"✓ Archivo descargado: {RUTA_EXCEL}")
-            return True
+        if buffer.getbuffer().nbytes:
+            libro = LibroEnMemoria(buffer.getvalue(), RUTA_EXCEL, url)
+            log(f"✓ Archivo descargado: {libro} ({len(libro) / 1024:.0f} KB)")
+            return libro
         else:
             log("✗ Error: El archivo no se descargó")
-            return False
+            return None
             
     except Exception as e:
         log(f"✗ Error al descargar: {e}")
         import traceback
         traceback.print_exc()
-        return False
+        return None
 
-def log(mensaje):
-    """Registrar mensajes con timestamp"""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"[{timestamp}] {mensaje}")
+def imagen_a_base64(datos_imagen):
+    """Reduce la foto a 200x200 y la devuelve como data URI PNG en base64"""
+    from PIL import Image
+    import io
+    import base64
+    
+    img = Image.open(io.BytesIO(datos_imagen))
+    
+    # Redimensionar si es muy grande
+    img.thumbnail((200, 200), Image.Resampling.LANCZOS)
+    
+    # Convertir a base64
+    buffered = io.BytesIO()
+    img.save(buffered, format="PNG")
+    img_base64 = base64.b64encode(buffered.getvalue()).decode()
+    
+    log("✓ Imagen del paciente extraída correctamente")
+    return f"data:image/png;base64,{img_base64}"
 
-def extraer_imagen_paciente(ruta_excel):
-    """Extrae la imagen del paciente del Excel y la convierte a base64"""
+def extraer_imagenes_pacientes(ruta_excel, nombres_hojas):
+    """Extrae la imagen de cada hoja indicada leyendo solo los dibujos del zip"""
     try:
-        from openpyxl.drawing.image import Image as OpenpyxlImage
-        from PIL import Image
-        import io
-        import base64
-        
-        workbook = openpyxl.load_workbook(ruta_excel)
-        sheet = workbook.active
-        
-        log("Buscando imagen del paciente en el Excel...")
+        from imagenes_excel import fotos_de_hojas
         
-        # Buscar imágenes en la hoja
-        if not hasattr(sheet, '_images'):
-            log("No se encontró el atributo _images en la hoja")
-            workbook.close()
-            return None
-            
-        imagenes = sheet._images
-        log(f"Total de imágenes encontradas: {len(imagenes)}")
-        
-        for idx, image in enumerate(imagenes, 1):
-            # La imagen del paciente debería estar en la zona L-M (columnas 11-12-13)
-            if hasattr(image, 'anchor') and hasattr(image.anchor, '_from'):
-                col = image.anchor._from.col
-                row = image.anchor._from.row
-                log(f"Imagen #{idx}: Columna {col} ({chr(65 + col) if col < 26 else 'Z+'}), Fila {row}")
-                
-                # Si está en las columnas L o M (11, 12, o 13) y filas 4-12
-                if 11 <= col <= 13 and 4 <= row <= 12:
-                    log(f"✓ Imagen encontrada en la zona esperada!")
-                    # Convertir a base64
-                    img_data = image._data()
-                    img = Image.open(io.BytesIO(img_data))
-                    
-                    # Redimensionar si es muy grande
-                    img.thumbnail((200, 200), Image.Resampling.LANCZOS)
-                    
-                    # Convertir a base64
-                    buffered = io.BytesIO()
-                    img.save(buffered, format="PNG")
-                    img_base64 = base64.b64encode(buffered.getvalue()).decode()
-                    
-                    workbook.close()
-                    log("✓ Imagen del paciente extraída correctamente")
-                    return f"data:image/png;base64,{img_base64}"
+        imagenes = {}
+        for nombre_hoja, datos in fotos_de_hojas(ruta_excel, nombres_hojas).items():
+            try:
+                imagenes[nombre_hoja] = imagen_a_base64(datos) if datos else None
+            except Exception as e:
+                log(f"Error al extraer la imagen de la hoja '{nombre_hoja}': {e}")
+                imagenes[nombre_hoja] = None
+        return imagenes
+    except Exception as e:
+        log(f"Error al extraer las imágenes de los pacientes: {e}")
+        import traceback
+        traceback.print_exc()
+        return {}
+
+def extraer_imagen_paciente(ruta_excel, nombre_hoja=None):
+    """Extrae la imagen del paciente del Excel y la convierte a base64"""
+    try:
+        from imagenes_excel import fotos_de_hojas
         
-        workbook.close()
-        log("⚠ No se encontró imagen en la zona L-M, filas 5-12")
-        return None
+        # Sin nombre de hoja se usa la hoja activa del libro
+        fotos = fotos_de_hojas(ruta_excel, [nombre_hoja] if nombre_hoja else None)
+        datos = next(iter(fotos.values()), None)
+        return imagen_a_base64(datos) if datos else None
     except Exception as e:
         log(f"Error al extraer la imagen del paciente: {e}")
         import traceback
@@ -140,82 +157,191 @@ def leer_info_paciente(sheet):
             'telefono': ""
         }
 
-def leer_excel_y_buscar_alertas(ruta_archivo):
-    """Lee el archivo Excel y busca fechas próximas en columna J desde fila 18"""
+def iterar_filas(sheet, sin_fecha=None):
+    """Produce las filas con fecha desde la cabecera de la tabla (por defecto columna J desde FILA_INICIO)"""
+    esquema = esquema_de_hoja(sheet, Esquema(FILA_INICIO, 1, 2, (COLUMNA_FECHA,)))
+    columna_fecha = esquema.fechas[0]
+    columnas = [esquema.medicamento, esquema.uso, columna_fecha]
+    prevision = crear_prevision()
+    ultima_columna = max(columnas + ([prevision.ultima_columna] if prevision else []))
+    celda = lambda valores, columna: valores[columna - 1] if len(valores) >= columna else None
+    
+    filas = sheet.iter_rows(min_row=esquema.fila_inicio, max_col=ultima_columna, values_only=True)
+    for fila, valores in enumerate(filas, esquema.fila_inicio):
+        if prevision:
+            prevision.anotar(fila, valores, esquema.medicamento, esquema.uso)
+
+        valor = celda(valores, columna_fecha)
+        medicamento = celda(valores, esquema.medicamento)
+        uso = celda(valores, esquema.uso)
+        # Acepta fechas de Excel, números de serie y fechas escritas como texto
+        fecha = normalizar_fecha(valor)
+        
+        if fecha:
+            nombre_medicamento = medicamento or "Medicamento sin nombre"
+            uso_medicamento = uso or "Uso no especificado"
+            yield FilaMedicamento(fila, fecha, str(nombre_medicamento), str(uso_medicamento))
+        elif valor is None and medicamento and sin_fecha is not None:
+            # Puede ser una fórmula guardada sin valor calculado: se evalúa al terminar la hoja
+            sin_fecha.append((columna_fecha, FilaMedicamento(fila, None, str(medicamento), str(uso or "Uso no especificado"))))
+    
+    # Las fechas de agotamiento se calculan juntas, para toda la hoja, al terminar de leerla
+    if prevision:
+        yield from prevision.filas()
+
+def escanear_filas(sheet, sin_fecha=None):
+    """Devuelve todas las filas con fecha de la tabla de medicamentos"""
+    return list(iterar_filas(sheet, sin_fecha))
+
+def iterar_alertas(filas, fecha_hoy=None):
+    """Produce las alertas de cualquier iterable de filas sin esperar a tenerlas todas"""
+    fecha_hoy = fecha_hoy or date.today()
+    for fila in filas:
+        dias_restantes = (fila['fecha'] - fecha_hoy).days
+        if 0 <= dias_restantes < DIAS_ALERTA:
+            yield alerta_de_fila(fila, dias_restantes)
+
+def filtrar_alertas(filas, fecha_hoy=None):
+    """Devuelve las filas cuya fecha vence en menos de DIAS_ALERTA días"""
+    log(f"Buscando fechas con menos de {DIAS_ALERTA} días...")
+    
+    alertas = []
+    for alerta in iterar_alertas(filas, fecha_hoy):
+        alertas.append(alerta)
+        log(f"  ⚠️ Alerta: {alerta['medicamento']} - Fila {alerta['fila']}, Fecha: {alerta['fecha']}, Días: {alerta['dias_restantes']}")
+    
+    log(f"Total de alertas encontradas: {len(alertas)}")
+    return alertas
+
+def iterar_alertas_excel(ruta_archivo, fecha_hoy=None):
+    """Abre el Excel en modo streaming y produce cada alerta en cuanto se lee su fila"""
+    workbook = cargar_libro(ruta_archivo)
+    sheet = workbook.active
+    hoja = {'hoja': sheet.title, 'filas': [], 'sin_fecha': []}
+    try:
+        yield from iterar_alertas(iterar_filas(sheet, hoja['sin_fecha']), fecha_hoy)
+    finally:
+        workbook.close()
+    
+    # Las fechas que solo existen como fórmula llegan al final, tras evaluarlas
+    yield from iterar_alertas(completar_hojas(ruta_archivo, [hoja])[0]['filas'], fecha_hoy)
+
+def leer_excel_y_escanear_filas(ruta_archivo):
+    """Lee el archivo Excel y devuelve todas las filas con fecha de la columna J desde fila 18"""
     try:
         log(f"Abriendo archivo Excel: {ruta_archivo}")
-        workbook = openpyxl.load_workbook(ruta_archivo, data_only=True)
+        # Solo lectura: las filas se recorren en streaming sin cargar toda la hoja (también CSV y ODS)
+        workbook = cargar_libro(ruta_archivo)
         sheet = workbook.active
         
         info_paciente = leer_info_paciente(sheet)
         log(f"Paciente: {info_paciente['paciente']}")
         log(f"Responsable: {info_paciente['responsable']}")
         
-        # Extraer imagen del paciente
-        imagen_paciente = extraer_imagen_paciente(ruta_archivo)
-        info_paciente['imagen'] = imagen_paciente
+        log(f"Revisando la tabla de medicamentos (por defecto columna J desde fila {FILA_INICIO})")
+        hoja = {'hoja': sheet.title, 'sin_fecha': []}
+        hoja['filas'] = escanear_filas(sheet, hoja['sin_fecha'])
+        
+        workbook.close()
+        filas = completar_hojas(ruta_archivo, [hoja])[0]['filas']
+        return filas, info_paciente
+    
+    except FileNotFoundError:
+        log(f"❌ ERROR: No se encontró el archivo: {ruta_archivo}")
+        return None, None
+    except Exception as e:
+        log(f"❌ ERROR al leer Excel: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return None, None
+
+def leer_excel_y_buscar_alertas(ruta_archivo):
+    """Lee el archivo Excel y busca fechas próximas en columna J desde fila 18"""
+    filas, info_paciente = leer_excel_y_escanear_filas(ruta_archivo)
+    if filas is None:
+        return None, None
+    
+    alertas = filtrar_alertas(filas)
+    
+    # La imagen solo se extrae si hay algo que notificar
+    if alertas:
+        info_paciente['imagen'] = extraer_imagen_paciente(ruta_archivo)
+    return alertas, info_paciente
+
+def crear_grafo_etapas(ruta_excel, filas, info_paciente, obtener_imagen=None):
+    """Declara las etapas posteriores al escaneo; cada una se calcula solo si se pide"""
+    grafo = GrafoEtapas()
+    grafo.valor('filas', filas)
+    grafo.valor('info_paciente', info_paciente)
+    grafo.etapa('alertas', filtrar_alertas, 'filas')
+    grafo.etapa('imagen', obtener_imagen or (lambda: extraer_imagen_paciente(ruta_excel)))
+    grafo.etapa('info_con_imagen', lambda info, imagen: dict(info, imagen=imagen), 'info_paciente', 'imagen')
+    grafo.etapa('html', crear_html_email_personalizado, 'alertas', 'info_con_imagen')
+    grafo.etapa('mensaje_whatsapp', crear_mensaje_whatsapp, 'alertas')
+    grafo.etapa('lineas_whatsapp', lineas_whatsapp, 'alertas', 'info_paciente')
+    return grafo
+
+def hoja_coincide_con_plantilla(sheet):
+    """Una hoja sigue la plantilla si tiene el nombre del paciente en B5"""
+    return bool(sheet['B5'].value)
+
+def leer_excel_todas_las_hojas(ruta_archivo):
+    """Lee el Excel una sola vez y escanea en paralelo todas las hojas que siguen la plantilla"""
+    try:
+        from concurrent.futures import ThreadPoolExecutor
         
-        alertas = []
-        fecha_hoy = date.today()
-        columna_fecha = 10
+        log(f"Abriendo archivo Excel: {ruta_archivo}")
+        workbook = cargar_libro(ruta_archivo, read_only=False)
+        hojas = [sheet for sheet in workbook.worksheets if hoja_coincide_con_plantilla(sheet)]
+        log(f"Hojas con la plantilla de paciente: {len(hojas)} de {len(workbook.worksheets)}")
         
-        log(f"Revisando columna J desde fila {FILA_INICIO}")
-        log(f"Buscando fechas con menos de {DIAS_ALERTA} días...")
+        def escanear_hoja(sheet):
+            sin_fecha = []
+            filas = escanear_filas(sheet, sin_fecha)
+            return {'hoja': sheet.title, 'filas': filas, 'sin_fecha': sin_fecha, 'info_paciente': leer_info_paciente(sheet)}
         
-        for fila in range(FILA_INICIO, sheet.max_row + 1):
-            celda = sheet.cell(row=fila, column=columna_fecha)
-            valor = celda.value
-            
-            if isinstance(valor, datetime):
-                fecha_celda = valor.date()
-                dias_restantes = (fecha_celda - fecha_hoy).days
-                
-                if 0 <= dias_restantes < DIAS_ALERTA:
-                    nombre_medicamento = sheet.cell(row=fila, column=1).value or "Medicamento sin nombre"
-                    uso_medicamento = sheet.cell(row=fila, column=2).value or "Uso no especificado"
-                    
-                    alerta = {
-                        'fila': fila,
-                        'fecha': fecha_celda,
-                        'dias_restantes': dias_restantes,
-                        'medicamento': str(nombre_medicamento),
-                        'uso': str(uso_medicamento)
-                    }
-                    alertas.append(alerta)
-                    log(f"  ⚠️ Alerta: {nombre_medicamento} - Fila {fila}, Fecha: {fecha_celda}, Días: {dias_restantes}")
+        # Las hojas ya están en memoria: cada hilo solo recorre las celdas de la suya
+        with ThreadPoolExecutor(max_workers=HILOS_ESCANEO) as pool:
+            resultados = list(pool.map(escanear_hoja, hojas))
         
         workbook.close()
-        log(f"Total de alertas encontradas: {len(alertas)}")
-        return alertas, info_paciente
+        completar_hojas(ruta_archivo, resultados)
+        for resultado in resultados:
+            log(f"Hoja '{resultado['hoja']}': {resultado['info_paciente']['paciente']} - {len(resultado['filas'])} fechas")
+        return resultados
     
     except FileNotFoundError:
         log(f"❌ ERROR: No se encontró el archivo: {ruta_archivo}")
-        return None, None
+        return None
     except Exception as e:
         log(f"❌ ERROR al leer Excel: {str(e)}")
         import traceback
         traceback.print_exc()
-        return None, None
+        return None
+
+def parametros_lectura():
+    """Parámetros de plantilla que invalidan el índice en caché si cambian"""
+    return {'fila_inicio': FILA_INICIO, 'columna_fecha': COLUMNA_FECHA, 'fechas_formula': True, 'fechas_texto': True,
+            **parametros_prevision(), **parametros_esquema()}
 
 def crear_html_email_personalizado(alertas, info_paciente):
     """Crea email HTML con diseño moderno glassmorphism"""
-    num_alertas = len(alertas)
+    return crear_html_email_varios_pacientes([(alertas, info_paciente)])
+
+def crear_html_email_varios_pacientes(bloques):
+    """Crea un único email con las tarjetas de varios pacientes: bloques = [(alertas, info_paciente)]"""
     fecha_revision = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
     
-    # Diccionarios para traducir meses y días
-    meses_es = {
-        1: 'ENE', 2: 'FEB', 3: 'MAR', 4: 'ABR', 5: 'MAY', 6: 'JUN',
-        7: 'JUL', 8: 'AGO', 9: 'SEP', 10: 'OCT', 11: 'NOV', 12: 'DIC'
-    }
-    
-    dias_es = {
-        0: 'LUN', 1: 'MAR', 2: 'MIÉ', 3: 'JUE', 4: 'VIE', 5: 'SÁB', 6: 'DOM'
-    }
+    html = _html_inicio_email()
+    for alertas, info_paciente in bloques:
+        html += _html_paciente(alertas, info_paciente)
+    html += _html_fin_email(fecha_revision)
     
-    # Foto del paciente (base64 o placeholder)
-    foto_paciente = info_paciente.get('imagen') or 'data:image/svg+xml,<svg xmlns="http://www.w3.org/2000/svg" width="200" height="200"><rect fill="%23e0e0e0" width="200" height="200"/><text x="50%" y="50%" font-size="80" text-anchor="middle" dy=".3em">👤</text></svg>'
-    
-    html = f"""
+    return html
+
+def _html_inicio_email(estilos_extra=''):
+    """Cabecera del documento: estilos (más estilos_extra, para el panel) y título"""
+    return f"""
 <!DOCTYPE html>
 <html lang="es">
 <head>
@@ -584,7 +710,7 @@ def crear_html_email_personalizado(alertas, info_paciente):
             .footer-info div:after {{ content: ""; }}
             .footer p {{ font-size: 0.8rem; }}
         }}
-    </style>
+{estilos_extra}    </style>
 </head>
 <body>
     <div class="container">
@@ -593,6 +719,38 @@ def crear_html_email_personalizado(alertas, info_paciente):
             <h1>CONTROL DE MEDICAMENTOS</h1>
         </div>
         
+"""
+
+# Abreviaturas del calendario lateral de las tarjetas
+MESES_ES = {
+    1: 'ENE', 2: 'FEB', 3: 'MAR', 4: 'ABR', 5: 'MAY', 6: 'JUN',
+    7: 'JUL', 8: 'AGO', 9: 'SEP', 10: 'OCT', 11: 'NOV', 12: 'DIC'
+}
+DIAS_ES = {
+    0: 'LUN', 1: 'MAR', 2: 'MIÉ', 3: 'JUE', 4: 'VIE', 5: 'SÁB', 6: 'DOM'
+}
+
+def _html_paciente(alertas, info_paciente):
+    """Tarjetas del paciente y del responsable, banner y tarjetas de medicamentos"""
+    html = _html_cabecera_paciente(info_paciente, "Medicamentos que están próximos a agotarse y requieren atención")
+    
+    # Generar tarjetas de medicamentos
+    for alerta in alertas:
+        dias_texto = f"Quedan {alerta['dias_restantes']:02d} días" if alerta['dias_restantes'] > 0 else "VENCE HOY"
+        html += _html_tarjeta_medicamento(alerta['fecha'], alerta['medicamento'], alerta['uso'], dias_texto)
+    
+    html += """
+        </div>
+"""
+    
+    return html
+
+def _html_cabecera_paciente(info_paciente, texto_banner):
+    """Tarjetas del paciente y del responsable, banner y apertura de la lista de medicamentos"""
+    # Foto del paciente (base64 o placeholder)
+    foto_paciente = info_paciente.get('imagen') or 'data:image/svg+xml,<svg xmlns="http://www.w3.org/2000/svg" width="200" height="200"><rect fill="%23e0e0e0" width="200" height="200"/><text x="50%" y="50%" font-size="80" text-anchor="middle" dy=".3em">👤</text></svg>'
+    
+    return f"""
         <!-- Tarjetas apiladas de información -->
         <div class="info-cards">
             <!-- Tarjeta verde del paciente -->
@@ -622,43 +780,38 @@ def crear_html_email_personalizado(alertas, info_paciente):
         <div class="alert-banner">
             <div class="icon">✋</div>
             <div class="texto">
-                Medicamentos que están próximos a agotarse y requieren atención
+                {texto_banner}
             </div>
         </div>
         
         <!-- Lista de medicamentos -->
         <div class="medicamentos-container">
 """
-    
-    # Generar tarjetas de medicamentos
-    for alerta in alertas:
-        fecha = alerta['fecha']
-        dia_semana = dias_es[fecha.weekday()]
-        dia = fecha.day
-        mes = meses_es[fecha.month]
-        dias_texto = f"Quedan {alerta['dias_restantes']:02d} días" if alerta['dias_restantes'] > 0 else "VENCE HOY"
-        
-        html += f"""
-            <div class="medicamento-card">
+
+def _html_tarjeta_medicamento(fecha, nombre, uso, badge, atributos=''):
+    """Tarjeta con el calendario lateral; atributos se añaden al div de la tarjeta"""
+    return f"""
+            <div class="medicamento-card"{atributos}>
                 <!-- Calendario lateral -->
                 <div class="calendario">
-                    <div class="dia-semana">{dia_semana}</div>
-                    <div class="dia">{dia}</div>
-                    <div class="mes">{mes}</div>
+                    <div class="dia-semana">{DIAS_ES[fecha.weekday()]}</div>
+                    <div class="dia">{fecha.day}</div>
+                    <div class="mes">{MESES_ES[fecha.month]}</div>
                 </div>
                 
                 <!-- Contenido del medicamento -->
                 <div class="medicamento-contenido">
-                    <div class="medicamento-nombre">{alerta['medicamento']}</div>
-                    <div class="medicamento-uso">{alerta['uso']}</div>
-                    <div class="badge-dias">{dias_texto}</div>
+                    <div class="medicamento-nombre">{nombre}</div>
+                    <div class="medicamento-uso">{uso}</div>
+                    <div class="badge-dias">{badge}</div>
                 </div>
             </div>
         """
-    
-    html += f"""
-        </div>
-        
+
+def _html_fin_email(fecha_revision, pie="Este correo fue generado automáticamente por el sistema de alertas de medicamentos",
+                    guion=''):
+    """Pie del email (o de una página del panel, con su propio texto y guion)"""
+    return f"""
         <!-- Footer -->
         <div class="footer">
             <div class="footer-info">
@@ -667,30 +820,183 @@ def crear_html_email_personalizado(alertas, info_paciente):
                 <div>Desarrollado por: Ernesto Fernandez +34 611131467</div>
             </div>
             <p style="margin-top: 20px;">
-                Este correo fue generado automáticamente por el sistema de alertas de medicamentos
+                {pie}
             </p>
         </div>
     </div>
-</body>
+{guion}</body>
 </html>
     """
+
+# Panel estático (modo --panel): mismas tarjetas que el email, con los días
+# restantes calculados en el navegador para que las páginas no cambien cada día
+ESTILOS_PANEL = """
+        /* Panel estático */
+        a.enlace-panel { display: block; color: inherit; text-decoration: none; }
+        a.enlace-panel:hover .medicamento-card { transform: translateY(-2px); }
+        .volver { display: inline-block; margin: 25px 40px 0 40px; color: #4b5563; font-weight: 600; text-decoration: none; }
+        .medicamento-card.urgente .badge-dias { background: #dc2626; box-shadow: 0 4px 12px rgba(220, 38, 38, 0.3); }
+        .medicamento-card.vencido { opacity: 0.55; }
+        .medicamento-card.vencido .badge-dias { background: #6b7280; box-shadow: none; }
+        .sin-fechas { padding: 0 40px 30px 40px; color: #4b5563; line-height: 2; }
+        .sin-fechas a { color: #4b5563; }
+"""
+
+GUION_PANEL = f"""    <script>
+        (function () {{
+            var hoy = new Date();
+            hoy.setHours(0, 0, 0, 0);
+            document.querySelectorAll('[data-fecha]').forEach(function (tarjeta) {{
+                var partes = tarjeta.getAttribute('data-fecha').split('-');
+                var dias = Math.round((new Date(partes[0], partes[1] - 1, partes[2]) - hoy) / 86400000);
+                var badge = tarjeta.querySelector('.badge-dias');
+                if (dias > 0) {{
+                    badge.textContent = 'Quedan ' + (dias < 10 ? '0' : '') + dias + ' días';
+                }} else if (dias === 0) {{
+                    badge.textContent = 'VENCE HOY';
+                }} else {{
+                    badge.textContent = 'Vencido';
+                    tarjeta.classList.add('vencido');
+                }}
+                if (dias >= 0 && dias < {DIAS_ALERTA}) {{
+                    tarjeta.classList.add('urgente');
+                }}
+            }});
+        }})();
+    </script>
+"""
+
+def _atributo_fecha(fecha):
+    return f' data-fecha="{fecha.isoformat()}"'
+
+def crear_html_pagina_panel(filas, info_paciente):
+    """Página del panel de un paciente: todas sus fechas, de la más próxima a la más lejana"""
+    html = _html_inicio_email(ESTILOS_PANEL)
+    html += """
+        <a class="volver" href="index.html">← Todos los pacientes</a>
+"""
+    html += _html_cabecera_paciente(info_paciente, "Fechas de revisión de sus medicamentos")
+    for fila in sorted(filas, key=lambda fila: fila['fecha']):
+        # Sin JavaScript se ve la fecha; con él, los días que quedan desde el día en que se abre
+        html += _html_tarjeta_medicamento(fila['fecha'], fila['medicamento'], fila['uso'],
+                                          fila['fecha'].strftime('%d/%m/%Y'), _atributo_fecha(fila['fecha']))
+    html += """
+        </div>
+"""
+    html += _html_fin_email(date.today().strftime("%d/%m/%Y"),
+                            "Esta página fue generada automáticamente por el sistema de alertas de medicamentos",
+                            GUION_PANEL)
+    return html
+
+def crear_html_indice_panel(resumenes):
+    """Índice del panel: un enlace por paciente, los que antes vencen primero"""
+    con_fechas = [resumen for resumen in resumenes if resumen['proxima'] is not None]
+    urgentes = sum(1 for resumen in con_fechas if resumen['dias_restantes'] < DIAS_ALERTA)
+    
+    html = _html_inicio_email(ESTILOS_PANEL)
+    html += f"""
+        <!-- Banner amarillo de advertencia -->
+        <div class="alert-banner" style="margin-top: 40px;">
+            <div class="icon">✋</div>
+            <div class="texto">
+                {len(resumenes)} pacientes, {urgentes} con medicamentos que vencen en los próximos {DIAS_ALERTA} días
+            </div>
+        </div>
+        
+        <!-- Lista de pacientes -->
+        <div class="medicamentos-container">
+"""
+    for resumen in con_fechas:
+        html += f"""
+            <a class="enlace-panel" href="{resumen['archivo']}">"""
+        html += _html_tarjeta_medicamento(resumen['proxima'], resumen['paciente'],
+                                          f"{resumen['responsable']} · {resumen['proximas']} fechas pendientes",
+                                          resumen['proxima'].strftime('%d/%m/%Y'), _atributo_fecha(resumen['proxima']))
+        html += "</a>"
+    html += """
+        </div>
+"""
     
+    sin_fechas = [resumen for resumen in resumenes if resumen['proxima'] is None]
+    if sin_fechas:
+        html += """
+        <div class="sin-fechas">
+            <div class="label">SIN FECHAS PENDIENTES</div>
+"""
+        for resumen in sin_fechas:
+            html += f"""            <div><a href="{resumen['archivo']}">{resumen['paciente']}</a> · {resumen['responsable']}</div>
+"""
+        html += """        </div>
+"""
+    
+    html += _html_fin_email(date.today().strftime("%d/%m/%Y"),
+                            "Esta página fue generada automáticamente por el sistema de alertas de medicamentos",
+                            GUION_PANEL)
     return html
 
-def enviar_whatsapp(telefono, mensaje, info_paciente):
-    """Envía mensaje por WhatsApp"""
+def enviar_whatsapp(telefono, mensaje, info_paciente=None, lanzar=False):
+    """
+    Envía mensaje por WhatsApp; sin info_paciente el mensaje ya es el texto completo.
+    Con lanzar=True el error (también la respuesta no 200 de CallMeBot) se propaga
+    """
     try:
+        import requests
+        
         if not telefono:
             return False
         
-        texto = f"🏥 ALERTA MEDICAMENTOS\n👤 {info_paciente['paciente']}\n👨‍⚕️ {info_paciente['responsable']}\n\n{mensaje}"
+        texto = texto_whatsapp(mensaje, info_paciente) if info_paciente else mensaje
         url = "https://api.callmebot.com/whatsapp.php"
         params = {'phone': telefono, 'text': texto, 'apikey': WHATSAPP_API_KEY}
         response = requests.get(url, params=params, timeout=10)
+        if response.status_code != 200 and lanzar:
+            raise RuntimeError(f"CallMeBot respondió {response.status_code}: {response.text[:200]}")
         return response.status_code == 200
-    except:
+    except Exception:
+        if lanzar:
+            raise
         return False
 
+def texto_whatsapp(mensaje, info_paciente):
+    """Texto completo del WhatsApp: cabecera del paciente y resumen de alertas"""
+    return f"🏥 ALERTA MEDICAMENTOS\n👤 {info_paciente['paciente']}\n👨‍⚕️ {info_paciente['responsable']}\n\n{mensaje}"
+
+def lineas_whatsapp(alertas, info_paciente):
+    """Una línea por alerta con el nombre del paciente, para agrupar varios pacientes: [(días, fecha ISO, texto)]"""
+    lineas = []
+    for alerta in alertas:
+        urgencia = "🔴 HOY" if alerta['dias_restantes'] == 0 else f"🟡 {alerta['dias_restantes']} días"
+        lineas.append((alerta['dias_restantes'], alerta['fecha'].isoformat(),
+                       f"{urgencia} - {alerta['medicamento']} ({alerta['fecha'].strftime('%d/%m/%Y')}) - {info_paciente['paciente']}"))
+    return lineas
+
+def crear_mensajes_whatsapp_agrupados(pacientes):
+    """
+    pacientes = [(teléfono, líneas)]: junta las alertas de todos los pacientes de cada
+    teléfono en los menos mensajes posibles. Devuelve {teléfono: [textos]}
+    """
+    from whatsapp_agrupado import agrupar_por_telefono, empaquetar
+    
+    mensajes = {}
+    for telefono, lineas in agrupar_por_telefono(pacientes).items():
+        pacientes_telefono = sum(1 for otro, _ in pacientes if str(otro) == telefono)
+        
+        def cabecera(parte, partes, total=len(lineas), pacientes_telefono=pacientes_telefono):
+            numeracion = f" ({parte}/{partes})" if partes > 1 else ""
+            return (f"🏥 ALERTA MEDICAMENTOS{numeracion}\n"
+                    f"⚠️ {total} medicamentos de {pacientes_telefono} pacientes requieren revisión:\n\n")
+        
+        mensajes[telefono] = empaquetar(lineas, cabecera)
+    return mensajes
+
+def notificar_whatsapp_agrupados(pacientes):
+    """Un WhatsApp (o los mínimos que quepan) por teléfono en lugar de uno por paciente"""
+    mensajes = crear_mensajes_whatsapp_agrupados(pacientes)
+    for telefono, textos in mensajes.items():
+        log(f"📱 {len(textos)} WhatsApp para {telefono}")
+        for texto in textos:
+            flujo.despachar_whatsapp(telefono, texto)
+
 def crear_mensaje_whatsapp(alertas):
     """Crea mensaje resumido para WhatsApp"""
     mensaje = f"⚠️ {len(alertas)} medicamentos requieren revisión:\n\n"
@@ -701,80 +1007,470 @@ def crear_mensaje_whatsapp(alertas):
         mensaje += f"...y {len(alertas) - 5} más."
     return mensaje
 
-def enviar_email(destinatario, asunto, cuerpo_html, archivo_adjunto=None):
-    """Envía email vía Gmail SMTP"""
+def crear_email(remitente, destinatario, asunto, cuerpo_html, archivo_adjunto=None):
+    """Construye el mensaje MIME (HTML y Excel adjunto) sin enviarlo"""
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+    from email.mime.base import MIMEBase
+    from email import encoders
+    from email.utils import formatdate, make_msgid
+    
+    mensaje = MIMEMultipart()
+    mensaje['From'] = remitente
+    mensaje['To'] = destinatario
+    mensaje['Subject'] = asunto
+    mensaje['Date'] = formatdate(localtime=True)
+    mensaje['Message-ID'] = make_msgid(domain=remitente.rpartition('@')[2] or 'localhost')
+    mensaje.attach(MIMEText(cuerpo_html, 'html', 'utf-8'))
+    
+    adjunto = leer_adjunto(archivo_adjunto)
+    if adjunto:
+        nombre_adjunto, datos_adjunto = adjunto
+        parte = MIMEBase('application', 'octet-stream')
+        parte.set_payload(datos_adjunto)
+        encoders.encode_base64(parte)
+        parte.add_header('Content-Disposition', f'attachment; filename= {nombre_adjunto}')
+        mensaje.attach(parte)
+    return mensaje
+
+def enviar_email(destinatario, asunto, cuerpo_html, archivo_adjunto=None, lanzar=False):
+    """Envía email vía Gmail SMTP; con lanzar=True el error se propaga en lugar de devolver False"""
+    reservada = None   # cuenta a la que ya se cobró este envío y que hay que reintegrar si falla
     try:
+        import smtplib
+        
+        # Con varias cuentas, espera aquí hasta que la cuenta elegida tenga cupo
+        usuario, clave = flujo.cuenta_de_envio(destinatario)
+        reservada = usuario
+        
         log("Preparando email...")
-        mensaje = MIMEMultipart()
-        mensaje['From'] = GMAIL_USUARIO
-        mensaje['To'] = destinatario
-        mensaje['Subject'] = asunto
-        mensaje.attach(MIMEText(cuerpo_html, 'html', 'utf-8'))
-        
-        if archivo_adjunto and os.path.exists(archivo_adjunto):
-            with open(archivo_adjunto, 'rb') as archivo:
-                parte = MIMEBase('application', 'octet-stream')
-                parte.set_payload(archivo.read())
-                encoders.encode_base64(parte)
-                parte.add_header('Content-Disposition', f'attachment; filename= {os.path.basename(archivo_adjunto)}')
-                mensaje.attach(parte)
+        mensaje = crear_email(usuario, destinatario, asunto, cuerpo_html, archivo_adjunto)
         
         log("Conectando con Gmail...")
         servidor = smtplib.SMTP('smtp.gmail.com', 587)
         servidor.starttls()
-        servidor.login(GMAIL_USUARIO, GMAIL_PASSWORD)
-        servidor.sendmail(GMAIL_USUARIO, destinatario, mensaje.as_string())
+        servidor.login(usuario, clave)
+        servidor.sendmail(usuario, destinatario, mensaje.as_string())
+        reservada = None
         servidor.quit()
         
         log("✅ Email enviado exitosamente!")
         return True
     except Exception as e:
         log(f"❌ ERROR al enviar email: {str(e)}")
+        if reservada is not None:
+            flujo.devolver_cuenta(reservada)
+        if lanzar:
+            raise
         return False
 
-def main():
-    """Función principal"""
-    log("="*70)
-    log("SISTEMA DE ALERTAS DE MEDICAMENTOS - VERSIÓN PERSONALIZADA")
-    log("="*70)
+def notificar_alertas(grafo, ruta_excel):
+    """Envía el email y el WhatsApp de las alertas calculadas en el grafo"""
+    alertas = grafo['alertas']
+    info_paciente = grafo['info_paciente']
     
-    if not all([GMAIL_USUARIO, GMAIL_PASSWORD, EMAIL_DESTINO]):
-        log("❌ ERROR: Faltan variables de entorno")
-        sys.exit(1)
+    cuerpo_html = grafo['html']
+    asunto = f"🏥 ALERTAS: {len(alertas)} Medicamentos - {info_paciente['paciente']}"
+    
+    flujo.despachar_email(EMAIL_DESTINO, asunto, cuerpo_html, ruta_excel)
+    
+    if info_paciente['telefono']:
+        flujo.despachar_whatsapp(info_paciente['telefono'], grafo['mensaje_whatsapp'], info_paciente)
+
+def notificar_varias_hojas(grafos, ruta_excel):
+    """Envía un único email con las alertas de todas las hojas y un WhatsApp por paciente"""
+    total_alertas = sum(len(grafo['alertas']) for grafo in grafos)
+    
+    cuerpo_html = crear_html_email_varios_pacientes([(grafo['alertas'], grafo['info_con_imagen']) for grafo in grafos])
+    asunto = f"🏥 ALERTAS: {total_alertas} Medicamentos - {len(grafos)} pacientes"
+    
+    flujo.despachar_email(EMAIL_DESTINO, asunto, cuerpo_html, ruta_excel)
+    
+    # Un cuidador con varios pacientes recibe sus alertas juntas
+    notificar_whatsapp_agrupados([(grafo['info_paciente']['telefono'], grafo['lineas_whatsapp']) for grafo in grafos])
+
+def crear_grafos_hojas(ruta_excel, hojas):
+    """Crea el grafo de etapas de cada hoja y devuelve solo los que tienen alertas"""
+    # Las fotos de todas las hojas con alertas se extraen juntas, con una sola lectura extra
+    hojas_con_alertas = []
+    imagenes = GrafoEtapas()
+    imagenes.etapa('por_hoja', lambda: extraer_imagenes_pacientes(ruta_excel, hojas_con_alertas))
+    
+    grafos = []
+    for hoja in hojas:
+        log(f"--- Hoja '{hoja['hoja']}' ---")
+        grafo = crear_grafo_etapas(ruta_excel, hoja['filas'], hoja['info_paciente'],
+                                   lambda nombre=hoja['hoja']: imagenes['por_hoja'].get(nombre))
+        grafo.valor('hoja', hoja['hoja'])
+        if grafo['alertas']:
+            hojas_con_alertas.append(hoja['hoja'])
+            grafos.append(grafo)
+    return grafos
+
+def procesar_todas_las_hojas(ruta_excel, destinos=None):
+    """Escanea todas las hojas del Excel y notifica juntas las que tienen alertas"""
+    hojas = flujo.escanear_todas_las_hojas(ruta_excel, destinos)
+    grafos = crear_grafos_hojas(ruta_excel, hojas)
+    
+    if grafos:
+        log(f"\n🚨 Se encontraron alertas en {len(grafos)} de {len(hojas)} hojas")
+        notificar_varias_hojas(grafos, ruta_excel)
+    else:
+        log("✅ No se encontraron alertas")
+
+def libros_del_manifiesto(entradas):
+    """Produce (entrada, ruta) de cada libro: primero los locales y luego los de Drive según terminan de descargarse"""
+    from manifiesto import ruta_libro
+    
+    for entrada in entradas:
+        if not entrada.get('file_id'):
+            yield entrada, ruta_libro(entrada)
+    
+    trabajos = [dict(entrada, ruta=ruta_libro(entrada)) for entrada in entradas if entrada.get('file_id')]
+    if trabajos:
+        # Cada libro se analiza en cuanto termina su descarga, mientras siguen las demás
+        from descargas_drive import descargar_varios
+        yield from descargar_varios(trabajos)
+
+def grafos_del_manifiesto(entradas, agenda=None):
+    """
+    Escanea los libros del manifiesto: {destinatario: [(id del libro, grafo)]} de los pacientes con alertas.
+    Con agenda, anota la próxima revisión de cada libro escaneado
+    """
+    from manifiesto import ruta_indice
+    
+    por_destinatario = {}
+    for entrada, ruta in libros_del_manifiesto(entradas):
+        log(f"=== Libro '{entrada['id']}' ===")
+        if ruta is None:
+            continue
+        if not os.path.exists(ruta):
+            log(f"❌ ERROR: No se encontró el archivo Excel: {ruta}")
+            continue
+        
+        # Una sola lectura del disco: hash, escaneo y fotos salen del mismo buffer
+        libro = LibroEnMemoria.leer(ruta)
+        hojas, hash_excel = flujo.obtener_hojas(libro, ruta_indice(entrada, 'hojas'))
+        if hojas is None:
+            log(f"❌ No se pudo leer el libro '{entrada['id']}'")
+            continue
+        flujo.registrar_historial(hash_excel, hojas, libro)
+        if agenda is not None:
+            agenda.programar(entrada, ruta, hojas)
+        
+        destinatario = entrada.get('email') or EMAIL_DESTINO
+        por_destinatario.setdefault(destinatario, []).extend(
+            (entrada['id'], grafo) for grafo in crear_grafos_hojas(libro, hojas))
+    return por_destinatario
+
+def enviar_digest(por_destinatario):
+    """
+    Un email por destinatario con los pacientes agrupados por responsable, y los
+    WhatsApp agrupados por teléfono. por_destinatario = {email: [{'html', 'alertas',
+    'info_paciente', 'lineas_whatsapp'}]} con el HTML de cada paciente ya renderizado
+    """
+    total_pacientes = sum(len(pacientes) for pacientes in por_destinatario.values())
+    if not total_pacientes:
+        log("✅ No se encontraron alertas")
+        return
+    
+    log(f"\n📬 {total_pacientes} pacientes con alertas agrupados en {len(por_destinatario)} emails")
+    
+    for destinatario, pacientes in por_destinatario.items():
+        if not pacientes:
+            continue
+        
+        # Dentro de cada email, los pacientes quedan agrupados por responsable
+        pacientes.sort(key=lambda paciente: (str(paciente['info_paciente']['responsable']), str(paciente['info_paciente']['paciente'])))
+        total_alertas = sum(paciente['alertas'] for paciente in pacientes)
+        responsables = {str(paciente['info_paciente']['responsable']) for paciente in pacientes}
+        
+        fecha_revision = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+        cuerpo_html = _html_inicio_email() + ''.join(paciente['html'] for paciente in pacientes) + _html_fin_email(fecha_revision)
+        asunto = f"🏥 ALERTAS: {total_alertas} Medicamentos - {len(pacientes)} pacientes, {len(responsables)} responsables"
+        
+        flujo.despachar_email(destinatario, asunto, cuerpo_html)
+    
+    # Los WhatsApp se agrupan por teléfono aunque sus pacientes vayan en emails distintos
+    notificar_whatsapp_agrupados([(paciente['info_paciente']['telefono'], paciente['lineas_whatsapp'])
+                                  for pacientes in por_destinatario.values() for paciente in pacientes])
+
+def resultado_paciente(id_libro, grafo, destinatario):
+    """Paciente con alertas listo para enviar o para guardar en los resultados de un fragmento"""
+    return {
+        'libro': id_libro,
+        'hoja': grafo['hoja'],
+        'email': destinatario,
+        'alertas': len(grafo['alertas']),
+        'html': _html_paciente(grafo['alertas'], grafo['info_con_imagen']),
+        'lineas_whatsapp': grafo['lineas_whatsapp'],
+        'info_paciente': {clave: valor for clave, valor in grafo['info_paciente'].items() if clave != 'imagen'},
+    }
+
+def procesar_digest(ruta_manifiesto, fragmento=None, directorio_resultados=None, con_agenda=False):
+    """
+    Agrupa las alertas de todos los libros del manifiesto en un email por destinatario.
+    Con fragmento=(i, N) solo procesa su parte del manifiesto y guarda los resultados sin enviar nada.
+    Con con_agenda solo revisa los libros que vencen hoy según la agenda, los nuevos y los cambiados
+    """
+    from manifiesto import cargar_manifiesto, ruta_libro
+    
+    entradas = cargar_manifiesto(ruta_manifiesto)
+    log(f"Manifiesto con {len(entradas)} libros: {ruta_manifiesto}")
+    ids_manifiesto = [entrada['id'] for entrada in entradas]
+    
+    if fragmento:
+        from fragmentos import entradas_del_fragmento
+        entradas = entradas_del_fragmento(entradas, *fragmento)
+        log(f"🧩 Fragmento {fragmento[0]}/{fragmento[1]}: {len(entradas)} libros")
+    
+    agenda = None
+    if con_agenda:
+        from agenda_revisiones import AgendaRevisiones, ruta_agenda
+        agenda = AgendaRevisiones(ruta_agenda(fragmento), dias_alerta=DIAS_ALERTA)
+        entradas = agenda.pendientes(entradas, ruta_libro, ids_manifiesto=ids_manifiesto)
+    
+    por_destinatario = {
+        destinatario: [resultado_paciente(id_libro, grafo, destinatario) for id_libro, grafo in grafos]
+        for destinatario, grafos in grafos_del_manifiesto(entradas, agenda).items()
+    }
+    
+    if fragmento:
+        from fragmentos import guardar_resultados
+        pacientes = [paciente for lista in por_destinatario.values() for paciente in lista]
+        guardar_resultados(directorio_resultados, *fragmento, pacientes)
+    else:
+        enviar_digest(por_destinatario)
+    
+    # La agenda se guarda después de notificar: si algo falla, mañana se revisan los mismos libros
+    if agenda is not None:
+        agenda.reintentar()
+        agenda.guardar()
+
+def combinar_fragmentos(directorio_resultados):
+    """Junta los resultados de todos los fragmentos y envía el digest completo"""
+    from fragmentos import cargar_resultados
+    
+    pacientes, faltan = cargar_resultados(directorio_resultados)
+    if faltan:
+        log(f"⚠️ Faltan los resultados de los fragmentos: {', '.join(faltan)}")
+    log(f"🧩 {len(pacientes)} pacientes con alertas en los resultados de {directorio_resultados}")
+    
+    por_destinatario = {}
+    for paciente in pacientes:
+        por_destinatario.setdefault(paciente['email'] or EMAIL_DESTINO, []).append(paciente)
+    enviar_digest(por_destinatario)
+
+def vigilar_excel(ruta_excel):
+    """Recalcula las alertas cada vez que se guarda el Excel local y notifica las nuevas"""
+    from vigilancia import vigilar_archivo, comparar_alertas
+    
+    estado = {'hash': None, 'alertas': []}
+    
+    def revisar(ruta):
+        libro = LibroEnMemoria.leer(ruta)
+        hash_excel = calcular_hash(libro, parametros_lectura())
+        if hash_excel == estado['hash']:
+            log("Archivo guardado sin cambios de contenido")
+            return
+        
+        filas, info_paciente, _ = flujo.obtener_filas(libro, hash_excel)
+        if filas is None:
+            log("❌ No se pudo leer el archivo Excel")
+            return
+        flujo.registrar_historial(hash_excel, [{'hoja': '', 'filas': filas, 'info_paciente': info_paciente}], libro)
+        
+        grafo = crear_grafo_etapas(libro, filas, info_paciente)
+        nuevas, resueltas = comparar_alertas(estado['alertas'], grafo['alertas'])
+        primera_revision = estado['hash'] is None
+        estado.update(hash=hash_excel, alertas=grafo['alertas'])
+        
+        if primera_revision:
+            return
+        
+        for alerta in resueltas:
+            log(f"  ✓ Resuelta: {alerta['medicamento']} - Fila {alerta['fila']}")
+        for alerta in nuevas:
+            log(f"  🆕 Nueva: {alerta['medicamento']} - Fila {alerta['fila']}, Días: {alerta['dias_restantes']}")
+        
+        if nuevas:
+            log(f"🚨 {len(nuevas)} alertas nuevas desde el último guardado")
+            notificar_alertas(grafo, libro)
+    
+    revisar(ruta_excel)
+    log(f"👀 Vigilando cambios en: {ruta_excel}")
+    vigilar_archivo(ruta_excel, revisar)
+
+def renderizar_libro(ruta_excel, todas_hojas=False):
+    """
+    Escaneo, HTML, WhatsApp y MIME de un libro sin enviar nada (modo --renderizar).
+    Devuelve (mensaje MIME o None si no hay alertas, [(teléfono, texto)], número de alertas)
+    """
+    libro = LibroEnMemoria.leer(ruta_excel)
+    if todas_hojas:
+        grafos = crear_grafos_hojas(libro, leer_excel_todas_las_hojas(libro) or [])
+    else:
+        filas, info_paciente = leer_excel_y_escanear_filas(libro)
+        grafos = [crear_grafo_etapas(libro, filas, info_paciente)] if filas is not None else []
+        grafos = [grafo for grafo in grafos if grafo['alertas']]
+    
+    if not grafos:
+        return None, [], 0
+    
+    total_alertas = sum(len(grafo['alertas']) for grafo in grafos)
+    if todas_hojas:
+        cuerpo_html = crear_html_email_varios_pacientes([(grafo['alertas'], grafo['info_con_imagen']) for grafo in grafos])
+        asunto = f"🏥 ALERTAS: {total_alertas} Medicamentos - {len(grafos)} pacientes"
+    else:
+        cuerpo_html = grafos[0]['html']
+        asunto = f"🏥 ALERTAS: {total_alertas} Medicamentos - {grafos[0]['info_paciente']['paciente']}"
+    
+    mensaje = crear_email(GMAIL_USUARIO or 'alertas@localhost', EMAIL_DESTINO or 'destino@localhost',
+                          asunto, cuerpo_html, libro)
+    if todas_hojas:
+        agrupados = crear_mensajes_whatsapp_agrupados([(grafo['info_paciente']['telefono'], grafo['lineas_whatsapp'])
+                                                       for grafo in grafos])
+        whatsapp = [(telefono, texto) for telefono, textos in agrupados.items() for texto in textos]
+    else:
+        whatsapp = [(grafo['info_paciente']['telefono'], texto_whatsapp(grafo['mensaje_whatsapp'], grafo['info_paciente']))
+                    for grafo in grafos if grafo['info_paciente']['telefono']]
+    return mensaje, whatsapp, total_alertas
+
+def generar_panel_pacientes(libros, directorio):
+    """Regenera el panel estático con las páginas de todos los pacientes de los libros (modo --panel)"""
+    from panel_estatico import generar_panel
+    
+    indices = {ruta: indice for _, ruta, indice in libros}
+    
+    def leer_hojas(ruta):
+        if not os.path.exists(ruta):
+            return None, None
+        return flujo.obtener_hojas(ruta, indices[ruta])
+    
+    return generar_panel([(clave, ruta) for clave, ruta, _ in libros], directorio, leer_hojas,
+                         extraer_imagenes_pacientes, crear_html_pagina_panel, crear_html_indice_panel)
+
+def procesar(args, destinos):
+    """Ejecuta el modo elegido en la línea de comandos (digest, vigilancia, todas las hojas o un paciente)"""
+    if args.combinar:
+        combinar_fragmentos(args.resultados)
+        return
+    
+    if args.digest:
+        if not args.manifiesto:
+            log("❌ ERROR: El modo digest necesita --manifiesto o MANIFIESTO_PACIENTES")
+            sys.exit(1)
+        procesar_digest(args.manifiesto, con_agenda=args.agenda)
+        return
+    
+    if args.vigilar:
+        if not os.path.exists(RUTA_EXCEL):
+            log(f"❌ ERROR: No se encontró el archivo Excel: {RUTA_EXCEL}")
+            sys.exit(1)
+        vigilar_excel(RUTA_EXCEL)
+        return
         
     if not FILE_ID_MEDICAMENTOS:
         log("❌ ERROR: Falta FILE_ID_MEDICAMENTOS")
         sys.exit(1)
     
     # Descargar archivo desde Google Drive
-    if not descargar_desde_drive():
+    libro = descargar_desde_drive()
+    if libro is None:
         log("❌ ERROR: No se pudo descargar el archivo desde Drive")
         sys.exit(1)
     
-    if not os.path.exists(RUTA_EXCEL):
-        log(f"❌ ERROR: No se encontró el archivo Excel: {RUTA_EXCEL}")
-        sys.exit(1)
+    if args.todas_hojas:
+        procesar_todas_las_hojas(libro, destinos)
+    else:
+        filas, info_paciente = flujo.escanear_libro(libro, destinos)
+        
+        # Imagen, HTML y texto de WhatsApp solo se calculan si el escaneo encuentra alertas
+        grafo = crear_grafo_etapas(libro, filas, info_paciente)
+        alertas = grafo['alertas']
+        
+        if len(alertas) > 0:
+            log(f"\n🚨 Se encontraron {len(alertas)} alertas")
+            notificar_alertas(grafo, libro)
+        else:
+            log("✅ No se encontraron alertas")
+
+def main(argv=None):
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Sistema de alertas de medicamentos")
+    parser.add_argument('--vigilar', action='store_true',
+                        help="Vigila RUTA_EXCEL en disco y recalcula las alertas en cada guardado")
+    parser.add_argument('--todas-hojas', action='store_true',
+                        help="Escanea todas las hojas con la plantilla de paciente (una hoja por paciente)")
+    parser.add_argument('--digest', action='store_true',
+                        help="Procesa todos los libros del manifiesto y envía un solo email por destinatario")
+    parser.add_argument('--manifiesto', default=MANIFIESTO,
+                        help="Manifiesto JSON de libros (por defecto MANIFIESTO_PACIENTES)")
+    parser.add_argument('--shard', type=leer_fragmento, metavar='i/N',
+                        help="Procesa solo el fragmento i de N del manifiesto y guarda sus resultados sin enviar nada")
+    parser.add_argument('--agenda', action='store_true',
+                        help="Con --digest o --shard, solo revisa los libros cuya fecha más próxima entra en la ventana de alerta, los nuevos y los cambiados")
+    parser.add_argument('--combinar', action='store_true',
+                        help="Junta los resultados de todos los fragmentos y envía el digest")
+    parser.add_argument('--resultados', default=DIRECTORIO_RESULTADOS,
+                        help="Directorio de resultados de los fragmentos (por defecto RESULTADOS_FRAGMENTOS)")
+    parser.add_argument('--renderizar', metavar='DIRECTORIO',
+                        help="Solo renderiza: escribe un .eml y el texto de WhatsApp por libro, sin enviar nada")
+    parser.add_argument('--panel', metavar='DIRECTORIO',
+                        help="Genera un panel HTML estático con una página por paciente y un índice por urgencia; solo reescribe las páginas que cambian")
+    parser.add_argument('--libros', nargs='+',
+                        help="Libros o carpetas de libros a renderizar o a incluir en el panel (por defecto RUTA_EXCEL; con --panel, los del manifiesto si lo hay)")
+    parser.add_argument('--procesos', type=int, default=None,
+                        help="Procesos en paralelo del modo --renderizar (por defecto, uno por CPU)")
+    parser.add_argument('--servir', action='store_true',
+                        help="Arranca un servicio HTTP local de consultas sobre las filas del Excel en memoria")
+    parser.add_argument('--puerto', type=int, default=8765, help="Puerto del servicio de consultas")
+    anadir_opciones_exportacion(parser)
+    parser.add_argument('--bandeja', action='store_true',
+                        help="Guarda las notificaciones en la bandeja de salida y las envía en segundo plano con reintentos")
+    parser.add_argument('--drenar-bandeja', action='store_true',
+                        help="Solo reintenta los envíos pendientes de la bandeja de salida")
+    args = parser.parse_args(argv)
+    
+    log("="*70)
+    log("SISTEMA DE ALERTAS DE MEDICAMENTOS - VERSIÓN PERSONALIZADA")
+    log("="*70)
+    
+    if args.servir:
+        # Consultas de solo lectura: no hace falta configurar el correo
+        from servidor_consultas import servir
+        if not os.path.exists(RUTA_EXCEL):
+            log(f"❌ ERROR: No se encontró el archivo Excel: {RUTA_EXCEL}")
+            sys.exit(1)
+        servir(RUTA_EXCEL, flujo.obtener_hojas, DIAS_ALERTA - 1, args.puerto)
+        return
     
-    alertas, info_paciente = leer_excel_y_buscar_alertas(RUTA_EXCEL)
+    if args.renderizar:
+        # Sin SMTP ni HTTP: no hace falta configurar el correo
+        from renderizado import renderizar_lote
+        renderizar_lote(args.libros or [RUTA_EXCEL], args.renderizar, renderizar_libro, args.procesos, todas_hojas=args.todas_hojas)
+        return
     
-    if alertas is None:
-        log("❌ No se pudo leer el archivo Excel")
+    if args.panel:
+        # Solo lee los libros ya en disco y escribe HTML: no hace falta configurar el correo
+        generar_panel_pacientes(flujo.libros_del_panel(args.libros, args.manifiesto), args.panel)
+        return
+    
+    if args.shard:
+        # Un fragmento solo escanea y renderiza: los envíos los hace el paso de combinación
+        if not args.manifiesto:
+            log("❌ ERROR: El modo por fragmentos necesita --manifiesto o MANIFIESTO_PACIENTES")
+            sys.exit(1)
+        procesar_digest(args.manifiesto, args.shard, args.resultados, args.agenda)
+        return
+    
+    if not EMAIL_DESTINO or not (GMAIL_CUENTAS or (GMAIL_USUARIO and GMAIL_PASSWORD)):
+        log("❌ ERROR: Faltan variables de entorno")
         sys.exit(1)
     
-    if len(alertas) > 0:
-        log(f"\n🚨 Se encontraron {len(alertas)} alertas")
-        
-        cuerpo_html = crear_html_email_personalizado(alertas, info_paciente)
-        asunto = f"🏥 ALERTAS: {len(alertas)} Medicamentos - {info_paciente['paciente']}"
-        
-        if enviar_email(EMAIL_DESTINO, asunto, cuerpo_html, RUTA_EXCEL):
-            log(f"✅ Email enviado a: {EMAIL_DESTINO}")
-        
-        if info_paciente['telefono']:
-            mensaje_wa = crear_mensaje_whatsapp(alertas)
-            enviar_whatsapp(info_paciente['telefono'], mensaje_wa, info_paciente)
-    else:
-        log("✅ No se encontraron alertas")
+    with flujo.envios(con_bandeja=args.bandeja or args.drenar_bandeja):
+        if not args.drenar_bandeja:
+            procesar(args, destinos_exportacion(args))
     
     log("="*70)
     log("PROCESO FINALIZADO")
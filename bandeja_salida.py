@@ -0,0 +1,218 @@
+"""
+BANDEJA DE SALIDA PERSISTENTE
+Las notificaciones ya renderizadas se guardan en SQLite y un grupo de hilos
+las envía en segundo plano, con reintentos y mensajes muertos
+"""
+
+from contextlib import closing, contextmanager
+from datetime import datetime, timedelta
+import json
+import random
+import sqlite3
+import threading
+import time
+
+from bitacora import log
+
+MAX_INTENTOS = 6
+ESPERA_BASE = 30       # segundos antes del primer reintento
+ESPERA_MAXIMA = 3600   # tope de la espera exponencial
+PLAZO_ENVIANDO = 900   # segundos tras los que un mensaje 'enviando' se da por interrumpido
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS mensajes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    canal TEXT NOT NULL,
+    destinatario TEXT NOT NULL,
+    carga TEXT NOT NULL,
+    adjunto_nombre TEXT,
+    adjunto BLOB,
+    estado TEXT NOT NULL DEFAULT 'pendiente',
+    intentos INTEGER NOT NULL DEFAULT 0,
+    proximo_intento REAL NOT NULL,
+    ultimo_error TEXT,
+    creado TEXT NOT NULL,
+    actualizado TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_mensajes_pendientes ON mensajes (estado, proximo_intento);
+"""
+
+def _ahora():
+    return datetime.now().isoformat(timespec='seconds')
+
+class BandejaSalida:
+    """Cola durable de notificaciones: pendiente -> enviando -> enviado | muerto"""
+
+    def __init__(self, ruta_db):
+        self.ruta_db = ruta_db
+        with self._transaccion() as conexion:
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.executescript(ESQUEMA)
+            # Mensajes que quedaron a medias si el proceso anterior se cortó. Los recientes pueden
+            # estar enviándose en otra ejecución que sigue en marcha: esos no se tocan
+            caducado = (datetime.now() - timedelta(seconds=PLAZO_ENVIANDO)).isoformat(timespec='seconds')
+            recuperados = conexion.execute(
+                "UPDATE mensajes SET estado = 'pendiente', actualizado = ? WHERE estado = 'enviando' AND actualizado < ?",
+                (_ahora(), caducado)
+            ).rowcount
+        if recuperados:
+            log(f"↻ {recuperados} mensajes recuperados de una ejecución interrumpida")
+
+    def _conectar(self):
+        # Una conexión por operación: cada hilo trabaja con la suya
+        return sqlite3.connect(self.ruta_db, timeout=30)
+
+    @contextmanager
+    def _transaccion(self):
+        """Conexión de una operación: confirma (o deshace) al salir y siempre se cierra"""
+        with closing(self._conectar()) as conexion, conexion:
+            yield conexion
+
+    def encolar(self, canal, destinatario, carga, adjunto=None):
+        """Guarda una notificación lista para enviar; adjunto = (nombre, bytes) o None"""
+        nombre_adjunto, datos_adjunto = adjunto if adjunto else (None, None)
+        with self._transaccion() as conexion:
+            cursor = conexion.execute(
+                "INSERT INTO mensajes (canal, destinatario, carga, adjunto_nombre, adjunto, proximo_intento, creado, actualizado) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (canal, destinatario, json.dumps(carga, ensure_ascii=False, default=str),
+                 nombre_adjunto, datos_adjunto, time.time(), _ahora(), _ahora())
+            )
+            return cursor.lastrowid
+
+    def reclamar(self):
+        """Marca como 'enviando' el siguiente mensaje vencido y lo devuelve, o None"""
+        conexion = self._conectar()
+        try:
+            conexion.execute("BEGIN IMMEDIATE")
+            fila = conexion.execute(
+                "SELECT id, canal, destinatario, carga, adjunto_nombre, adjunto, intentos FROM mensajes "
+                "WHERE estado = 'pendiente' AND proximo_intento <= ? ORDER BY proximo_intento, id LIMIT 1",
+                (time.time(),)
+            ).fetchone()
+            if fila is None:
+                conexion.rollback()
+                return None
+            conexion.execute(
+                "UPDATE mensajes SET estado = 'enviando', actualizado = ? WHERE id = ?", (_ahora(), fila[0])
+            )
+            conexion.commit()
+        finally:
+            conexion.close()
+
+        identificador, canal, destinatario, carga, nombre_adjunto, datos_adjunto, intentos = fila
+        return {
+            'id': identificador,
+            'canal': canal,
+            'destinatario': destinatario,
+            'carga': json.loads(carga),
+            'adjunto': (nombre_adjunto, bytes(datos_adjunto)) if datos_adjunto is not None else None,
+            'intentos': intentos
+        }
+
+    def marcar_enviado(self, identificador):
+        with self._transaccion() as conexion:
+            conexion.execute(
+                "UPDATE mensajes SET estado = 'enviado', intentos = intentos + 1, adjunto = NULL, actualizado = ? "
+                "WHERE id = ?", (_ahora(), identificador)
+            )
+
+    def marcar_fallido(self, identificador, intentos, error):
+        """Programa un reintento con espera exponencial o lo pasa a mensajes muertos"""
+        intentos += 1
+        if intentos >= MAX_INTENTOS:
+            estado, espera = 'muerto', 0
+        else:
+            estado = 'pendiente'
+            espera = min(ESPERA_MAXIMA, ESPERA_BASE * 2 ** (intentos - 1)) * random.uniform(0.8, 1.2)
+        with self._transaccion() as conexion:
+            conexion.execute(
+                "UPDATE mensajes SET estado = ?, intentos = ?, proximo_intento = ?, ultimo_error = ?, actualizado = ? "
+                "WHERE id = ?",
+                (estado, intentos, time.time() + espera, str(error)[:500], _ahora(), identificador)
+            )
+        return estado, espera
+
+    def pendientes_vencidos(self, hasta):
+        """Número de mensajes pendientes que vencen antes de `hasta` (timestamp)"""
+        with self._transaccion() as conexion:
+            return conexion.execute(
+                "SELECT COUNT(*) FROM mensajes WHERE estado IN ('pendiente', 'enviando') AND proximo_intento <= ?",
+                (hasta,)
+            ).fetchone()[0]
+
+    def resumen(self):
+        """Número de mensajes por estado"""
+        with self._transaccion() as conexion:
+            return dict(conexion.execute("SELECT estado, COUNT(*) FROM mensajes GROUP BY estado").fetchall())
+
+class TrabajadoresBandeja:
+    """Hilos que vacían la bandeja; enviadores = {canal: funcion(destinatario, carga, adjunto) -> bool}"""
+
+    def __init__(self, bandeja, enviadores, hilos=4):
+        self.bandeja = bandeja
+        self.enviadores = enviadores
+        self.hilos = hilos
+        self._cerrando = threading.Event()
+        self._limite = None
+        self._despertar = threading.Condition()
+        self._trabajadores = []
+
+    def iniciar(self):
+        for numero in range(self.hilos):
+            hilo = threading.Thread(target=self._trabajar, name=f"bandeja-{numero}", daemon=True)
+            hilo.start()
+            self._trabajadores.append(hilo)
+
+    def avisar(self):
+        """Despierta a los hilos tras encolar un mensaje nuevo"""
+        with self._despertar:
+            self._despertar.notify_all()
+
+    def _trabajar(self):
+        while True:
+            # Pasado el plazo de cierre no se empieza ningún envío más
+            if self._cerrando.is_set() and time.time() >= self._limite:
+                return
+            mensaje = self.bandeja.reclamar()
+            if mensaje is None:
+                if self._cerrando.is_set() and not self.bandeja.pendientes_vencidos(self._limite):
+                    return
+                with self._despertar:
+                    self._despertar.wait(timeout=1)
+                continue
+            self._enviar(mensaje)
+
+    def _enviar(self, mensaje):
+        try:
+            enviado = self.enviadores[mensaje['canal']](mensaje['destinatario'], mensaje['carga'], mensaje['adjunto'])
+            error = None if enviado else "el proveedor rechazó el envío"
+        except Exception as e:
+            enviado, error = False, e
+
+        if enviado:
+            self.bandeja.marcar_enviado(mensaje['id'])
+            log(f"📤 {mensaje['canal']} #{mensaje['id']} enviado a {mensaje['destinatario']}")
+            return
+
+        estado, espera = self.bandeja.marcar_fallido(mensaje['id'], mensaje['intentos'], error)
+        if estado == 'muerto':
+            log(f"☠️ {mensaje['canal']} #{mensaje['id']} descartado tras {MAX_INTENTOS} intentos: {error}")
+        else:
+            log(f"⏳ {mensaje['canal']} #{mensaje['id']} falló ({error}), reintento en {espera:.0f} s")
+
+    def cerrar(self, espera_maxima=120):
+        """Espera a que se envíe lo pendiente; los reintentos posteriores quedan para la próxima ejecución"""
+        self._limite = time.time() + espera_maxima
+        self._cerrando.set()
+        self.avisar()
+        for hilo in self._trabajadores:
+            hilo.join(timeout=max(0, self._limite - time.time()))
+        resumen = self.bandeja.resumen()
+        sin_enviar = resumen.get('pendiente', 0) + resumen.get('enviando', 0)
+        if any(hilo.is_alive() for hilo in self._trabajadores):
+            log(f"⚠️ Plazo de cierre agotado con envíos en curso; {sin_enviar} mensajes quedan sin enviar para la próxima ejecución")
+        elif sin_enviar:
+            log(f"{sin_enviar} mensajes quedan en la bandeja para la próxima ejecución")
+        log(f"Bandeja de salida: {', '.join(f'{estado}={total}' for estado, total in sorted(resumen.items())) or 'vacía'}")
+        return resumen
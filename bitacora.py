@@ -0,0 +1,13 @@
+"""
+BITÁCORA
+Mensajes con fecha y hora en la salida estándar, los mismos en todos los
+módulos. Cada módulo lo importa con `from bitacora import log`, así que se
+puede silenciar un módulo concreto sustituyendo su atributo `log`
+"""
+
+from datetime import datetime
+
+def log(mensaje):
+    """Registrar mensajes con timestamp"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] {mensaje}")
@@ -0,0 +1,102 @@
+"""
+ÍNDICE EN CACHÉ DE LAS FILAS ESCANEADAS
+Guarda las fechas leídas del Excel junto con el hash de su contenido para
+poder recalcular las alertas del día sin volver a abrir el archivo
+"""
+
+from datetime import date, datetime
+import hashlib
+import json
+import os
+
+from libro_memoria import LibroEnMemoria
+from registros import FilaColumna, FilaMedicamento
+
+# Formato de las filas guardadas: los índices de otra versión se descartan y se vuelve a leer el Excel
+VERSION_INDICE = 2
+
+def calcular_hash(ruta_archivo, parametros=None):
+    """Calcula el hash SHA-256 del archivo (o del libro en memoria) y de los parámetros de lectura"""
+    sha = hashlib.sha256()
+    if parametros:
+        sha.update(json.dumps(parametros, sort_keys=True, default=str).encode('utf-8'))
+
+    if isinstance(ruta_archivo, LibroEnMemoria):
+        sha.update(ruta_archivo.datos)
+        return sha.hexdigest()
+
+    with open(ruta_archivo, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(1024 * 1024), b''):
+            sha.update(bloque)
+
+    return sha.hexdigest()
+
+def _leer_datos(ruta_indice, hash_archivo):
+    """Lee el JSON del índice si existe y corresponde al hash"""
+    try:
+        with open(ruta_indice, 'r', encoding='utf-8') as archivo:
+            datos = json.load(archivo)
+    except (OSError, ValueError):
+        return None
+
+    if datos.get('hash') != hash_archivo or datos.get('version') != VERSION_INDICE:
+        return None
+    return datos
+
+def _escribir_datos(ruta_indice, datos):
+    """Escribe el JSON del índice de forma atómica"""
+    directorio = os.path.dirname(ruta_indice)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+
+    # Escritura atómica para no dejar un índice a medias si el proceso se corta
+    ruta_temporal = f"{ruta_indice}.tmp"
+    with open(ruta_temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(datos, archivo, ensure_ascii=False, default=str)
+    os.replace(ruta_temporal, ruta_indice)
+
+def _serializar_hoja(filas, info_paciente):
+    return {
+        'info_paciente': {clave: valor for clave, valor in info_paciente.items() if clave != 'imagen'},
+        'filas': [dict(fila, fecha=fila['fecha'].isoformat()) for fila in filas]
+    }
+
+def _deserializar_filas(filas):
+    # Solo las filas de una columna concreta se guardan con 'columna'
+    return [
+        (FilaColumna if 'columna' in fila else FilaMedicamento)(**dict(fila, fecha=date.fromisoformat(fila['fecha'])))
+        for fila in filas
+    ]
+
+def cargar_indice(ruta_indice, hash_archivo):
+    """Devuelve (filas, info_paciente) si el índice corresponde al hash, o None"""
+    datos = _leer_datos(ruta_indice, hash_archivo)
+    if datos is None:
+        return None
+    return _deserializar_filas(datos['filas']), datos['info_paciente']
+
+def guardar_indice(ruta_indice, hash_archivo, filas, info_paciente):
+    """Guarda las filas escaneadas y la información del paciente (sin la imagen)"""
+    datos = {'hash': hash_archivo, 'version': VERSION_INDICE, 'generado': datetime.now().isoformat(timespec='seconds')}
+    datos.update(_serializar_hoja(filas, info_paciente))
+    _escribir_datos(ruta_indice, datos)
+
+def cargar_indice_hojas(ruta_indice, hash_archivo):
+    """Versión multihoja de cargar_indice: devuelve [{'hoja', 'filas', 'info_paciente'}] o None"""
+    datos = _leer_datos(ruta_indice, hash_archivo)
+    if datos is None:
+        return None
+    return [
+        {'hoja': hoja['hoja'], 'filas': _deserializar_filas(hoja['filas']), 'info_paciente': hoja['info_paciente']}
+        for hoja in datos['hojas']
+    ]
+
+def guardar_indice_hojas(ruta_indice, hash_archivo, hojas):
+    """Versión multihoja de guardar_indice"""
+    datos = {
+        'hash': hash_archivo,
+        'version': VERSION_INDICE,
+        'generado': datetime.now().isoformat(timespec='seconds'),
+        'hojas': [dict(_serializar_hoja(hoja['filas'], hoja['info_paciente']), hoja=hoja['hoja']) for hoja in hojas]
+    }
+    _escribir_datos(ruta_indice, datos)
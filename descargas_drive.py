@@ -0,0 +1,138 @@
+"""
+DESCARGAS CONCURRENTES DESDE GOOGLE DRIVE
+Descarga varios libros a la vez, reanuda las transferencias cortadas con
+HTTP Range sobre un archivo .part y verifica el contenido antes de usarlo
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import base64
+import hashlib
+import os
+import re
+import time
+
+from bitacora import log
+
+# La plantilla se puede cambiar para probar contra un servidor HTTP local
+URL_DESCARGA = os.environ.get(
+    'URL_DESCARGA_DRIVE', 'https://drive.usercontent.google.com/download?id={file_id}&export=download&confirm=t'
+)
+DESCARGAS_SIMULTANEAS = 4
+REINTENTOS = 3
+TAMANO_BLOQUE = 64 * 1024
+
+class ErrorDescarga(Exception):
+    """La descarga terminó incompleta o con un contenido distinto al esperado"""
+
+def url_descarga(file_id, plantilla=None):
+    return (plantilla or URL_DESCARGA).format(file_id=file_id)
+
+def _hash_archivo(ruta, algoritmo):
+    resumen = hashlib.new(algoritmo)
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(1024 * 1024), b''):
+            resumen.update(bloque)
+    return resumen
+
+def _tamano_total(respuesta):
+    """Tamaño completo del archivo según Content-Range (206) o Content-Length (200)"""
+    rango = re.match(r'bytes \d+-\d+/(\d+)', respuesta.headers.get('Content-Range', ''))
+    if rango:
+        return int(rango.group(1))
+    if respuesta.status_code == 200 and respuesta.headers.get('Content-Length'):
+        return int(respuesta.headers['Content-Length'])
+    return None
+
+def _md5_declarado(respuesta):
+    """MD5 del archivo completo que Google envía en X-Goog-Hash, si viene"""
+    md5 = re.search(r'md5=([A-Za-z0-9+/=]+)', respuesta.headers.get('X-Goog-Hash', ''))
+    return base64.b64decode(md5.group(1)).hex() if md5 else None
+
+def _transferir(url, ruta_parcial):
+    """Descarga (o continúa) el archivo en ruta_parcial; devuelve el MD5 declarado por el servidor"""
+    import requests
+
+    descargado = os.path.getsize(ruta_parcial) if os.path.exists(ruta_parcial) else 0
+    cabeceras = {'Range': f'bytes={descargado}-'} if descargado else {}
+
+    with requests.get(url, headers=cabeceras, stream=True, timeout=30) as respuesta:
+        if respuesta.status_code == 416:
+            # El .part ya estaba completo; el checksum decide si vale
+            return None
+        respuesta.raise_for_status()
+        if 'text/html' in respuesta.headers.get('Content-Type', ''):
+            raise ErrorDescarga("Drive devolvió una página HTML (¿el archivo no es público?)")
+
+        if descargado and respuesta.status_code == 206:
+            modo = 'ab'
+        else:
+            # Sin soporte de Range el servidor manda el archivo entero: se empieza de cero
+            modo, descargado = 'wb', 0
+
+        total = _tamano_total(respuesta)
+        with open(ruta_parcial, modo) as archivo:
+            for bloque in respuesta.iter_content(TAMANO_BLOQUE):
+                archivo.write(bloque)
+        md5 = _md5_declarado(respuesta)
+
+    tamano = os.path.getsize(ruta_parcial)
+    if total is not None and tamano != total:
+        raise ErrorDescarga(f"descarga incompleta: {tamano} de {total} bytes")
+    return md5
+
+def descargar_archivo(url, ruta_destino, sha256=None, reintentos=REINTENTOS):
+    """Descarga url en ruta_destino pasando por ruta_destino.part; reanuda si se corta"""
+    import requests
+
+    directorio = os.path.dirname(ruta_destino)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    ruta_parcial = f"{ruta_destino}.part"
+
+    for intento in range(1, reintentos + 1):
+        try:
+            md5 = _transferir(url, ruta_parcial)
+            break
+        except (requests.RequestException, ErrorDescarga) as e:
+            estado = getattr(getattr(e, 'response', None), 'status_code', None)
+            # Un 404 o 403 no se arregla reintentando; un 429 o un 5xx sí
+            if intento == reintentos or (estado and 400 <= estado < 500 and estado != 429):
+                raise
+            log(f"⚠️ Descarga interrumpida ({e}), reanudando desde {os.path.getsize(ruta_parcial) if os.path.exists(ruta_parcial) else 0} bytes")
+            time.sleep(2 ** (intento - 1))
+
+    # Un .part que no cuadra con el checksum se descarta para no reanudar sobre datos corruptos
+    if sha256 and _hash_archivo(ruta_parcial, 'sha256').hexdigest() != sha256.lower():
+        os.remove(ruta_parcial)
+        raise ErrorDescarga("el SHA-256 no coincide con el del manifiesto")
+    if md5 and _hash_archivo(ruta_parcial, 'md5').hexdigest() != md5:
+        os.remove(ruta_parcial)
+        raise ErrorDescarga("el MD5 no coincide con el que declara Google")
+
+    os.replace(ruta_parcial, ruta_destino)
+    return ruta_destino
+
+def descargar_varios(trabajos, descargas_simultaneas=DESCARGAS_SIMULTANEAS, plantilla_url=None):
+    """
+    Descarga [{'file_id', 'ruta', 'sha256' opcional}] en paralelo y produce
+    (trabajo, ruta) según va terminando cada uno; ruta es None si falló
+    """
+    if not trabajos:
+        return
+
+    log(f"Descargando {len(trabajos)} archivos desde Google Drive ({descargas_simultaneas} a la vez)...")
+    with ThreadPoolExecutor(max_workers=descargas_simultaneas) as grupo:
+        futuros = {
+            grupo.submit(descargar_archivo, url_descarga(trabajo['file_id'], plantilla_url),
+                         trabajo['ruta'], trabajo.get('sha256')): trabajo
+            for trabajo in trabajos
+        }
+        for futuro in as_completed(futuros):
+            trabajo = futuros[futuro]
+            try:
+                ruta = futuro.result()
+                log(f"✓ Archivo descargado: {ruta}")
+            except Exception as e:
+                log(f"✗ Error al descargar {trabajo['file_id']}: {e}")
+                ruta = None
+            yield trabajo, ruta
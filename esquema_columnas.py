@@ -0,0 +1,183 @@
+"""
+DETECCIÓN DE COLUMNAS POR CABECERA
+Busca en las primeras filas de la hoja la fila de títulos de la tabla
+(MEDICAMENTO, USO, FECHA DE REVISIÓN...) y deduce de ella la fila de inicio y
+las columnas, en lugar de suponer A/B/J desde la fila 18. Cada plantilla
+nueva se detecta una vez y se guarda con la huella de su fila de títulos: en
+las siguientes ejecuciones basta con comprobar esa fila
+"""
+
+from datetime import datetime
+from typing import NamedTuple
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+
+from bitacora import log
+
+RUTA_ESQUEMAS = os.environ.get('RUTA_ESQUEMAS', '.cache_alertas/esquemas_columnas.json')
+# DETECTAR_COLUMNAS=0 vuelve a las columnas fijas de cada script
+DETECTAR_COLUMNAS = os.environ.get('DETECTAR_COLUMNAS', '1') != '0'
+
+FILAS_CABECERA = 40     # zona en la que se busca la fila de títulos
+COLUMNAS_CABECERA = 30
+PALABRAS_MAXIMAS = 6    # un título de columna es corto; las frases largas no cuentan
+# Subir al cambiar las reglas de detección: descarta los esquemas guardados y los índices en caché
+VERSION_DETECCION = 1
+
+ETIQUETAS_MEDICAMENTO = {'medicamento', 'medicamentos', 'farmaco', 'farmacos', 'medicacion', 'producto'}
+ETIQUETAS_USO = {'uso', 'indicacion', 'indicaciones', 'tratamiento'}
+# Una columna con alguna de estas palabras es de fechas; si no hay ninguna, vale cualquier 'fecha'
+ETIQUETAS_FECHA = {'vencimiento', 'caducidad', 'revision', 'reposicion', 'renovacion', 'proxima', 'receta'}
+# Fechas que no vencen nunca: no se vigilan aunque la columna se llame 'fecha ...'
+ETIQUETAS_SIN_VENCIMIENTO = {'inicio', 'nacimiento', 'ingreso', 'alta', 'compra'}
+
+class Esquema(NamedTuple):
+    fila_inicio: int
+    medicamento: int     # índices de columna desde 1
+    uso: int
+    fechas: tuple
+
+def normalizar_etiqueta(valor):
+    """'Fecha de Revisión:' -> 'fecha de revision'; None si la celda no es texto"""
+    if not isinstance(valor, str):
+        return None
+    texto = ''.join(c for c in unicodedata.normalize('NFD', valor) if unicodedata.category(c) != 'Mn')
+    texto = ' '.join(re.findall(r'[a-z0-9]+', texto.lower()))
+    return texto or None
+
+def huella_cabecera(textos):
+    """Huella de una fila de títulos {columna: texto normalizado}"""
+    contenido = json.dumps(sorted(textos.items()), ensure_ascii=False)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()[:16]
+
+def _textos_de_fila(valores):
+    """Títulos cortos de la fila; vacío si la fila tiene fechas o números, porque entonces es de datos"""
+    textos = {}
+    for columna, valor in enumerate(valores, 1):
+        if valor is not None and not isinstance(valor, str):
+            return {}
+        texto = normalizar_etiqueta(valor)
+        if texto and len(texto.split()) <= PALABRAS_MAXIMAS:
+            textos[columna] = texto
+    return textos
+
+def esquema_de_cabecera(fila, textos):
+    """Esquema que se deduce de una fila de títulos, o None si no tiene medicamento y fecha"""
+    palabras = {columna: set(texto.split()) for columna, texto in textos.items()}
+    # 'MEDICAMENTO 12' es el nombre de un medicamento, no un título
+    medicamento = next((columna for columna, claves in palabras.items()
+                        if claves & ETIQUETAS_MEDICAMENTO and not claves & ETIQUETAS_USO
+                        and not any(clave.isdigit() for clave in claves)), None)
+    uso = next((columna for columna, claves in palabras.items()
+                if claves & ETIQUETAS_USO and columna != medicamento), None)
+    candidatas = {columna: claves for columna, claves in palabras.items()
+                  if columna != medicamento and not claves & ETIQUETAS_SIN_VENCIMIENTO}
+    fechas = tuple(columna for columna, claves in candidatas.items() if claves & ETIQUETAS_FECHA) or \
+        tuple(columna for columna, claves in candidatas.items() if claves & {'fecha', 'fechas'})
+
+    if medicamento is None or not fechas:
+        return None
+    # Sin columna de uso se mantiene la de al lado del medicamento, como en la plantilla original
+    return Esquema(fila + 1, medicamento, uso or medicamento + 1, fechas)
+
+def detectar_esquema(filas):
+    """Recorre las filas de la zona de cabecera (desde la fila 1) y devuelve (esquema, fila, textos) o None"""
+    for fila, valores in enumerate(filas, 1):
+        textos = _textos_de_fila(valores)
+        if len(textos) < 2:
+            continue
+        esquema = esquema_de_cabecera(fila, textos)
+        if esquema is not None:
+            return esquema, fila, textos
+    return None
+
+class CacheEsquemas:
+    """Esquemas ya detectados, por huella de su fila de títulos; compartido entre hilos"""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._esquemas = None
+        self._cerrojo = threading.Lock()
+
+    def _cargar(self):
+        if self._esquemas is None:
+            try:
+                with open(self.ruta, 'r', encoding='utf-8') as archivo:
+                    self._esquemas = json.load(archivo)
+            except (OSError, ValueError):
+                self._esquemas = {}
+        return self._esquemas
+
+    def _guardar(self):
+        directorio = os.path.dirname(self.ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        ruta_temporal = f"{self.ruta}.tmp"
+        with open(ruta_temporal, 'w', encoding='utf-8') as archivo:
+            json.dump(self._esquemas, archivo, ensure_ascii=False)
+        os.replace(ruta_temporal, self.ruta)
+
+    def buscar(self, filas):
+        """Esquema de una plantilla ya conocida: solo se compara su fila de títulos"""
+        with self._cerrojo:
+            conocidos = list(self._cargar().values())
+        for conocido in conocidos:
+            if conocido.get('version') != VERSION_DETECCION:
+                continue
+            if conocido['fila'] <= len(filas):
+                valores = filas[conocido['fila'] - 1]
+                if all(normalizar_etiqueta(valores[int(columna) - 1] if len(valores) >= int(columna) else None) == texto
+                       for columna, texto in conocido['cabecera'].items()):
+                    fila_inicio, medicamento, uso, fechas = conocido['esquema']
+                    return Esquema(fila_inicio, medicamento, uso, tuple(fechas))
+        return None
+
+    def anadir(self, esquema, fila, textos):
+        huella = huella_cabecera(textos)
+        with self._cerrojo:
+            self._cargar()[huella] = {
+                'fila': fila,
+                'cabecera': {str(columna): texto for columna, texto in textos.items()},
+                'esquema': list(esquema),
+                'version': VERSION_DETECCION,
+                'detectado': datetime.now().isoformat(timespec='seconds'),
+            }
+            try:
+                self._guardar()
+            except OSError as e:
+                log(f"⚠️ No se pudo guardar el esquema de columnas: {e}")
+        return huella
+
+cache_esquemas = CacheEsquemas(RUTA_ESQUEMAS)
+
+def esquema_de_hoja(sheet, por_defecto):
+    """Esquema de columnas de la hoja: el de su cabecera si se reconoce, si no por_defecto"""
+    if not DETECTAR_COLUMNAS:
+        return por_defecto
+
+    # Sin pasar de las dimensiones de la hoja: en modo normal openpyxl crearía las celdas vacías
+    filas = list(sheet.iter_rows(min_row=1, max_row=min(FILAS_CABECERA, sheet.max_row or FILAS_CABECERA),
+                                 max_col=min(COLUMNAS_CABECERA, sheet.max_column or COLUMNAS_CABECERA),
+                                 values_only=True))
+    esquema = cache_esquemas.buscar(filas)
+    if esquema is None:
+        detectado = detectar_esquema(filas)
+        if detectado is None:
+            return por_defecto
+
+        esquema, fila, textos = detectado
+        huella = cache_esquemas.anadir(esquema, fila, textos)
+        log(f"📐 Plantilla nueva ({huella}): títulos en la fila {fila}, medicamento en la columna {esquema.medicamento}, "
+            f"uso en la {esquema.uso}, fechas en {', '.join(str(columna) for columna in esquema.fechas)}")
+
+    # Si la cabecera tiene varias columnas de fecha y entre ellas están las de siempre, mandan esas
+    comunes = tuple(columna for columna in esquema.fechas if columna in por_defecto.fechas)
+    return esquema._replace(fechas=comunes) if comunes else esquema
+
+def parametros_esquema():
+    """Parámetros que invalidan el índice en caché si cambia la forma de elegir columnas"""
+    return {'detectar_columnas': DETECTAR_COLUMNAS, 'version_deteccion': VERSION_DETECCION}
@@ -0,0 +1,34 @@
+"""
+GRAFO DE ETAPAS BAJO DEMANDA
+Cada etapa declara de qué otras depende y solo se calcula la primera vez que
+alguien pide su resultado
+"""
+
+class GrafoEtapas:
+    """Grafo de etapas con evaluación perezosa y memoizada"""
+
+    def __init__(self):
+        self._etapas = {}
+        self._resultados = {}
+
+    def valor(self, nombre, valor):
+        """Registra una etapa cuyo resultado ya se conoce"""
+        self._resultados[nombre] = valor
+
+    def etapa(self, nombre, funcion, *dependencias):
+        """Registra una etapa: funcion recibe los resultados de sus dependencias"""
+        self._etapas[nombre] = (funcion, dependencias)
+        self._resultados.pop(nombre, None)
+
+    def calculada(self, nombre):
+        """Indica si la etapa ya se evaluó"""
+        return nombre in self._resultados
+
+    def __getitem__(self, nombre):
+        if nombre not in self._resultados:
+            if nombre not in self._etapas:
+                raise KeyError(f"Etapa no registrada: {nombre}")
+            funcion, dependencias = self._etapas[nombre]
+            argumentos = [self[dependencia] for dependencia in dependencias]
+            self._resultados[nombre] = funcion(*argumentos)
+        return self._resultados[nombre]
@@ -0,0 +1,152 @@
+"""
+EXPORTACIÓN DE LA TABLA DE MEDICAMENTOS
+Escribe todas las filas escaneadas (no solo las alertas) en SQLite y,
+opcionalmente, en Parquet o CSV para que otras herramientas no relean el Excel
+"""
+
+from datetime import date, datetime
+import csv
+import sqlite3
+
+from bitacora import log
+from libro_memoria import origen_libro
+
+COLUMNAS = ['hash_libro', 'hoja', 'paciente', 'fila', 'columna', 'medicamento', 'uso', 'fecha', 'dias_restantes']
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS libros (
+    hash_libro TEXT NOT NULL,
+    origen TEXT NOT NULL,
+    fecha_calculo TEXT NOT NULL,
+    exportado TEXT NOT NULL,
+    PRIMARY KEY (hash_libro, origen)
+);
+CREATE TABLE IF NOT EXISTS medicamentos (
+    hash_libro TEXT NOT NULL,
+    hoja TEXT NOT NULL,
+    paciente TEXT,
+    fila INTEGER NOT NULL,
+    columna TEXT NOT NULL,
+    medicamento TEXT,
+    uso TEXT,
+    fecha TEXT NOT NULL,
+    dias_restantes INTEGER,
+    PRIMARY KEY (hash_libro, hoja, fila, columna)
+);
+CREATE INDEX IF NOT EXISTS idx_medicamentos_fecha ON medicamentos (fecha);
+CREATE INDEX IF NOT EXISTS idx_medicamentos_paciente ON medicamentos (paciente, fecha);
+"""
+
+def registros_para_exportar(hash_libro, hojas, fecha_hoy=None):
+    """Aplana [{'hoja', 'filas', 'info_paciente'}] en registros con los días restantes"""
+    fecha_hoy = fecha_hoy or date.today()
+    registros = []
+    for hoja in hojas:
+        paciente = str(hoja['info_paciente']['paciente'])
+        for fila in hoja['filas']:
+            registros.append({
+                'hash_libro': hash_libro,
+                'hoja': hoja.get('hoja') or '',
+                'paciente': paciente,
+                'fila': fila['fila'],
+                'columna': fila.get('columna', ''),
+                'medicamento': fila['medicamento'],
+                'uso': fila['uso'],
+                'fecha': fila['fecha'].isoformat(),
+                'dias_restantes': (fila['fecha'] - fecha_hoy).days
+            })
+    return registros
+
+def exportar_sqlite(ruta_db, hash_libro, hojas, origen, fecha_hoy=None):
+    """
+    Upsert incremental por hash del libro y origen; devuelve las filas escritas. Dos
+    orígenes con el mismo contenido (una plantilla copiada) comparten las filas del hash
+    """
+    fecha_hoy = fecha_hoy or date.today()
+    conexion = sqlite3.connect(ruta_db)
+    try:
+        with conexion:
+            conexion.executescript(ESQUEMA)
+            existente = conexion.execute(
+                "SELECT fecha_calculo FROM libros WHERE hash_libro = ? AND origen = ?", (hash_libro, origen)
+            ).fetchone()
+
+            if existente and existente[0] == fecha_hoy.isoformat():
+                log("✓ Libro ya exportado hoy, SQLite sin cambios")
+                return 0
+
+            if existente:
+                # Mismo contenido que en una ejecución anterior: solo cambian los días restantes
+                cursor = conexion.execute(
+                    "UPDATE medicamentos SET dias_restantes = CAST(julianday(fecha) - julianday(?) AS INTEGER) "
+                    "WHERE hash_libro = ?",
+                    (fecha_hoy.isoformat(), hash_libro)
+                )
+                escritas = cursor.rowcount
+            else:
+                # Contenido nuevo: se reemplaza la versión anterior del mismo origen; sus filas
+                # solo se borran si ningún otro origen tiene ese mismo contenido
+                conexion.execute("DELETE FROM libros WHERE origen = ?", (origen,))
+                conexion.execute(
+                    "DELETE FROM medicamentos WHERE hash_libro NOT IN (SELECT hash_libro FROM libros)"
+                )
+                registros = registros_para_exportar(hash_libro, hojas, fecha_hoy)
+                conexion.executemany(
+                    f"INSERT INTO medicamentos ({', '.join(COLUMNAS)}) "
+                    f"VALUES ({', '.join(':' + columna for columna in COLUMNAS)}) "
+                    "ON CONFLICT (hash_libro, hoja, fila, columna) DO UPDATE SET "
+                    "paciente = excluded.paciente, medicamento = excluded.medicamento, uso = excluded.uso, "
+                    "fecha = excluded.fecha, dias_restantes = excluded.dias_restantes",
+                    registros
+                )
+                escritas = len(registros)
+
+            conexion.execute(
+                "INSERT INTO libros (hash_libro, origen, fecha_calculo, exportado) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (hash_libro, origen) DO UPDATE SET fecha_calculo = excluded.fecha_calculo, "
+                "exportado = excluded.exportado",
+                (hash_libro, origen, fecha_hoy.isoformat(), datetime.now().isoformat(timespec='seconds'))
+            )
+        log(f"✓ Exportadas {escritas} filas a SQLite: {ruta_db}")
+        return escritas
+    finally:
+        conexion.close()
+
+def exportar_csv(ruta_csv, registros):
+    """Escribe los registros en CSV (UTF-8 con BOM para que Excel lo abra bien)"""
+    with open(ruta_csv, 'w', newline='', encoding='utf-8-sig') as archivo:
+        escritor = csv.DictWriter(archivo, fieldnames=COLUMNAS)
+        escritor.writeheader()
+        escritor.writerows(registros)
+    log(f"✓ Exportadas {len(registros)} filas a CSV: {ruta_csv}")
+
+def exportar_parquet(ruta_parquet, registros):
+    """Escribe los registros en Parquet si pyarrow está instalado"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        log("⚠️ pyarrow no está instalado, se omite la exportación a Parquet")
+        return False
+
+    tabla = pyarrow.table({columna: [registro[columna] for registro in registros] for columna in COLUMNAS})
+    pyarrow.parquet.write_table(tabla, ruta_parquet)
+    log(f"✓ Exportadas {len(registros)} filas a Parquet: {ruta_parquet}")
+    return True
+
+def exportar(hash_libro, hojas, origen, ruta_sqlite=None, ruta_parquet=None, ruta_csv=None):
+    """Exporta las filas escaneadas a los destinos indicados"""
+    try:
+        if ruta_sqlite:
+            exportar_sqlite(ruta_sqlite, hash_libro, hojas, origen_libro(origen))
+
+        if ruta_parquet or ruta_csv:
+            registros = registros_para_exportar(hash_libro, hojas)
+            if ruta_parquet:
+                exportar_parquet(ruta_parquet, registros)
+            if ruta_csv:
+                exportar_csv(ruta_csv, registros)
+    except Exception as e:
+        log(f"❌ ERROR al exportar la tabla de medicamentos: {str(e)}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,98 @@
+"""
+NORMALIZACIÓN DE FECHAS
+Convierte en fecha lo que haya en la celda: datetime, número de serie de
+Excel o texto ("15/03/2026", "15-mar-26", "15 de marzo de 2026").
+Los mismos textos se repiten en miles de filas, así que cada valor crudo
+se interpreta una sola vez
+"""
+
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+import re
+import unicodedata
+
+ORIGEN_EXCEL = date(1899, 12, 30)  # día 0 de los números de serie de Excel
+
+# Números de serie aceptados como fecha (1954-2119): fuera de ese rango son cantidades
+SERIAL_MINIMO = 20000
+SERIAL_MAXIMO = 80000
+
+MESES = {
+    'enero': 1, 'ene': 1, 'jan': 1,
+    'febrero': 2, 'feb': 2,
+    'marzo': 3, 'mar': 3,
+    'abril': 4, 'abr': 4, 'apr': 4,
+    'mayo': 5, 'may': 5,
+    'junio': 6, 'jun': 6,
+    'julio': 7, 'jul': 7,
+    'agosto': 8, 'ago': 8, 'aug': 8,
+    'septiembre': 9, 'setiembre': 9, 'sept': 9, 'sep': 9, 'set': 9,
+    'octubre': 10, 'oct': 10,
+    'noviembre': 11, 'nov': 11,
+    'diciembre': 12, 'dic': 12, 'dec': 12,
+}
+
+# 15/03/2026, 15-3-26, 15.03.2026
+_DIA_MES_ANIO = re.compile(r'^(\d{1,2})[/.\-](\d{1,2})[/.\-](\d{2}|\d{4})$')
+# 2026-03-15, 2026/03/15
+_ANIO_MES_DIA = re.compile(r'^(\d{4})[/.\-](\d{1,2})[/.\-](\d{1,2})$')
+# 15-mar-26, 15 mar 2026, 15 de marzo de 2026, 15/marzo/2026
+_DIA_NOMBRE_ANIO = re.compile(r'^(\d{1,2})(?:\s+de\s+|[\s/.\-]+)([a-z]+)\.?(?:\s+de\s+|[\s/.\-]+)(\d{2}|\d{4})$')
+
+def _anio_completo(texto):
+    """Años de dos cifras como Excel: 00-29 son 2000-2029 y 30-99 son 1930-1999"""
+    anio = int(texto)
+    if len(texto) == 2:
+        anio += 2000 if anio < 30 else 1900
+    return anio
+
+def _sin_acentos(texto):
+    return ''.join(c for c in unicodedata.normalize('NFD', texto) if unicodedata.category(c) != 'Mn')
+
+@lru_cache(maxsize=4096)
+def fecha_de_texto(texto):
+    """Interpreta una fecha escrita como texto; None si no lo es"""
+    limpio = _sin_acentos(texto.strip().lower())
+    # "15/03/2026 00:00" o "2026-03-15T00:00:00" (ya en minúsculas): la hora no interesa
+    limpio = re.split(r'[\st]\d{1,2}:\d{2}', limpio)[0].strip()
+
+    try:
+        encontrado = _DIA_MES_ANIO.match(limpio)
+        if encontrado:
+            dia, mes, anio = encontrado.groups()
+            return date(_anio_completo(anio), int(mes), int(dia))
+
+        encontrado = _ANIO_MES_DIA.match(limpio)
+        if encontrado:
+            anio, mes, dia = encontrado.groups()
+            return date(int(anio), int(mes), int(dia))
+
+        encontrado = _DIA_NOMBRE_ANIO.match(limpio)
+        if encontrado and encontrado.group(2) in MESES:
+            dia, mes, anio = encontrado.groups()
+            return date(_anio_completo(anio), MESES[mes], int(dia))
+    except ValueError:
+        # 31/02/2026 y similares
+        return None
+    return None
+
+@lru_cache(maxsize=4096)
+def fecha_de_serial(numero):
+    """Fecha de un número de serie de Excel dentro del rango razonable; None si no"""
+    if not SERIAL_MINIMO <= numero <= SERIAL_MAXIMO:
+        return None
+    return ORIGEN_EXCEL + timedelta(days=int(numero))
+
+def normalizar_fecha(valor):
+    """Devuelve la fecha (date) que representa el valor de la celda, o None"""
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    if isinstance(valor, bool):
+        return None
+    if isinstance(valor, (int, float)):
+        return fecha_de_serial(valor)
+    if isinstance(valor, str) and valor.strip():
+        return fecha_de_texto(valor)
+    return None
@@ -0,0 +1,241 @@
+"""
+FLUJO COMÚN DE LOS SCRIPTS DE ALERTAS
+Lo que alerta_medicamentos.py y revisar_fechas.py hacen igual alrededor de su
+plantilla. Cada script crea un FlujoAlertas con su propio módulo, y la
+configuración de la plantilla (RUTA_INDICE, DIAS_ALERTA, enviar_email...) se
+lee de él en cada llamada, así que cambiarla en el script sigue teniendo efecto
+"""
+
+from contextlib import contextmanager
+import hashlib
+import os
+import sys
+
+from bitacora import log
+from cache_alertas import calcular_hash, cargar_indice, guardar_indice, cargar_indice_hojas, guardar_indice_hojas
+from libro_memoria import LibroEnMemoria
+
+# Bandeja de salida (modo --bandeja)
+RUTA_BANDEJA = os.environ.get('RUTA_BANDEJA_SALIDA', '.cache_alertas/bandeja_salida.db')
+HILOS_ENVIO = 4  # Envíos simultáneos desde la bandeja
+ESPERA_BANDEJA = 120  # Segundos que se espera al final para vaciar la bandeja
+
+# Reparto de envíos entre varias cuentas de Gmail (GMAIL_CUENTAS)
+RUTA_CUOTAS = os.environ.get('RUTA_CUOTAS_ENVIO', '.cache_alertas/cuotas_envio.json')
+
+def anadir_opciones_exportacion(parser):
+    """Opciones --exportar-* de la línea de comandos"""
+    parser.add_argument('--exportar-sqlite', metavar='RUTA', help="Exporta todas las filas escaneadas a SQLite")
+    parser.add_argument('--exportar-parquet', metavar='RUTA', help="Exporta todas las filas escaneadas a Parquet (requiere pyarrow)")
+    parser.add_argument('--exportar-csv', metavar='RUTA', help="Exporta todas las filas escaneadas a CSV")
+
+def destinos_exportacion(args):
+    """Destinos de exportación pedidos en la línea de comandos, con los nombres de exportacion.exportar"""
+    return {
+        'ruta_sqlite': args.exportar_sqlite,
+        'ruta_parquet': args.exportar_parquet,
+        'ruta_csv': args.exportar_csv
+    }
+
+def exportar_filas(hash_excel, hojas, ruta_excel, destinos):
+    """Exporta todas las filas escaneadas a SQLite/Parquet/CSV si se pidió algún destino"""
+    if any(destinos.values()):
+        from exportacion import exportar
+        exportar(hash_excel, hojas, ruta_excel, **destinos)
+
+def leer_adjunto(archivo_adjunto):
+    """Devuelve (nombre, bytes) de una ruta, de un libro en memoria o de un adjunto ya leído, o None"""
+    if not archivo_adjunto:
+        return None
+    if isinstance(archivo_adjunto, tuple):
+        return archivo_adjunto
+    if isinstance(archivo_adjunto, LibroEnMemoria):
+        return archivo_adjunto.nombre, archivo_adjunto.datos
+    if not os.path.exists(archivo_adjunto):
+        return None
+    with open(archivo_adjunto, 'rb') as archivo:
+        return os.path.basename(archivo_adjunto), archivo.read()
+
+class FlujoAlertas:
+    """Pasos comunes de un script de alertas; `script` es el módulo del script"""
+
+    def __init__(self, script):
+        self.script = script
+        self.planificador = None   # PlanificadorEnvios si hay GMAIL_CUENTAS
+        self.trabajadores = None   # TrabajadoresBandeja si la bandeja está activa
+
+    # --- Escaneo, exportación e historial ---
+
+    def obtener_filas(self, ruta_excel, hash_excel=None):
+        """Devuelve (filas, info_paciente, hash_excel) usando el índice si el Excel no cambió"""
+        # Camino rápido: si el Excel no cambió se usa el índice en caché sin abrir openpyxl
+        hash_excel = hash_excel or calcular_hash(ruta_excel, self.script.parametros_lectura())
+        en_cache = cargar_indice(self.script.RUTA_INDICE, hash_excel)
+
+        if en_cache:
+            log("✓ Excel sin cambios desde la última revisión, usando índice en caché")
+            filas, info_paciente = en_cache
+            return filas, info_paciente, hash_excel
+
+        filas, info_paciente = self.script.leer_excel_y_escanear_filas(ruta_excel)
+        if filas is not None:
+            guardar_indice(self.script.RUTA_INDICE, hash_excel, filas, info_paciente)
+        return filas, info_paciente, hash_excel
+
+    def obtener_hojas(self, ruta_excel, ruta_indice=None):
+        """Versión multihoja de obtener_filas: devuelve ([{'hoja', 'filas', 'info_paciente'}], hash_excel)"""
+        ruta_indice = ruta_indice or self.script.RUTA_INDICE_HOJAS
+        hash_excel = calcular_hash(ruta_excel, dict(self.script.parametros_lectura(), todas_hojas=True))
+        en_cache = cargar_indice_hojas(ruta_indice, hash_excel)
+
+        if en_cache is not None:
+            log("✓ Excel sin cambios desde la última revisión, usando índice en caché")
+            return en_cache, hash_excel
+
+        hojas = self.script.leer_excel_todas_las_hojas(ruta_excel)
+        if hojas is not None:
+            guardar_indice_hojas(ruta_indice, hash_excel, hojas)
+        return hojas, hash_excel
+
+    def registrar_historial(self, hash_excel, hojas, ruta_excel):
+        """Añade las filas escaneadas al historial de ejecuciones (RUTA_HISTORIAL vacío lo desactiva)"""
+        from historial import RUTA_HISTORIAL, registrar
+
+        if not RUTA_HISTORIAL:
+            return
+        try:
+            registrar(hash_excel, hojas, ruta_excel, self.script.DIAS_ALERTA)
+        except Exception as e:
+            log(f"⚠️ No se pudo guardar el historial: {e}")
+
+    def escanear_libro(self, ruta_excel, destinos=None):
+        """
+        Filas de la hoja activa (del índice si el libro no cambió), ya exportadas y en el
+        historial: devuelve (filas, info_paciente). Termina el proceso si no se puede leer
+        """
+        filas, info_paciente, hash_excel = self.obtener_filas(ruta_excel)
+        if filas is None:
+            log("❌ No se pudo leer el archivo Excel")
+            sys.exit(1)
+
+        hojas = [{'hoja': '', 'filas': filas, 'info_paciente': info_paciente}]
+        exportar_filas(hash_excel, hojas, ruta_excel, destinos or {})
+        self.registrar_historial(hash_excel, hojas, ruta_excel)
+        return filas, info_paciente
+
+    def escanear_todas_las_hojas(self, ruta_excel, destinos=None):
+        """Versión multihoja de escanear_libro: devuelve [{'hoja', 'filas', 'info_paciente'}]"""
+        hojas, hash_excel = self.obtener_hojas(ruta_excel)
+        if hojas is None:
+            log("❌ No se pudo leer el archivo Excel")
+            sys.exit(1)
+
+        exportar_filas(hash_excel, hojas, ruta_excel, destinos or {})
+        self.registrar_historial(hash_excel, hojas, ruta_excel)
+        return hojas
+
+    # --- Libros del panel ---
+
+    def indice_del_libro(self, ruta_excel):
+        """Índice multihoja de un libro suelto: el de siempre para RUTA_EXCEL y uno propio para los demás"""
+        ruta_absoluta = os.path.abspath(ruta_excel)
+        if ruta_absoluta == os.path.abspath(self.script.RUTA_EXCEL):
+            return self.script.RUTA_INDICE_HOJAS
+        huella = hashlib.sha1(ruta_absoluta.encode('utf-8')).hexdigest()[:12]
+        return os.path.join(os.path.dirname(self.script.RUTA_INDICE_HOJAS), f"indice_panel_{huella}_hojas.json")
+
+    def libros_del_panel(self, rutas, ruta_manifiesto):
+        """
+        Libros del panel como [(clave, ruta, índice en caché)]: los de --libros, o si no se indicaron
+        los del manifiesto (los de Drive, tal como quedaron descargados en la última ejecución)
+        """
+        if rutas or not ruta_manifiesto:
+            from renderizado import libros_a_renderizar
+            return [(os.path.abspath(ruta), ruta, self.indice_del_libro(ruta))
+                    for ruta in libros_a_renderizar(rutas or [self.script.RUTA_EXCEL])]
+
+        # Los mismos índices que usa el digest: tras la ejecución diaria ya están al día
+        from manifiesto import cargar_manifiesto, ruta_indice, ruta_libro
+        return [(entrada['id'], ruta_libro(entrada), ruta_indice(entrada, 'hojas'))
+                for entrada in cargar_manifiesto(ruta_manifiesto)]
+
+    # --- Envíos ---
+
+    def iniciar_planificador(self):
+        """Activa el reparto de envíos entre las cuentas de GMAIL_CUENTAS, si hay alguna"""
+        from planificador_envios import PlanificadorEnvios, leer_cuentas
+
+        cuentas = leer_cuentas(self.script.GMAIL_CUENTAS)
+        if cuentas:
+            self.planificador = PlanificadorEnvios(cuentas, RUTA_CUOTAS)
+            log(f"📨 Envíos repartidos entre {len(cuentas)} cuentas de Gmail")
+        return self.planificador
+
+    def cuenta_de_envio(self, destinatario):
+        """(usuario, clave) de Gmail para este envío: la que asigne el planificador o GMAIL_USUARIO"""
+        if self.planificador is None:
+            return self.script.GMAIL_USUARIO, self.script.GMAIL_PASSWORD
+        return self.planificador.adquirir(destinatario)
+
+    def devolver_cuenta(self, usuario):
+        """Reintegra a la cuenta el cupo de un envío que falló"""
+        if self.planificador is not None:
+            self.planificador.devolver(usuario)
+
+    def iniciar_bandeja(self, ruta_bandeja=None):
+        """Abre la bandeja de salida y arranca los hilos que la vacían en segundo plano"""
+        from bandeja_salida import BandejaSalida, TrabajadoresBandeja
+
+        ruta_bandeja = ruta_bandeja or RUTA_BANDEJA
+        if os.path.dirname(ruta_bandeja):
+            os.makedirs(os.path.dirname(ruta_bandeja), exist_ok=True)
+
+        enviadores = {
+            'email': lambda destinatario, carga, adjunto: self.script.enviar_email(
+                destinatario, carga['asunto'], carga['cuerpo_html'], adjunto, lanzar=True),
+            'whatsapp': lambda telefono, carga, adjunto: self.script.enviar_whatsapp(
+                telefono, carga['mensaje'], carga['info_paciente'], lanzar=True),
+        }
+        self.trabajadores = TrabajadoresBandeja(BandejaSalida(ruta_bandeja), enviadores, HILOS_ENVIO)
+        self.trabajadores.iniciar()
+        log(f"📮 Bandeja de salida activa: {ruta_bandeja}")
+        return self.trabajadores
+
+    @contextmanager
+    def envios(self, con_bandeja=False):
+        """Reparto entre cuentas y, si se pide, bandeja de salida que se vacía al salir del bloque"""
+        self.iniciar_planificador()
+
+        # Con la bandeja activa los envíos no bloquean el escaneo y sobreviven a un corte del proceso
+        trabajadores = self.iniciar_bandeja() if con_bandeja else None
+        try:
+            yield
+        finally:
+            if trabajadores:
+                trabajadores.cerrar(ESPERA_BANDEJA)
+
+    def despachar_email(self, destinatario, asunto, cuerpo_html, archivo_adjunto=None):
+        """Envía el email en el momento o, si la bandeja está activa, lo deja en ella"""
+        if self.trabajadores is None:
+            if self.script.enviar_email(destinatario, asunto, cuerpo_html, archivo_adjunto):
+                log(f"✅ Email enviado a: {destinatario}")
+            else:
+                log("❌ El email no pudo ser enviado")
+            return
+
+        self.trabajadores.bandeja.encolar('email', destinatario, {'asunto': asunto, 'cuerpo_html': cuerpo_html},
+                                          leer_adjunto(archivo_adjunto))
+        self.trabajadores.avisar()
+        log(f"📥 Email para {destinatario} guardado en la bandeja de salida")
+
+    def despachar_whatsapp(self, telefono, mensaje, info_paciente=None):
+        """Envía el WhatsApp en el momento o, si la bandeja está activa, lo deja en ella"""
+        if self.trabajadores is None:
+            self.script.enviar_whatsapp(telefono, mensaje, info_paciente)
+            return
+
+        # La foto no se guarda en la bandeja: el WhatsApp no la usa
+        info = {clave: valor for clave, valor in info_paciente.items() if clave != 'imagen'} if info_paciente else None
+        self.trabajadores.bandeja.encolar('whatsapp', telefono, {'mensaje': mensaje, 'info_paciente': info})
+        self.trabajadores.avisar()
+        log(f"📥 WhatsApp para {telefono} guardado en la bandeja de salida")
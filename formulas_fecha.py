@@ -0,0 +1,251 @@
+"""
+FECHAS CALCULADAS CON FÓRMULAS
+Evalúa la aritmética de fechas sencilla de la columna de fechas (=H18+30,
+=DATE(2026,3,1)+G18*7, =EDATE(H18,1)...) cuando el Excel se guardó sin los
+valores calculados y openpyxl devuelve None con data_only=True
+"""
+
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+import operator
+import re
+
+from bitacora import log
+from fechas import fecha_de_serial, fecha_de_texto
+from libro_memoria import abrir_libro
+from tablas_csv_ods import formato_tabla
+
+ORIGEN_EXCEL = datetime(1899, 12, 30)  # día 0 de los números de serie de Excel
+
+_TOKEN = re.compile(r"\s*(?:(\d+(?:\.\d+)?)|(\$?)([A-Z]{1,3})(\$?)(\d+)(?![A-Z0-9(])|([A-Z][A-Z0-9.]*)\s*\(|([-+*/(),]))")
+
+class FormulaNoSoportada(ValueError):
+    """La fórmula usa algo fuera de la aritmética de fechas soportada"""
+
+def _indice_columna(letras):
+    indice = 0
+    for letra in letras:
+        indice = indice * 26 + ord(letra) - 64
+    return indice
+
+def a_serial(valor):
+    """Convierte una fecha o número de celda en número de serie de Excel"""
+    if isinstance(valor, datetime):
+        return (valor - ORIGEN_EXCEL).total_seconds() / 86400
+    if isinstance(valor, date):
+        return float((valor - ORIGEN_EXCEL.date()).days)
+    if valor is None:
+        # Excel la cuenta como 0 (30/12/1899): una fecha así sería basura, la fila se omite
+        raise FormulaNoSoportada("referencia a una celda vacía")
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return float(valor)
+    if isinstance(valor, str) and fecha_de_texto(valor):
+        # Una fecha escrita como texto a la que la fórmula suma días
+        return a_serial(fecha_de_texto(valor))
+    raise FormulaNoSoportada(f"valor no numérico: {valor!r}")
+
+def de_serial(serial):
+    return (ORIGEN_EXCEL + timedelta(days=int(serial))).date()
+
+def _sumar_meses(serial, meses):
+    fecha = de_serial(serial)
+    mes = fecha.month - 1 + int(meses)
+    anio, mes = fecha.year + mes // 12, mes % 12 + 1
+    for dia in (fecha.day, 30, 29, 28):
+        try:
+            return a_serial(date(anio, mes, dia))
+        except ValueError:
+            continue
+
+def _fecha(anio, mes, dia):
+    """DATE de Excel: mes y día pueden desbordarse (DATE(2026,13,1) es el 1/1/2027)"""
+    anio, mes = int(anio) + (int(mes) - 1) // 12, (int(mes) - 1) % 12 + 1
+    return a_serial(date(anio, mes, 1)) + int(dia) - 1
+
+FUNCIONES = {
+    'DATE': (3, _fecha),
+    'EDATE': (2, _sumar_meses),
+    'TODAY': (0, lambda: a_serial(date.today())),
+}
+
+OPERADORES = {'+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.truediv}
+
+def patron_formula(formula, fila, columna):
+    """
+    Tokeniza la fórmula y expresa las referencias relativas como desplazamientos
+    respecto a la celda, de modo que =H18+30 en J18 y =H19+30 en J19 comparten patrón
+    """
+    texto = formula.lstrip('=').upper().replace('_XLFN.', '')
+    tokens, posicion = [], 0
+    while posicion < len(texto.rstrip()):
+        encontrado = _TOKEN.match(texto, posicion)
+        if not encontrado:
+            raise FormulaNoSoportada(f"no se entiende '{texto[posicion:]}'")
+        numero, fija_col, letras, fija_fila, digitos, funcion, simbolo = encontrado.groups()
+        if numero is not None:
+            tokens.append(('num', float(numero)))
+        elif letras is not None:
+            col, fil = _indice_columna(letras), int(digitos)
+            tokens.append(('ref', fil if fija_fila else fil - fila, bool(fija_fila),
+                           col if fija_col else col - columna, bool(fija_col)))
+        elif funcion is not None:
+            tokens.append(('fun', funcion))
+        else:
+            tokens.append(('sim', simbolo))
+        posicion = encontrado.end()
+    return tuple(tokens)
+
+@lru_cache(maxsize=None)
+def compilar(patron):
+    """Convierte un patrón en una función (leer_celda, fila, columna) -> serial; se compila una vez por patrón"""
+    tokens = list(patron)
+    posicion = [0]
+
+    def siguiente():
+        return tokens[posicion[0]] if posicion[0] < len(tokens) else None
+
+    def consumir(esperado=None):
+        token = siguiente()
+        if token is None or (esperado and token != ('sim', esperado)):
+            raise FormulaNoSoportada(f"se esperaba '{esperado}'")
+        posicion[0] += 1
+        return token
+
+    def binaria(simbolo, izquierda, derecha):
+        operacion = OPERADORES[simbolo]
+        return lambda *contexto: operacion(izquierda(*contexto), derecha(*contexto))
+
+    def expresion():
+        resultado = termino()
+        while siguiente() in (('sim', '+'), ('sim', '-')):
+            resultado = binaria(consumir()[1], resultado, termino())
+        return resultado
+
+    def termino():
+        resultado = factor()
+        while siguiente() in (('sim', '*'), ('sim', '/')):
+            resultado = binaria(consumir()[1], resultado, factor())
+        return resultado
+
+    def factor():
+        token = consumir()
+        tipo = token[0]
+        if token in (('sim', '-'), ('sim', '+')):
+            interior = factor()
+            return (lambda *contexto: -interior(*contexto)) if token[1] == '-' else interior
+        if tipo == 'num':
+            return lambda *contexto, valor=token[1]: valor
+        if tipo == 'ref':
+            _, dfila, fija_fila, dcol, fija_col = token
+            return lambda leer, fila, columna: a_serial(leer(dfila if fija_fila else fila + dfila,
+                                                             dcol if fija_col else columna + dcol))
+        if tipo == 'fun':
+            if token[1] not in FUNCIONES:
+                raise FormulaNoSoportada(f"función {token[1]} no soportada")
+            aridad, funcion = FUNCIONES[token[1]]
+            argumentos = []
+            while siguiente() != ('sim', ')'):
+                if argumentos:
+                    consumir(',')
+                argumentos.append(expresion())
+            consumir(')')
+            if len(argumentos) != aridad:
+                raise FormulaNoSoportada(f"{token[1]} espera {aridad} argumentos")
+            return lambda *contexto: funcion(*(argumento(*contexto) for argumento in argumentos))
+        if token == ('sim', '('):
+            interior = expresion()
+            consumir(')')
+            return interior
+        raise FormulaNoSoportada(f"símbolo inesperado {token[1]}")
+
+    funcion = expresion()
+    if siguiente() is not None:
+        raise FormulaNoSoportada("sobran símbolos al final")
+    return funcion
+
+class EvaluadorFechas:
+    """Evalúa celdas de una hoja a partir de sus valores crudos {(fila, columna): constante o '=fórmula'}"""
+
+    def __init__(self, celdas):
+        self.celdas = celdas
+        self._resultados = {}
+        self._en_curso = set()
+
+    def valor(self, fila, columna):
+        clave = (fila, columna)
+        if clave in self._resultados:
+            return self._resultados[clave]
+        crudo = self.celdas.get(clave)
+        if not (isinstance(crudo, str) and crudo.startswith('=')):
+            return crudo
+        if clave in self._en_curso:
+            raise FormulaNoSoportada("referencia circular")
+
+        self._en_curso.add(clave)
+        try:
+            resultado = compilar(patron_formula(crudo, fila, columna))(self.valor, fila, columna)
+        finally:
+            self._en_curso.discard(clave)
+        self._resultados[clave] = resultado
+        return resultado
+
+    def fecha(self, fila, columna):
+        """Fecha de la celda si es una fórmula evaluable con un resultado en el rango de fechas de fechas.py, o None"""
+        try:
+            valor = self.valor(fila, columna)
+            return fecha_de_serial(valor) if isinstance(valor, float) else None
+        except (FormulaNoSoportada, ArithmeticError, ValueError, OverflowError):
+            return None
+
+def leer_celdas(ruta_archivo, nombres_hojas):
+    """Valores crudos (fórmulas incluidas) de las hojas indicadas: {hoja: {(fila, columna): valor}}"""
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(abrir_libro(ruta_archivo), read_only=True, data_only=False)
+    try:
+        hojas = {}
+        for nombre in nombres_hojas:
+            celdas = {}
+            for fila in workbook[nombre].iter_rows():
+                for celda in fila:
+                    if getattr(celda, 'value', None) is not None:
+                        celdas[(celda.row, celda.column)] = celda.value
+            hojas[nombre] = celdas
+        return hojas
+    finally:
+        workbook.close()
+
+def completar_fechas(ruta_archivo, pendientes):
+    """
+    pendientes = {hoja: [(columna, fila_sin_fecha)]}: filas con medicamento pero sin
+    valor en la celda de fecha. Devuelve {hoja: [filas con la fecha calculada]}
+    """
+    celdas_por_hoja = leer_celdas(ruta_archivo, list(pendientes))
+    completadas = {}
+    for nombre, filas in pendientes.items():
+        evaluador = EvaluadorFechas(celdas_por_hoja[nombre])
+        completadas[nombre] = []
+        for columna, fila in filas:
+            fecha = evaluador.fecha(fila['fila'], columna)
+            if fecha is not None:
+                completadas[nombre].append(fila._replace(fecha=fecha))
+        if completadas[nombre]:
+            log(f"✓ {len(completadas[nombre])} fechas calculadas desde fórmulas en la hoja '{nombre}'")
+    return completadas
+
+def completar_hojas(ruta_archivo, hojas):
+    """
+    hojas = [{'hoja', 'filas', 'sin_fecha'}]: quita 'sin_fecha' de cada hoja y
+    añade a 'filas' las fechas que se pudieron calcular desde su fórmula
+    """
+    pendientes = {hoja['hoja']: hoja.pop('sin_fecha') for hoja in hojas}
+    pendientes = {nombre: filas for nombre, filas in pendientes.items() if filas}
+    # CSV y ODS guardan el valor ya calculado: una celda vacía no esconde ninguna fórmula
+    if not pendientes or formato_tabla(ruta_archivo):
+        return hojas
+
+    completadas = completar_fechas(ruta_archivo, pendientes)
+    for hoja in hojas:
+        if completadas.get(hoja['hoja']):
+            hoja['filas'] = sorted(hoja['filas'] + completadas[hoja['hoja']], key=lambda fila: fila['fila'])
+    return hojas
@@ -0,0 +1,98 @@
+"""
+EJECUCIÓN POR FRAGMENTOS
+Reparte los libros del manifiesto entre N ejecuciones (--shard i/N) con un
+hash estable del id de cada libro. Cada fragmento guarda sus pacientes con
+alertas ya renderizados en un archivo de resultados, y la combinación los
+junta para enviar un solo email por destinatario. Cada archivo lleva el id de
+su ejecución y la combinación ignora los de otras, para no reenviar alertas
+viejas de un fragmento que hoy no terminó
+"""
+
+from datetime import date, datetime
+import glob
+import hashlib
+import json
+import os
+
+from bitacora import log
+
+DIRECTORIO_RESULTADOS = os.environ.get('RESULTADOS_FRAGMENTOS', '.cache_alertas/fragmentos')
+# Id común a los fragmentos de una misma ejecución (en GitHub Actions, el run_id); por defecto, el día
+EJECUCION = os.environ.get('EJECUCION_FRAGMENTOS', '')
+
+def id_ejecucion():
+    return EJECUCION or date.today().isoformat()
+
+def leer_fragmento(texto):
+    """'2/4' -> (2, 4); los fragmentos se numeran desde 1"""
+    try:
+        indice, total = (int(parte) for parte in texto.split('/'))
+    except ValueError:
+        raise ValueError(f"fragmento no válido '{texto}', se espera i/N") from None
+    if not 1 <= indice <= total:
+        raise ValueError(f"fragmento no válido '{texto}': i debe estar entre 1 y N")
+    return indice, total
+
+def fragmento_de(clave, total):
+    """Fragmento (1..total) de una clave; no depende del proceso ni del orden del manifiesto"""
+    resumen = hashlib.sha256(str(clave).encode('utf-8')).digest()
+    return int.from_bytes(resumen[:8], 'big') % total + 1
+
+def entradas_del_fragmento(entradas, indice, total):
+    """Entradas del manifiesto que le tocan al fragmento indice/total"""
+    return [entrada for entrada in entradas if fragmento_de(entrada['id'], total) == indice]
+
+def ruta_resultados(directorio, indice, total):
+    return os.path.join(directorio, f"fragmento_{indice}_de_{total}.json")
+
+def guardar_resultados(directorio, indice, total, pacientes, ejecucion=None):
+    """Escribe los pacientes con alertas del fragmento (también si no hay ninguno, para que conste)"""
+    os.makedirs(directorio, exist_ok=True)
+    ruta = ruta_resultados(directorio, indice, total)
+    datos = {
+        'ejecucion': ejecucion or id_ejecucion(),
+        'fragmento': indice,
+        'total': total,
+        'generado': datetime.now().isoformat(timespec='seconds'),
+        'pacientes': pacientes,
+    }
+
+    # Escritura atómica: la combinación nunca lee un archivo a medias
+    ruta_temporal = f"{ruta}.tmp"
+    with open(ruta_temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(datos, archivo, ensure_ascii=False, default=str)
+    os.replace(ruta_temporal, ruta)
+    log(f"💾 Resultados del fragmento {indice}/{total}: {len(pacientes)} pacientes con alertas en {ruta}")
+    return ruta
+
+def cargar_resultados(directorio, ejecucion=None):
+    """
+    Lee los resultados de todos los fragmentos de la ejecución y devuelve (pacientes, fragmentos
+    que faltan). Los archivos de otra ejecución cuentan como que faltan. Un mismo libro y hoja
+    solo aparece una vez: gana el resultado más reciente
+    """
+    ejecucion = ejecucion or id_ejecucion()
+    todos = []
+    for ruta in sorted(glob.glob(os.path.join(directorio, 'fragmento_*_de_*.json'))):
+        with open(ruta, 'r', encoding='utf-8') as archivo:
+            todos.append(json.load(archivo))
+    if not todos:
+        return [], []
+
+    resultados = [resultado for resultado in todos if resultado.get('ejecucion') == ejecucion]
+    if len(resultados) < len(todos):
+        log(f"⚠️ {len(todos) - len(resultados)} archivos de resultados de otra ejecución ignorados "
+            f"(ejecución actual: {ejecucion})")
+
+    # El número de fragmentos lo fija el resultado más reciente de la ejecución (o, si no hay
+    # ninguno, el de los archivos ignorados, para avisar de que faltan todos)
+    total = max(resultados or todos, key=lambda resultado: resultado['generado'])['total']
+    resultados = [resultado for resultado in resultados if resultado['total'] == total]
+    resultados.sort(key=lambda resultado: resultado['generado'])
+    faltan = sorted(set(range(1, total + 1)) - {resultado['fragmento'] for resultado in resultados})
+
+    pacientes = {}
+    for resultado in resultados:
+        for paciente in resultado['pacientes']:
+            pacientes[(paciente['libro'], paciente['hoja'])] = paciente
+    return list(pacientes.values()), [f"{indice}/{total}" for indice in faltan]
@@ -0,0 +1,231 @@
+"""
+HISTORIAL DE EJECUCIONES
+Cada ejecución añade al final de una base SQLite las filas escaneadas y cuáles
+eran alertas; nunca se modifica lo ya escrito. Periódicamente el detalle
+antiguo se compacta en un resumen diario por paciente, y las consultas
+(vencimientos de un paciente, alertas por semana) van contra índices en lugar
+de releer los Excel archivados
+
+Uso:
+    python historial.py paciente "Nombre"   # días en que tuvo medicamentos vencidos
+    python historial.py semanas             # volumen de alertas por semana
+    python historial.py compactar           # fuerza la compactación
+"""
+
+from datetime import date, datetime, timedelta
+import argparse
+import os
+import sqlite3
+
+from bitacora import log
+from libro_memoria import origen_libro
+
+RUTA_HISTORIAL = os.environ.get('RUTA_HISTORIAL', '.cache_alertas/historial.db')
+# Días que se conserva el detalle fila a fila antes de compactarlo en el resumen diario
+DIAS_DETALLE = int(os.environ.get('DIAS_DETALLE_HISTORIAL', '35'))
+COMPACTAR_CADA = 7  # días de detalle vencido que se acumulan antes de compactar en bloque
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS ejecuciones (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    dia TEXT NOT NULL,
+    momento TEXT NOT NULL,
+    hash_libro TEXT NOT NULL,
+    origen TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_ejecuciones_dia ON ejecuciones (dia);
+CREATE INDEX IF NOT EXISTS idx_ejecuciones_libro ON ejecuciones (hash_libro, dia);
+CREATE TABLE IF NOT EXISTS filas (
+    ejecucion INTEGER NOT NULL REFERENCES ejecuciones (id),
+    hoja TEXT NOT NULL,
+    paciente TEXT,
+    fila INTEGER NOT NULL,
+    columna TEXT NOT NULL,
+    medicamento TEXT,
+    uso TEXT,
+    fecha TEXT NOT NULL,
+    dias_restantes INTEGER NOT NULL,
+    alerta INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_filas_ejecucion ON filas (ejecucion);
+CREATE INDEX IF NOT EXISTS idx_filas_paciente ON filas (paciente, ejecucion);
+CREATE TABLE IF NOT EXISTS resumen_diario (
+    dia TEXT NOT NULL,
+    origen TEXT NOT NULL,
+    hoja TEXT NOT NULL,
+    paciente TEXT NOT NULL,
+    filas INTEGER NOT NULL,
+    alertas INTEGER NOT NULL,
+    vencidas INTEGER NOT NULL,
+    ejecuciones INTEGER NOT NULL,
+    PRIMARY KEY (dia, origen, hoja, paciente)
+);
+CREATE INDEX IF NOT EXISTS idx_resumen_paciente ON resumen_diario (paciente, dia);
+"""
+
+# Resumen por día, libro, hoja y paciente del detalle anterior a un día dado.
+# Si un libro se revisa varias veces el mismo día, cuenta la ejecución con más
+# alertas: el volumen semanal no crece por revisar más a menudo
+RESUMEN_DETALLE = """
+SELECT e.dia, e.origen, f.hoja, COALESCE(f.paciente, ''),
+       MAX(f.filas), MAX(f.alertas), MAX(f.vencidas), COUNT(*)
+FROM (
+    SELECT ejecucion, hoja, paciente, COUNT(*) AS filas,
+           SUM(alerta) AS alertas, SUM(dias_restantes < 0) AS vencidas
+    FROM filas GROUP BY ejecucion, hoja, paciente
+) AS f
+JOIN ejecuciones AS e ON e.id = f.ejecucion
+WHERE e.dia < ?
+GROUP BY e.dia, e.origen, f.hoja, f.paciente
+"""
+
+# Resumen diario completo: lo ya compactado más el detalle reciente, resumido igual
+RESUMEN_COMPLETO = f"""
+SELECT dia, origen, hoja, paciente, filas, alertas, vencidas, ejecuciones FROM resumen_diario
+UNION ALL
+{RESUMEN_DETALLE}
+"""
+
+def conectar(ruta_db=None):
+    """Abre el historial creando las tablas si no existen"""
+    ruta_db = ruta_db or RUTA_HISTORIAL
+    directorio = os.path.dirname(ruta_db)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    conexion = sqlite3.connect(ruta_db)
+    conexion.execute("PRAGMA journal_mode=WAL")
+    conexion.executescript(ESQUEMA)
+    return conexion
+
+def registrar(hash_libro, hojas, origen, dias_alerta, ruta_db=None, fecha_hoy=None):
+    """
+    Añade las filas escaneadas de un libro ([{'hoja', 'filas', 'info_paciente'}]).
+    Un libro idéntico ya registrado hoy no se repite. Devuelve las filas añadidas
+    """
+    fecha_hoy = fecha_hoy or date.today()
+    origen = origen_libro(origen)
+    conexion = conectar(ruta_db)
+    try:
+        with conexion:
+            if conexion.execute(
+                "SELECT 1 FROM ejecuciones WHERE hash_libro = ? AND dia = ?",
+                (hash_libro, fecha_hoy.isoformat())
+            ).fetchone():
+                log("✓ Libro ya registrado hoy en el historial")
+                return 0
+
+            ejecucion = conexion.execute(
+                "INSERT INTO ejecuciones (dia, momento, hash_libro, origen) VALUES (?, ?, ?, ?)",
+                (fecha_hoy.isoformat(), datetime.now().isoformat(timespec='seconds'), hash_libro, str(origen))
+            ).lastrowid
+
+            registros = []
+            for hoja in hojas:
+                paciente = str(hoja['info_paciente']['paciente'])
+                for fila in hoja['filas']:
+                    dias_restantes = (fila['fecha'] - fecha_hoy).days
+                    registros.append((
+                        ejecucion, hoja.get('hoja') or '', paciente, fila['fila'], fila.get('columna', ''),
+                        fila['medicamento'], fila['uso'], fila['fecha'].isoformat(), dias_restantes,
+                        int(0 <= dias_restantes < dias_alerta)
+                    ))
+            conexion.executemany("INSERT INTO filas VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", registros)
+        log(f"🗂️ Historial: {len(registros)} filas añadidas a {ruta_db or RUTA_HISTORIAL}")
+
+        # La compactación se hace sola, una vez por semana de detalle vencido
+        compactar(conexion, fecha_hoy, margen=COMPACTAR_CADA)
+        return len(registros)
+    finally:
+        conexion.close()
+
+def compactar(conexion, fecha_hoy=None, margen=0):
+    """
+    Pasa al resumen diario el detalle anterior al plazo y lo borra, pero solo si
+    hay detalle que lleva vencido más de margen días. Devuelve los días compactados
+    """
+    fecha_hoy = fecha_hoy or date.today()
+    limite = (fecha_hoy - timedelta(days=DIAS_DETALLE)).isoformat()
+    aviso = (fecha_hoy - timedelta(days=DIAS_DETALLE + margen)).isoformat()
+
+    # Consulta barata por índice: casi siempre no hay nada que compactar
+    if not conexion.execute("SELECT 1 FROM ejecuciones WHERE dia < ? LIMIT 1", (aviso,)).fetchone():
+        return 0
+
+    with conexion:
+        dias = conexion.execute("SELECT COUNT(DISTINCT dia) FROM ejecuciones WHERE dia < ?", (limite,)).fetchone()[0]
+        # Los días se compactan enteros, así que nunca se mezcla un resumen con su propio detalle
+        conexion.execute(
+            "INSERT INTO resumen_diario (dia, origen, hoja, paciente, filas, alertas, vencidas, ejecuciones) "
+            f"{RESUMEN_DETALLE} "
+            "ON CONFLICT (dia, origen, hoja, paciente) DO UPDATE SET "
+            "filas = MAX(filas, excluded.filas), alertas = MAX(alertas, excluded.alertas), "
+            "vencidas = MAX(vencidas, excluded.vencidas), ejecuciones = ejecuciones + excluded.ejecuciones",
+            (limite,)
+        )
+        conexion.execute(
+            "DELETE FROM filas WHERE ejecucion IN (SELECT id FROM ejecuciones WHERE dia < ?)", (limite,)
+        )
+        conexion.execute("DELETE FROM ejecuciones WHERE dia < ?", (limite,))
+    log(f"🗜️ Historial compactado: {dias} días anteriores a {limite} pasados al resumen diario")
+    return dias
+
+def vencimientos_paciente(conexion, paciente, desde=None):
+    """Días en que el paciente tenía medicamentos ya vencidos: [(día, vencidas)]"""
+    desde = desde or '0000-01-01'
+    return conexion.execute(
+        "SELECT dia, SUM(vencidas) FROM ("
+        "  SELECT dia, vencidas FROM resumen_diario WHERE paciente = ? AND dia >= ?"
+        "  UNION ALL"
+        "  SELECT e.dia, MAX(f.vencidas) FROM ("
+        "    SELECT ejecucion, hoja, SUM(dias_restantes < 0) AS vencidas"
+        "    FROM filas WHERE paciente = ? GROUP BY ejecucion, hoja"
+        "  ) AS f JOIN ejecuciones AS e ON e.id = f.ejecucion"
+        "  WHERE e.dia >= ? GROUP BY e.dia, e.origen, f.hoja"
+        ") WHERE vencidas > 0 GROUP BY dia ORDER BY dia",
+        (paciente, desde, paciente, desde)
+    ).fetchall()
+
+def alertas_por_semana(conexion, semanas=12, fecha_hoy=None):
+    """Volumen de alertas de las últimas semanas: [(lunes de la semana, alertas, pacientes con alertas)]"""
+    fecha_hoy = fecha_hoy or date.today()
+    desde = (fecha_hoy - timedelta(days=fecha_hoy.weekday(), weeks=semanas - 1)).isoformat()
+    return conexion.execute(
+        "SELECT date(dia, 'weekday 0', '-6 days') AS semana, SUM(alertas), "
+        "       COUNT(DISTINCT CASE WHEN alertas > 0 THEN paciente END) "
+        f"FROM ({RESUMEN_COMPLETO}) WHERE dia >= ? GROUP BY semana ORDER BY semana",
+        ('9999-12-31', desde)
+    ).fetchall()
+
+def main():
+    parser = argparse.ArgumentParser(description="Consultas sobre el historial de ejecuciones")
+    parser.add_argument('--historial', default=RUTA_HISTORIAL, help="Base SQLite del historial")
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+    consulta_paciente = subcomandos.add_parser('paciente', help="Días con medicamentos vencidos de un paciente")
+    consulta_paciente.add_argument('nombre')
+    consulta_paciente.add_argument('--desde', help="Fecha ISO desde la que contar")
+    consulta_semanas = subcomandos.add_parser('semanas', help="Alertas por semana")
+    consulta_semanas.add_argument('--semanas', type=int, default=12)
+    subcomandos.add_parser('compactar', help="Compacta ya el detalle anterior al plazo")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.historial):
+        log(f"❌ No existe el historial: {args.historial}")
+        return
+
+    conexion = conectar(args.historial)
+    try:
+        if args.comando == 'paciente':
+            dias = vencimientos_paciente(conexion, args.nombre, args.desde)
+            log(f"📋 {args.nombre}: {len(dias)} días con medicamentos vencidos")
+            for dia, vencidas in dias:
+                print(f"  {dia}  {vencidas} vencidos")
+        elif args.comando == 'semanas':
+            for semana, alertas, pacientes in alertas_por_semana(conexion, args.semanas):
+                print(f"  semana del {semana}  {alertas:>5} alertas  {pacientes:>4} pacientes")
+        else:
+            compactar(conexion)
+    finally:
+        conexion.close()
+
+if __name__ == "__main__":
+    main()
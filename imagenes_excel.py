@@ -0,0 +1,131 @@
+"""
+FOTO DEL PACIENTE LEÍDA DIRECTAMENTE DEL ZIP DEL EXCEL
+Un .xlsx es un zip: la foto se localiza con los XML de relaciones y el
+dibujo de la hoja (xl/drawings/drawingN.xml) y se extrae solo su entrada
+xl/media/*, sin leer las celdas. El coste no depende del tamaño de la hoja
+"""
+
+import posixpath
+import xml.etree.ElementTree as ET
+import zipfile
+
+from bitacora import log
+from libro_memoria import abrir_libro
+from tablas_csv_ods import formato_tabla
+
+NS = {
+    'main': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main',
+    'rel': 'http://schemas.openxmlformats.org/package/2006/relationships',
+    'xdr': 'http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing',
+    'a': 'http://schemas.openxmlformats.org/drawingml/2006/main',
+}
+ATRIBUTO_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+ATRIBUTO_EMBED = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed'
+
+# Zona de la foto (índices desde 0, como en openpyxl): columnas L-N, filas 5-13 de Excel
+COLUMNAS_FOTO = (11, 13)
+FILAS_FOTO = (4, 12)
+ANCLAS_CELDA = ('{%s}twoCellAnchor' % NS['xdr'], '{%s}oneCellAnchor' % NS['xdr'])
+
+def _letra(columna):
+    """Índice de columna desde 0 -> letra de Excel (11 -> 'L')"""
+    return chr(65 + columna) if columna < 26 else 'Z+'
+
+def _ruta_rels(ruta_parte):
+    """xl/worksheets/sheet1.xml -> xl/worksheets/_rels/sheet1.xml.rels"""
+    carpeta, nombre = posixpath.split(ruta_parte)
+    return posixpath.join(carpeta, '_rels', f'{nombre}.rels')
+
+def _relaciones(libro, ruta_parte):
+    """{Id: (ruta dentro del zip, tipo)} de las relaciones internas de una parte"""
+    try:
+        raiz = ET.fromstring(libro.read(_ruta_rels(ruta_parte)))
+    except KeyError:
+        return {}
+
+    carpeta = posixpath.dirname(ruta_parte)
+    relaciones = {}
+    for relacion in raiz.findall('rel:Relationship', NS):
+        if relacion.get('TargetMode') == 'External':
+            continue
+        destino = relacion.get('Target')
+        # Los destinos pueden ser absolutos (/xl/media/...) o relativos a la parte
+        if destino.startswith('/'):
+            ruta = destino.lstrip('/')
+        else:
+            ruta = posixpath.normpath(posixpath.join(carpeta, destino))
+        relaciones[relacion.get('Id')] = (ruta, relacion.get('Type', '').rsplit('/', 1)[-1])
+    return relaciones
+
+def hojas_del_libro(libro):
+    """Devuelve ({nombre de hoja: ruta del XML}, nombre de la hoja activa)"""
+    raiz = ET.fromstring(libro.read('xl/workbook.xml'))
+    relaciones = _relaciones(libro, 'xl/workbook.xml')
+
+    hojas = {}
+    for hoja in raiz.findall('main:sheets/main:sheet', NS):
+        ruta, _ = relaciones.get(hoja.get(ATRIBUTO_ID), (None, None))
+        hojas[hoja.get('name')] = ruta
+
+    vista = raiz.find('main:bookViews/main:workbookView', NS)
+    activa = int(vista.get('activeTab', 0)) if vista is not None else 0
+    nombres = list(hojas)
+    return hojas, nombres[activa] if activa < len(nombres) else (nombres[0] if nombres else None)
+
+def imagenes_ancladas(libro, ruta_hoja):
+    """[(columna, fila, ruta de la imagen)] de las imágenes ancladas a una celda de la hoja"""
+    imagenes = []
+    for ruta_dibujo, tipo in _relaciones(libro, ruta_hoja).values():
+        if tipo != 'drawing':
+            continue
+        raiz = ET.fromstring(libro.read(ruta_dibujo))
+        medios = _relaciones(libro, ruta_dibujo)
+        # En el orden del documento, como openpyxl; absoluteAnchor no tiene celda de origen
+        for ancla in raiz:
+            if ancla.tag not in ANCLAS_CELDA:
+                continue
+            origen = ancla.find('xdr:from', NS)
+            blip = ancla.find('xdr:pic/xdr:blipFill/a:blip', NS)
+            if origen is None or blip is None or blip.get(ATRIBUTO_EMBED) not in medios:
+                continue
+            imagenes.append((int(origen.findtext('xdr:col', '0', NS)),
+                             int(origen.findtext('xdr:row', '0', NS)),
+                             medios[blip.get(ATRIBUTO_EMBED)][0]))
+    return imagenes
+
+def _foto_de_hoja(libro, nombre_hoja, ruta_hoja):
+    log(f"Buscando imagen del paciente en la hoja '{nombre_hoja}'...")
+    imagenes = imagenes_ancladas(libro, ruta_hoja)
+    log(f"Total de imágenes encontradas: {len(imagenes)}")
+
+    for idx, (col, row, ruta_imagen) in enumerate(imagenes, 1):
+        log(f"Imagen #{idx}: Columna {col} ({_letra(col)}), Fila {row}")
+        if COLUMNAS_FOTO[0] <= col <= COLUMNAS_FOTO[1] and FILAS_FOTO[0] <= row <= FILAS_FOTO[1]:
+            log(f"✓ Imagen encontrada en la zona esperada!")
+            return libro.read(ruta_imagen)
+
+    log(f"⚠ No se encontró imagen en la zona {_letra(COLUMNAS_FOTO[0])}-{_letra(COLUMNAS_FOTO[1])}, "
+        f"filas {FILAS_FOTO[0] + 1}-{FILAS_FOTO[1] + 1}")
+    return None
+
+def fotos_de_hojas(archivo_excel, nombres_hojas=None):
+    """
+    Bytes de la foto de cada hoja: {nombre: bytes o None}. Sin nombres_hojas
+    se usa la hoja activa. archivo_excel puede ser una ruta, un archivo abierto
+    o un LibroEnMemoria
+    """
+    if formato_tabla(archivo_excel):
+        # Los CSV no tienen imágenes, y la foto de un ODS no se busca: el email usa el marcador
+        return {nombre_hoja: None for nombre_hoja in (nombres_hojas or [])}
+    with zipfile.ZipFile(abrir_libro(archivo_excel)) as libro:
+        hojas, activa = hojas_del_libro(libro)
+        fotos = {}
+        for nombre_hoja in (nombres_hojas if nombres_hojas is not None else [activa]):
+            try:
+                if hojas.get(nombre_hoja) is None:
+                    raise KeyError(f"la hoja '{nombre_hoja}' no existe")
+                fotos[nombre_hoja] = _foto_de_hoja(libro, nombre_hoja, hojas[nombre_hoja])
+            except (KeyError, ET.ParseError, ValueError) as e:
+                log(f"Error al extraer la imagen de la hoja '{nombre_hoja}': {e}")
+                fotos[nombre_hoja] = None
+        return fotos
@@ -0,0 +1,41 @@
+"""
+EXCEL EN UN ÚNICO BUFFER EN MEMORIA
+El libro se descarga (o se lee del disco) una sola vez y todas las etapas
+comparten los mismos bytes: el hash del índice, openpyxl, la evaluación de
+fórmulas, la extracción de la foto y el adjunto del email
+"""
+
+import io
+import os
+
+class LibroEnMemoria:
+    """Contenido completo de un .xlsx con su nombre y su procedencia (ruta o URL)"""
+
+    def __init__(self, datos, nombre, origen=None):
+        self.datos = datos
+        self.nombre = nombre
+        self.origen = origen or nombre
+
+    @classmethod
+    def leer(cls, ruta):
+        """Carga el archivo con una única lectura del disco"""
+        with open(ruta, 'rb') as archivo:
+            return cls(archivo.read(), os.path.basename(ruta), os.path.abspath(ruta))
+
+    def abrir(self):
+        """Archivo de solo lectura sobre el buffer; BytesIO comparte los bytes sin copiarlos"""
+        return io.BytesIO(self.datos)
+
+    def __len__(self):
+        return len(self.datos)
+
+    def __str__(self):
+        return f"{self.nombre} (en memoria)"
+
+def abrir_libro(libro):
+    """Lo que openpyxl y zipfile aceptan: la ruta tal cual o un archivo sobre el buffer"""
+    return libro.abrir() if isinstance(libro, LibroEnMemoria) else libro
+
+def origen_libro(libro):
+    """Ruta absoluta o URL de procedencia del libro"""
+    return libro.origen if isinstance(libro, LibroEnMemoria) else os.path.abspath(libro)
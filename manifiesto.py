@@ -0,0 +1,58 @@
+"""
+MANIFIESTO DE PACIENTES
+Lista de libros Excel (uno por paciente o por residencia) que procesa una
+misma ejecución, con el email que recibe sus alertas
+"""
+
+import json
+import os
+
+# Directorio donde se guardan los libros descargados y sus índices
+DIRECTORIO_CACHE = '.cache_alertas'
+
+def cargar_manifiesto(ruta_manifiesto):
+    """
+    Lee el manifiesto JSON: una lista de entradas como
+    {"id": "maria", "file_id": "1AbC...", "email": "cuidadora@ejemplo.com"}
+    o {"id": "juan", "ruta": "pacientes/juan.xlsx"}; las de Drive admiten
+    además "sha256" para verificar la descarga y "formato" o "nombre" si el
+    libro es .csv u .ods
+    """
+    with open(ruta_manifiesto, 'r', encoding='utf-8') as archivo:
+        entradas = json.load(archivo)
+
+    if isinstance(entradas, dict):
+        entradas = entradas.get('libros', [])
+
+    validadas = []
+    for numero, entrada in enumerate(entradas, 1):
+        if not entrada.get('ruta') and not entrada.get('file_id'):
+            raise ValueError(f"Entrada {numero} del manifiesto sin 'ruta' ni 'file_id'")
+        entrada = dict(entrada)
+        entrada.setdefault('id', entrada.get('file_id') or os.path.splitext(os.path.basename(entrada['ruta']))[0])
+        validadas.append(entrada)
+
+    ids = [entrada['id'] for entrada in validadas]
+    if len(ids) != len(set(ids)):
+        raise ValueError("El manifiesto tiene ids repetidos")
+    return validadas
+
+# Formatos que se leen; con otra extensión (o sin ella) el libro de Drive se guarda como .xlsx
+EXTENSIONES = ('.xlsx', '.csv', '.ods')
+
+def extension_libro(entrada):
+    """
+    Extensión del libro de Drive según su entrada: "formato" ("csv", "ods", "xlsx")
+    o la extensión de su "nombre"; si no declara ninguna, .xlsx
+    """
+    extension = entrada.get('formato') or os.path.splitext(entrada.get('nombre') or '')[1]
+    extension = f".{str(extension).lower().lstrip('.')}"
+    return extension if extension in EXTENSIONES else '.xlsx'
+
+def ruta_libro(entrada):
+    """Ruta local del libro de una entrada (los de Drive se descargan a la caché con su extensión)"""
+    return entrada.get('ruta') or os.path.join(DIRECTORIO_CACHE, 'libros', f"{entrada['id']}{extension_libro(entrada)}")
+
+def ruta_indice(entrada, sufijo):
+    """Ruta del índice en caché de una entrada"""
+    return os.path.join(DIRECTORIO_CACHE, f"indice_{entrada['id']}_{sufijo}.json")
@@ -0,0 +1,227 @@
+"""
+MEDICIÓN DE RENDIMIENTO
+Pruebas de tiempo para comparar las distintas etapas del sistema de alertas
+"""
+
+from datetime import date, datetime, timedelta
+from importlib.util import find_spec
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Dependencias que antes se cargaban al importar los scripts
+DEPENDENCIAS_PESADAS = [
+    'openpyxl',
+    'PIL.Image',
+    'smtplib',
+    'email.mime.multipart',
+    'email.mime.text',
+    'email.mime.base',
+    'requests',
+    'gdown',
+]
+
+def medir_comando(codigo, repeticiones):
+    """Ejecuta código en un intérprete nuevo y devuelve la mediana en milisegundos"""
+    # Desde el directorio del proyecto, para que los scripts se importen aunque se lance desde otro sitio
+    directorio = os.path.dirname(os.path.abspath(__file__))
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        subprocess.run([sys.executable, '-c', codigo], check=True, cwd=directorio)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos)
+
+def medir_importacion(repeticiones):
+    """Compara el arranque con importaciones diferidas frente a la carga completa"""
+    instaladas = [modulo for modulo in DEPENDENCIAS_PESADAS if find_spec(modulo.split('.')[0])]
+    carga_completa = '; '.join(f"import {modulo}" for modulo in instaladas)
+
+    base = medir_comando('pass', repeticiones)
+    print(f"Intérprete vacío: {base:8.1f} ms")
+
+    for script in ('alerta_medicamentos', 'revisar_fechas'):
+        diferida = medir_comando(f"import {script}", repeticiones)
+        completa = medir_comando(f"import {script}; {carga_completa}", repeticiones)
+        print(f"{script}:")
+        print(f"  importación diferida: {diferida:8.1f} ms")
+        print(f"  importación completa: {completa:8.1f} ms")
+        print(f"  ahorro en el arranque: {completa - diferida:8.1f} ms ({completa / diferida:.1f}x)")
+
+def crear_libro_grande(ruta, filas, con_foto=False):
+    """Libro con la plantilla de alerta_medicamentos y `filas` fechas repartidas en un año"""
+    import openpyxl
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    if con_foto:
+        import io
+        from PIL import Image as ImagenPIL
+        from openpyxl.drawing.image import Image
+
+        datos = io.BytesIO()
+        ImagenPIL.new('RGB', (400, 400), (200, 120, 80)).save(datos, format='PNG')
+        foto = Image(datos)
+        foto.anchor = 'L6'
+        sheet.add_image(foto)
+    for numero in range(1, 18):
+        sheet.append(['PACIENTE DE PRUEBA'] if numero == 5 else [])
+    hoy = datetime.combine(date.today(), datetime.min.time())
+    azar = random.Random(0)
+    for numero in range(filas):
+        fecha = hoy + timedelta(days=azar.randint(-180, 180))
+        sheet.append([f"MEDICAMENTO {numero}", "USO"] + [None] * 7 + [fecha])
+    workbook.save(ruta)
+
+def medir_escaneo(repeticiones, filas):
+    """Compara la lista completa de alertas con el recorrido en streaming (primera alerta y memoria)"""
+    import openpyxl
+    import alerta_medicamentos
+
+    alerta_medicamentos.log = lambda mensaje: None
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'grande.xlsx')
+        crear_libro_grande(ruta, filas)
+        print(f"Libro de prueba: {filas} filas ({os.path.getsize(ruta) / 1024:.0f} KB)")
+
+        def con_lista():
+            workbook = openpyxl.load_workbook(ruta, data_only=True)
+            alertas = alerta_medicamentos.filtrar_alertas(alerta_medicamentos.escanear_filas(workbook.active))
+            workbook.close()
+            return alertas[0]
+
+        def en_streaming():
+            alertas = alerta_medicamentos.iterar_alertas_excel(ruta)
+            primera = next(alertas)
+            alertas.close()
+            return primera
+
+        for nombre, funcion in (('lista completa', con_lista), ('streaming', en_streaming)):
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                funcion()
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            tracemalloc.start()
+            funcion()
+            pico = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{nombre}:")
+            print(f"  primera alerta: {statistics.median(tiempos):8.1f} ms")
+            print(f"  memoria máxima: {pico / 1024 / 1024:8.1f} MB")
+
+def medir_formatos(repeticiones, filas):
+    """Escaneo completo del mismo libro guardado como .xlsx, .csv y .ods"""
+    import alerta_medicamentos
+    from verificar_backends import exportar_csv, exportar_ods
+
+    alerta_medicamentos.log = lambda mensaje: None
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'grande.xlsx')
+        crear_libro_grande(ruta, filas)
+        exportar_csv(ruta, os.path.join(directorio, 'grande.csv'), random.Random(0))
+        exportar_ods(ruta, os.path.join(directorio, 'grande.ods'))
+        print(f"Libro de prueba: {filas} filas")
+
+        referencia = filas_xlsx = None
+        for extension in ('.xlsx', '.csv', '.ods'):
+            ruta_libro = os.path.join(directorio, f"grande{extension}")
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                resultado, _ = alerta_medicamentos.leer_excel_y_escanear_filas(ruta_libro)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            mediana = statistics.median(tiempos)
+            if referencia is None:
+                referencia, filas_xlsx = mediana, resultado
+                comparacion = ""
+            else:
+                comparacion = "  (mismas filas)" if resultado == filas_xlsx else "  (¡filas distintas!)"
+            print(f"{extension:<6} {os.path.getsize(ruta_libro) / 1024:8.0f} KB {mediana:8.1f} ms "
+                  f"{referencia / mediana:6.2f}x{comparacion}")
+
+def medir_imagen(repeticiones, filas):
+    """Compara la búsqueda de la foto cargando el libro con openpyxl frente a la lectura del zip"""
+    import openpyxl
+    import imagenes_excel
+
+    imagenes_excel.log = lambda mensaje: None
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'grande.xlsx')
+        crear_libro_grande(ruta, filas, con_foto=True)
+        print(f"Libro de prueba: {filas} filas ({os.path.getsize(ruta) / 1024:.0f} KB)")
+
+        def con_openpyxl():
+            workbook = openpyxl.load_workbook(ruta)
+            datos = next(imagen._data() for imagen in workbook.active._images
+                         if 11 <= imagen.anchor._from.col <= 13 and 4 <= imagen.anchor._from.row <= 12)
+            workbook.close()
+            return datos
+
+        def desde_zip():
+            return imagenes_excel.fotos_de_hojas(ruta)
+
+        for nombre, funcion in (('openpyxl', con_openpyxl), ('zip', desde_zip)):
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                funcion()
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            print(f"{nombre}: {statistics.median(tiempos):8.1f} ms")
+
+def medir_agotamiento(repeticiones, filas):
+    """Compara la previsión de agotamiento vectorizada con NumPy frente al bucle en Python"""
+    import prevision_agotamiento
+
+    azar = random.Random(0)
+    existencias = [float(azar.randint(0, 500)) for _ in range(filas)]
+    dosis = [azar.choice([0.5, 1.0, 2.0, 3.0, 0.0]) for _ in range(filas)]
+    hoy = date.today()
+    referencias = [hoy - timedelta(days=azar.randint(0, 30)) for _ in range(filas)]
+    print(f"Filas: {filas}")
+
+    def con_bucle():
+        ordinales = [referencia.toordinal() for referencia in referencias]
+        return [date.fromordinal(ordinal) if ordinal is not None else None
+                for ordinal in prevision_agotamiento.agotamiento_python(existencias, dosis, ordinales)]
+
+    def con_numpy():
+        return prevision_agotamiento.fechas_agotamiento(existencias, dosis, referencias)
+
+    if con_bucle() != con_numpy():
+        print("⚠️ Los resultados no coinciden")
+    for nombre, funcion in (('bucle en Python', con_bucle), ('NumPy', con_numpy)):
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            funcion()
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        print(f"{nombre}: {statistics.median(tiempos):8.1f} ms")
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('prueba', choices=['importacion', 'escaneo', 'formatos', 'imagen', 'agotamiento'], help="Prueba a ejecutar")
+    parser.add_argument('--repeticiones', type=int, default=10, help="Ejecuciones por medición")
+    parser.add_argument('--filas', type=int, default=20000, help="Filas del libro de prueba (escaneo, formatos, imagen, agotamiento)")
+    args = parser.parse_args()
+
+    if args.prueba == 'importacion':
+        medir_importacion(args.repeticiones)
+    elif args.prueba == 'escaneo':
+        medir_escaneo(args.repeticiones, args.filas)
+    elif args.prueba == 'formatos':
+        medir_formatos(args.repeticiones, args.filas)
+    elif args.prueba == 'imagen':
+        medir_imagen(args.repeticiones, args.filas)
+    elif args.prueba == 'agotamiento':
+        medir_agotamiento(args.repeticiones, args.filas)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+PANEL ESTÁTICO DE PACIENTES
+Genera un sitio HTML estático que se puede abrir en el navegador: una página
+por paciente con todas sus fechas de medicamentos y un índice ordenado por
+urgencia. Cada página se guarda junto con la huella de lo que la produce
+(filas, datos del paciente y foto) y solo se reescriben las que cambian; de
+los libros cuyo hash no ha cambiado desde la generación anterior ni siquiera
+se leen las fotos. Tras la ejecución diaria, con los índices en caché,
+refrescar el sitio entero cuesta milisegundos
+"""
+
+from datetime import date
+import hashlib
+import json
+import os
+import re
+import time
+import unicodedata
+
+from bitacora import log
+
+ARCHIVO_ESTADO = '.panel.json'
+ARCHIVO_INDICE = 'index.html'
+# Subir al cambiar el HTML de las páginas: obliga a regenerarlas todas
+VERSION_PLANTILLA = 1
+
+def slug(texto):
+    """'José Pérez' -> 'jose-perez'"""
+    texto = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode('ascii')
+    return '-'.join(re.findall(r'[a-z0-9]+', texto.lower()))[:60]
+
+def nombre_pagina(clave_libro, hoja, paciente):
+    """Archivo de la página de un paciente: legible y sin choques entre libros con hojas iguales"""
+    huella = hashlib.sha1(f"{clave_libro}\0{hoja}".encode('utf-8')).hexdigest()[:8]
+    return f"{slug(paciente) or 'paciente'}-{huella}.html"
+
+def huella_pagina(filas, info_paciente, imagen):
+    """Huella de todo lo que aparece en la página de un paciente"""
+    contenido = json.dumps({
+        'version': VERSION_PLANTILLA,
+        'filas': filas,
+        'paciente': [info_paciente.get('paciente'), info_paciente.get('responsable'), info_paciente.get('telefono')],
+        'imagen': hashlib.sha256(imagen.encode('utf-8')).hexdigest() if imagen else None,
+    }, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+def resumen_paciente(archivo, filas, info_paciente, fecha_hoy):
+    """Lo que muestra el índice de un paciente: su fecha más próxima y cuántas quedan por venir"""
+    proximas = sorted(fila['fecha'] for fila in filas if fila['fecha'] >= fecha_hoy)
+    return {
+        'archivo': archivo,
+        'paciente': info_paciente.get('paciente'),
+        'responsable': info_paciente.get('responsable'),
+        'telefono': info_paciente.get('telefono'),
+        'proxima': proximas[0] if proximas else None,
+        'dias_restantes': (proximas[0] - fecha_hoy).days if proximas else None,
+        'proximas': len(proximas),
+        'vencidas': len(filas) - len(proximas),
+    }
+
+def escribir_si_cambia(ruta, contenido):
+    """Escritura atómica que no toca el archivo si ya tiene ese contenido. Devuelve si se escribió"""
+    try:
+        with open(ruta, 'r', encoding='utf-8') as archivo:
+            if archivo.read() == contenido:
+                return False
+    except OSError:
+        pass
+    ruta_temporal = f"{ruta}.tmp"
+    with open(ruta_temporal, 'w', encoding='utf-8') as archivo:
+        archivo.write(contenido)
+    os.replace(ruta_temporal, ruta)
+    return True
+
+def _cargar_estado(ruta):
+    try:
+        with open(ruta, 'r', encoding='utf-8') as archivo:
+            estado = json.load(archivo)
+        if estado.get('version') == VERSION_PLANTILLA:
+            return estado
+    except (OSError, ValueError):
+        pass
+    return {'version': VERSION_PLANTILLA, 'libros': {}, 'paginas': {}}
+
+def generar_panel(libros, directorio, leer_hojas, leer_fotos, renderizar_pagina, renderizar_indice, fecha_hoy=None):
+    """
+    Regenera el panel en directorio a partir de libros = [(clave, ruta)]:
+    - leer_hojas(ruta) -> ([{'hoja', 'filas', 'info_paciente'}] o None, hash del libro)
+    - leer_fotos(ruta, nombres de hoja) -> {hoja: imagen en base64}
+    - renderizar_pagina(filas, info_paciente con 'imagen') -> HTML de la página del paciente
+    - renderizar_indice(resúmenes ordenados por urgencia) -> HTML del índice
+    Devuelve (páginas escritas, páginas sin cambios)
+    """
+    fecha_hoy = fecha_hoy or date.today()
+    inicio = time.perf_counter()
+    os.makedirs(directorio, exist_ok=True)
+    ruta_estado = os.path.join(directorio, ARCHIVO_ESTADO)
+    estado = _cargar_estado(ruta_estado)
+    anteriores = estado['paginas']   # archivo -> {'libro', 'huella'}
+
+    paginas, resumenes, fallidos = {}, [], set()
+    escritas = sin_cambios = 0
+    for clave, ruta in libros:
+        hojas, hash_libro = leer_hojas(ruta)
+        if hojas is None:
+            # Sus páginas se conservan tal cual hasta que el libro se pueda volver a leer
+            log(f"⚠️ No se pudo leer '{clave}': sus páginas del panel no se actualizan")
+            fallidos.add(clave)
+            continue
+
+        libro_igual = estado['libros'].get(clave) == hash_libro
+        fotos = None
+        for hoja in hojas:
+            filas, info_paciente = hoja['filas'], hoja['info_paciente']
+            archivo = nombre_pagina(clave, hoja['hoja'], info_paciente['paciente'])
+            ruta_pagina = os.path.join(directorio, archivo)
+            resumenes.append(resumen_paciente(archivo, filas, info_paciente, fecha_hoy))
+
+            # Libro sin cambios desde la generación anterior: la página sigue valiendo
+            if libro_igual and archivo in anteriores and os.path.exists(ruta_pagina):
+                paginas[archivo] = anteriores[archivo]
+                sin_cambios += 1
+                continue
+
+            # Las fotos del libro se leen juntas, y solo si alguna página hay que comprobarla
+            if fotos is None:
+                fotos = leer_fotos(ruta, [hoja['hoja'] for hoja in hojas]) or {}
+            imagen = fotos.get(hoja['hoja'])
+            huella = huella_pagina(filas, info_paciente, imagen)
+            paginas[archivo] = {'libro': clave, 'huella': huella}
+            if anteriores.get(archivo, {}).get('huella') == huella and os.path.exists(ruta_pagina):
+                sin_cambios += 1
+                continue
+
+            escribir_si_cambia(ruta_pagina, renderizar_pagina(filas, dict(info_paciente, imagen=imagen)))
+            escritas += 1
+        estado['libros'][clave] = hash_libro
+
+    # Páginas de pacientes que ya no están (salvo las de libros que no se pudieron leer)
+    borradas = 0
+    for archivo, anotada in anteriores.items():
+        if archivo in paginas:
+            continue
+        if anotada.get('libro') in fallidos:
+            paginas[archivo] = anotada
+            continue
+        try:
+            os.remove(os.path.join(directorio, archivo))
+            borradas += 1
+        except OSError:
+            pass
+    claves = {clave for clave, _ in libros}
+    estado['libros'] = {clave: hash_libro for clave, hash_libro in estado['libros'].items() if clave in claves}
+    estado['paginas'] = paginas
+
+    # El índice depende del día (orden por urgencia), así que se recalcula siempre; es un solo archivo
+    resumenes.sort(key=lambda resumen: (resumen['dias_restantes'] is None, resumen['dias_restantes'] or 0,
+                                        str(resumen['paciente'])))
+    escribir_si_cambia(os.path.join(directorio, ARCHIVO_INDICE), renderizar_indice(resumenes))
+    escribir_si_cambia(ruta_estado, json.dumps(estado, ensure_ascii=False))
+
+    log(f"🗂️ Panel en {directorio}: {escritas} páginas escritas, {sin_cambios} sin cambios, {borradas} borradas "
+        f"({len(resumenes)} pacientes, {(time.perf_counter() - inicio) * 1000:.1f} ms)")
+    return escritas, sin_cambios
@@ -0,0 +1,152 @@
+"""
+PLANIFICADOR DE ENVÍOS
+Reparte los emails entre varias cuentas de Gmail por hash consistente del
+destinatario y los espacia con un cubo de tokens y una cuota diaria por cuenta
+"""
+
+from datetime import date
+import bisect
+import hashlib
+import json
+import os
+import threading
+import time
+
+CUOTA_DIARIA = 450       # Gmail permite ~500 envíos al día por cuenta; se deja margen
+ENVIOS_POR_MINUTO = 20   # ritmo sostenido por cuenta
+RAFAGA = 5               # envíos seguidos permitidos antes de empezar a espaciar
+NODOS_VIRTUALES = 160    # puntos de cada cuenta en el anillo de hash
+
+class CuotaAgotada(Exception):
+    """Todas las cuentas alcanzaron su cuota diaria"""
+
+def leer_cuentas(texto):
+    """Convierte 'usuario1:clave1,usuario2:clave2' (GMAIL_CUENTAS) en [(usuario, clave)]"""
+    cuentas = []
+    for parte in (texto or '').split(','):
+        if not parte.strip():
+            continue
+        usuario, separador, clave = parte.strip().partition(':')
+        if not separador or not usuario or not clave:
+            raise ValueError(f"Cuenta mal configurada en GMAIL_CUENTAS: '{usuario}'")
+        cuentas.append((usuario, clave))
+    return cuentas
+
+def _posicion(texto):
+    return int.from_bytes(hashlib.sha256(texto.encode('utf-8')).digest()[:8], 'big')
+
+class CuboTokens:
+    """Limita el ritmo de envío: `rafaga` seguidos y luego `por_segundo` de media"""
+
+    def __init__(self, por_segundo, rafaga):
+        self.por_segundo = por_segundo
+        self.capacidad = rafaga
+        self.tokens = float(rafaga)
+        self.ultimo = time.monotonic()
+        self._candado = threading.Lock()
+
+    def reservar(self):
+        """Toma un token (aunque quede en negativo) y devuelve los segundos que hay que esperar"""
+        with self._candado:
+            ahora = time.monotonic()
+            self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultimo) * self.por_segundo)
+            self.ultimo = ahora
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.por_segundo
+
+    def devolver(self):
+        """Reintegra el token de un envío que no llegó a salir"""
+        with self._candado:
+            self.tokens = min(self.capacidad, self.tokens + 1)
+
+class CuotasDiarias:
+    """Envíos del día por cuenta, guardados en disco para que cuenten entre ejecuciones"""
+
+    def __init__(self, ruta, limite):
+        self.ruta = ruta
+        self.limite = limite
+        self._candado = threading.Lock()
+        self._fecha = date.today().isoformat()
+        self._enviados = {}
+        try:
+            with open(ruta, 'r', encoding='utf-8') as archivo:
+                datos = json.load(archivo)
+            if datos.get('fecha') == self._fecha:
+                self._enviados = datos.get('enviados', {})
+        except (OSError, ValueError):
+            pass
+
+    def _guardar(self):
+        directorio = os.path.dirname(self.ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        ruta_temporal = f"{self.ruta}.tmp"
+        with open(ruta_temporal, 'w', encoding='utf-8') as archivo:
+            json.dump({'fecha': self._fecha, 'enviados': self._enviados}, archivo)
+        os.replace(ruta_temporal, self.ruta)
+
+    def consumir(self, usuario):
+        """Anota un envío de la cuenta si le queda cuota; devuelve True si se pudo"""
+        with self._candado:
+            hoy = date.today().isoformat()
+            if hoy != self._fecha:
+                self._fecha, self._enviados = hoy, {}
+            if self._enviados.get(usuario, 0) >= self.limite:
+                return False
+            self._enviados[usuario] = self._enviados.get(usuario, 0) + 1
+            self._guardar()
+            return True
+
+    def devolver(self, usuario):
+        """Descuenta un envío anotado que al final falló (si sigue siendo el mismo día)"""
+        with self._candado:
+            if date.today().isoformat() == self._fecha and self._enviados.get(usuario, 0) > 0:
+                self._enviados[usuario] -= 1
+                self._guardar()
+
+class PlanificadorEnvios:
+    """Elige la cuenta de cada envío y espera lo necesario para no superar sus límites"""
+
+    def __init__(self, cuentas, ruta_cuotas, cuota_diaria=CUOTA_DIARIA,
+                 envios_por_minuto=ENVIOS_POR_MINUTO, rafaga=RAFAGA):
+        if not cuentas:
+            raise ValueError("El planificador necesita al menos una cuenta")
+        self.cuentas = dict(cuentas)
+        self.cubos = {usuario: CuboTokens(envios_por_minuto / 60, rafaga) for usuario in self.cuentas}
+        self.cuotas = CuotasDiarias(ruta_cuotas, cuota_diaria)
+        self._anillo = sorted(
+            (_posicion(f"{usuario}#{numero}"), usuario)
+            for usuario in self.cuentas for numero in range(NODOS_VIRTUALES)
+        )
+        self._posiciones = [posicion for posicion, _ in self._anillo]
+
+    def cuentas_para(self, destinatario):
+        """Cuentas en orden de preferencia para un destinatario (hash consistente)"""
+        inicio = bisect.bisect(self._posiciones, _posicion(destinatario.strip().lower()))
+        orden = []
+        for desplazamiento in range(len(self._anillo)):
+            usuario = self._anillo[(inicio + desplazamiento) % len(self._anillo)][1]
+            if usuario not in orden:
+                orden.append(usuario)
+                if len(orden) == len(self.cuentas):
+                    break
+        return orden
+
+    def adquirir(self, destinatario):
+        """
+        Devuelve (usuario, clave) para enviar ya a `destinatario`; lanza CuotaAgotada si no queda cupo.
+        El envío queda cobrado a la cuenta: si falla hay que llamar a devolver(usuario)
+        """
+        for usuario in self.cuentas_para(destinatario):
+            if not self.cuotas.consumir(usuario):
+                continue
+            espera = self.cubos[usuario].reservar()
+            if espera > 0:
+                time.sleep(espera)
+            return usuario, self.cuentas[usuario]
+        raise CuotaAgotada(f"Las {len(self.cuentas)} cuentas de envío agotaron su cuota diaria")
+
+    def devolver(self, usuario):
+        """Reintegra la cuota y el token de un envío adquirido que no se llegó a hacer"""
+        self.cuotas.devolver(usuario)
+        self.cubos[usuario].devolver()
@@ -0,0 +1,129 @@
+"""
+PREVISIÓN DE AGOTAMIENTO DE EXISTENCIAS
+Si la hoja tiene columnas de existencias y de dosis diaria, calcula para cada
+fila la fecha en la que se acaba el medicamento (referencia + existencias /
+dosis) y la añade como una fecha más al flujo de alertas. El cálculo se hace
+de una vez para toda la hoja con NumPy, o con un bucle si no está instalado
+"""
+
+from datetime import date
+import math
+import os
+
+from fechas import normalizar_fecha
+from registros import FilaColumna
+
+# Letras de columna; sin existencias y dosis configuradas no se calcula nada
+COLUMNA_EXISTENCIAS = os.environ.get('COLUMNA_EXISTENCIAS', '').strip().upper()
+COLUMNA_DOSIS_DIARIA = os.environ.get('COLUMNA_DOSIS_DIARIA', '').strip().upper()
+# Fecha en la que se contaron las existencias; si no hay, se cuenta desde hoy
+COLUMNA_FECHA_RECUENTO = os.environ.get('COLUMNA_FECHA_RECUENTO', '').strip().upper()
+
+DIAS_MAXIMOS = 36500  # existencias enormes o dosis ínfimas no desbordan la fecha
+ORDINAL_1970 = date(1970, 1, 1).toordinal()
+
+def indice_columna(letras):
+    """'A' -> 1, 'AA' -> 27"""
+    indice = 0
+    for letra in letras:
+        indice = indice * 26 + ord(letra) - 64
+    return indice
+
+def a_numero(valor):
+    """Cantidad de la celda como float ('2,5' incluido); NaN si no es un número"""
+    if isinstance(valor, bool):
+        return math.nan
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    if isinstance(valor, str):
+        try:
+            return float(valor.strip().replace(',', '.'))
+        except ValueError:
+            return math.nan
+    return math.nan
+
+def agotamiento_python(existencias, dosis, referencias):
+    """Versión con bucle: ordinal del día de agotamiento de cada fila, o None"""
+    resultado = []
+    for cantidad, dosis_diaria, referencia in zip(existencias, dosis, referencias):
+        if math.isfinite(cantidad) and math.isfinite(dosis_diaria) and dosis_diaria > 0 and cantidad >= 0:
+            resultado.append(referencia + min(math.floor(cantidad / dosis_diaria), DIAS_MAXIMOS))
+        else:
+            resultado.append(None)
+    return resultado
+
+def agotamiento_numpy(existencias, dosis, referencias):
+    """Versión vectorizada: mismo resultado que agotamiento_python, en una sola pasada de NumPy"""
+    import numpy as np
+
+    cantidad = np.asarray(existencias, dtype=np.float64)
+    dosis_diaria = np.asarray(dosis, dtype=np.float64)
+    validas = np.isfinite(cantidad) & np.isfinite(dosis_diaria) & (dosis_diaria > 0) & (cantidad >= 0)
+
+    dias = np.zeros(len(cantidad), dtype=np.int64)
+    dias[validas] = np.minimum(np.floor(cantidad[validas] / dosis_diaria[validas]), DIAS_MAXIMOS)
+    ordinales = np.asarray(referencias, dtype=np.int64) + dias
+    return ordinales, validas
+
+def fechas_agotamiento(existencias, dosis, referencias):
+    """Fecha de agotamiento (date o None) de cada fila; referencias son fechas (date)"""
+    ordinales_referencia = [referencia.toordinal() for referencia in referencias]
+    try:
+        import numpy
+    except ImportError:
+        return [date.fromordinal(ordinal) if ordinal is not None else None
+                for ordinal in agotamiento_python(existencias, dosis, ordinales_referencia)]
+
+    ordinales, validas = agotamiento_numpy(existencias, dosis, ordinales_referencia)
+    # datetime64[D] cuenta días desde 1970; tolist() devuelve objetos date sin bucle en Python
+    fechas = (ordinales - ORDINAL_1970).astype('datetime64[D]').tolist()
+    return [fecha if valida else None for fecha, valida in zip(fechas, validas.tolist())]
+
+class PrevisionAgotamiento:
+    """Acumula existencias y dosis mientras se recorre la hoja y al final produce las filas previstas"""
+
+    def __init__(self, columna_existencias, columna_dosis, columna_recuento='', fecha_referencia=None):
+        self.columna_existencias = columna_existencias
+        self.indices = [indice_columna(columna_existencias), indice_columna(columna_dosis)]
+        self.indice_recuento = indice_columna(columna_recuento) if columna_recuento else None
+        self.fecha_referencia = fecha_referencia or date.today()
+        self._filas, self._existencias, self._dosis, self._referencias = [], [], [], []
+
+    @property
+    def ultima_columna(self):
+        return max(self.indices + [self.indice_recuento or 0])
+
+    def anotar(self, fila, valores, columna_medicamento=1, columna_uso=2):
+        """Guarda los datos de una fila con medicamento (valores empieza en la columna A)"""
+        celda = lambda indice: valores[indice - 1] if indice and len(valores) >= indice else None
+        medicamento = celda(columna_medicamento)
+        if not medicamento:
+            return
+        self._filas.append((fila, str(medicamento), str(celda(columna_uso) or "Uso no especificado")))
+        self._existencias.append(a_numero(celda(self.indices[0])))
+        self._dosis.append(a_numero(celda(self.indices[1])))
+        self._referencias.append(normalizar_fecha(celda(self.indice_recuento)) or self.fecha_referencia)
+
+    def filas(self):
+        """FilaColumna con la fecha de agotamiento prevista de cada fila con existencias y dosis"""
+        fechas = fechas_agotamiento(self._existencias, self._dosis, self._referencias)
+        return [
+            FilaColumna(fila, fecha, medicamento, f"{uso} (agotamiento previsto)", self.columna_existencias)
+            for (fila, medicamento, uso), fecha in zip(self._filas, fechas)
+            if fecha is not None
+        ]
+
+def crear_prevision():
+    """PrevisionAgotamiento con las columnas configuradas, o None si no hay"""
+    if not (COLUMNA_EXISTENCIAS and COLUMNA_DOSIS_DIARIA):
+        return None
+    return PrevisionAgotamiento(COLUMNA_EXISTENCIAS, COLUMNA_DOSIS_DIARIA, COLUMNA_FECHA_RECUENTO)
+
+def parametros_prevision():
+    """Parámetros que invalidan el índice en caché: las columnas y, si se cuenta desde hoy, la fecha"""
+    if not (COLUMNA_EXISTENCIAS and COLUMNA_DOSIS_DIARIA):
+        return {}
+    parametros = {'agotamiento': [COLUMNA_EXISTENCIAS, COLUMNA_DOSIS_DIARIA, COLUMNA_FECHA_RECUENTO]}
+    if not COLUMNA_FECHA_RECUENTO:
+        parametros['agotamiento_desde'] = date.today().isoformat()
+    return parametros
@@ -0,0 +1,88 @@
+"""
+REGISTROS COMPACTOS DE FILAS Y ALERTAS
+Tuplas con nombre en lugar de diccionarios: ocupan menos memoria en hojas
+grandes y siguen admitiendo el acceso por clave del resto del código
+(fila['fecha'], fila.get('columna'), dict(fila)).
+
+Las filas y alertas de una sola columna de fechas (alerta_medicamentos.py)
+tienen los mismos campos que los diccionarios de siempre; solo las que vienen
+de varias columnas (revisar_fechas.py) o de la previsión de agotamiento llevan
+además 'columna', que es lo que las distingue dentro de la misma fila
+"""
+
+from datetime import date
+from typing import NamedTuple
+
+class _AccesoPorClave:
+    """Acceso tipo diccionario sobre los campos de una NamedTuple"""
+    __slots__ = ()
+
+    def __getitem__(self, clave):
+        # Solo los campos: fila['count'] o fila['index'] no deben devolver los métodos de la tupla
+        if isinstance(clave, str):
+            if clave not in self._fields:
+                raise KeyError(clave)
+            return getattr(self, clave)
+        return tuple.__getitem__(self, clave)
+
+    def get(self, clave, defecto=None):
+        return getattr(self, clave) if clave in self._fields else defecto
+
+    def keys(self):
+        return self._fields
+
+class _CamposFila(NamedTuple):
+    fila: int
+    fecha: date
+    medicamento: str
+    uso: str
+
+class _CamposFilaColumna(NamedTuple):
+    fila: int
+    fecha: date
+    medicamento: str
+    uso: str
+    columna: str
+
+class _CamposAlerta(NamedTuple):
+    fila: int
+    fecha: date
+    dias_restantes: int
+    medicamento: str
+    uso: str
+
+class _CamposAlertaColumna(NamedTuple):
+    fila: int
+    fecha: date
+    dias_restantes: int
+    medicamento: str
+    uso: str
+    columna: str
+
+class FilaMedicamento(_AccesoPorClave, _CamposFila):
+    """Una fecha leída de la tabla de medicamentos"""
+    __slots__ = ()
+
+class FilaColumna(_AccesoPorClave, _CamposFilaColumna):
+    """Una fecha leída de una de varias columnas de la tabla (letra en 'columna')"""
+    __slots__ = ()
+
+class Alerta(_AccesoPorClave, _CamposAlerta):
+    """Una fila cuya fecha cae dentro de la ventana de aviso"""
+    __slots__ = ()
+
+class AlertaColumna(_AccesoPorClave, _CamposAlertaColumna):
+    """Alerta de una FilaColumna"""
+    __slots__ = ()
+
+def fila_medicamento(fila, fecha, medicamento, uso, columna=''):
+    """FilaColumna si la fila viene de una columna concreta, FilaMedicamento si no"""
+    if columna:
+        return FilaColumna(fila, fecha, medicamento, uso, columna)
+    return FilaMedicamento(fila, fecha, medicamento, uso)
+
+def alerta_de_fila(fila, dias_restantes):
+    if fila.get('columna'):
+        return AlertaColumna(fila['fila'], fila['fecha'], dias_restantes, fila['medicamento'], fila['uso'],
+                             fila['columna'])
+    return Alerta(fila['fila'], fila['fecha'], dias_restantes, fila['medicamento'], fila['uso'])
@@ -0,0 +1,94 @@
+"""
+RENDERIZADO EN LOTE SIN ENVÍOS
+Escanea un lote de libros en paralelo y escribe, para cada uno, el email
+completo en formato .eml (RFC 5322, con el Excel adjunto) y el texto de los
+WhatsApp, sin SMTP ni HTTP. Sirve para revisar los diseños y para medir
+cuánto cuesta renderizar por sí solo
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+import time
+
+from bitacora import log
+
+def libros_a_renderizar(rutas):
+    """Expande las carpetas a sus .xlsx, .csv y .ods; los archivos se toman tal cual"""
+    libros = []
+    for ruta in rutas:
+        if os.path.isdir(ruta):
+            libros.extend(sorted(os.path.join(ruta, nombre) for nombre in os.listdir(ruta)
+                                 if nombre.lower().endswith(('.xlsx', '.csv', '.ods')) and not nombre.startswith('~$')))
+        else:
+            libros.append(ruta)
+    return libros
+
+def _nombres_salida(libros):
+    """Nombre base de salida de cada libro, sin repetir aunque dos carpetas tengan el mismo archivo"""
+    usados = set()
+    nombres = []
+    for ruta in libros:
+        base = os.path.splitext(os.path.basename(ruta))[0]
+        nombre, numero = base, 1
+        # 'ana_2' puede ser también el nombre de otro libro: se sigue contando hasta uno libre
+        while nombre in usados:
+            numero += 1
+            nombre = f"{base}_{numero}"
+        usados.add(nombre)
+        nombres.append(nombre)
+    return nombres
+
+def escribir_eml(ruta, mensaje):
+    """Guarda el mensaje MIME con fines de línea CRLF, como viaja por SMTP"""
+    with open(ruta, 'wb') as archivo:
+        archivo.write(mensaje.as_bytes(policy=mensaje.policy.clone(linesep='\r\n')))
+
+def escribir_whatsapp(ruta, mensajes):
+    """Guarda los WhatsApp del libro: [(teléfono, texto)]"""
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        archivo.write('\n\n'.join(f"Para: {telefono}\n\n{texto}" for telefono, texto in mensajes) + '\n')
+
+def _renderizar_uno(renderizar, ruta_excel, base_salida, opciones):
+    """Se ejecuta en un proceso del grupo: renderiza un libro y escribe sus archivos"""
+    inicio = time.perf_counter()
+    mensaje, whatsapp, alertas = renderizar(ruta_excel, **opciones)
+    if mensaje is not None:
+        escribir_eml(f"{base_salida}.eml", mensaje)
+    if whatsapp:
+        escribir_whatsapp(f"{base_salida}.whatsapp.txt", whatsapp)
+    return alertas, mensaje is not None, time.perf_counter() - inicio
+
+def renderizar_lote(rutas, directorio_salida, renderizar, procesos=None, **opciones):
+    """
+    Renderiza cada libro con renderizar(ruta, **opciones) -> (mensaje MIME o None,
+    [(teléfono, texto)], número de alertas) en procesos en paralelo
+    """
+    libros = libros_a_renderizar(rutas)
+    if not libros:
+        log("⚠️ No hay libros que renderizar")
+        return
+    os.makedirs(directorio_salida, exist_ok=True)
+    procesos = procesos or os.cpu_count() or 1
+
+    log(f"🖨️ Renderizando {len(libros)} libros en {directorio_salida} ({procesos} procesos)...")
+    inicio = time.perf_counter()
+    emails = alertas = errores = 0
+    with ProcessPoolExecutor(max_workers=procesos) as grupo:
+        futuros = {
+            grupo.submit(_renderizar_uno, renderizar, ruta, os.path.join(directorio_salida, nombre), opciones): ruta
+            for ruta, nombre in zip(libros, _nombres_salida(libros))
+        }
+        for futuro in as_completed(futuros):
+            try:
+                alertas_libro, con_email, segundos = futuro.result()
+            except Exception as e:
+                log(f"✗ Error al renderizar {futuros[futuro]}: {e}")
+                errores += 1
+                continue
+            alertas += alertas_libro
+            emails += con_email
+            log(f"✓ {futuros[futuro]}: {alertas_libro} alertas en {segundos * 1000:.0f} ms")
+
+    total = time.perf_counter() - inicio
+    log(f"📊 {len(libros)} libros en {total:.2f} s ({len(libros) / total:.1f} libros/s): "
+        f"{emails} emails .eml, {alertas} alertas, {errores} errores")
@@ -3,36 +3,45 @@ SISTEMA DE REVISIÓN AUTOMÁTICA DE FECHAS EN EXCEL
 Versión Mejorada con Bootstrap 5 y WhatsApp
 """
 
-import openpyxl
 from datetime import datetime, date
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
+import argparse
 import os
 import sys
-import requests
-import json
+
+from bitacora import log
+from cache_alertas import calcular_hash
+from flujo_alertas import FlujoAlertas, anadir_opciones_exportacion, destinos_exportacion, leer_adjunto
+from registros import FilaColumna, alerta_de_fila
+from formulas_fecha import completar_hojas
+from fechas import normalizar_fecha
+from prevision_agotamiento import crear_prevision, parametros_prevision
+from esquema_columnas import Esquema, esquema_de_hoja, parametros_esquema
+from libro_memoria import LibroEnMemoria
+from tablas_csv_ods import cargar_libro
+
+# openpyxl, smtplib y requests se importan dentro de cada etapa:
+# en los días sin alertas el proceso termina sin llegar a cargarlos
 
 # Obtener configuración desde variables de entorno
 GMAIL_USUARIO = os.environ.get('GMAIL_USUARIO')
 GMAIL_PASSWORD = os.environ.get('GMAIL_PASSWORD')
+GMAIL_CUENTAS = os.environ.get('GMAIL_CUENTAS', '')  # 'usuario1:clave1,usuario2:clave2' para repartir envíos
 EMAIL_DESTINO = os.environ.get('EMAIL_DESTINO')
 WHATSAPP_API_KEY = os.environ.get('WHATSAPP_API_KEY', '')  # API de CallMeBot (gratis)
 
 # Archivo Excel
 RUTA_EXCEL = "medicamentos.xlsx"
+RUTA_INDICE = os.environ.get('RUTA_INDICE_ALERTAS', '.cache_alertas/indice_revisar_fechas.json')
+RUTA_INDICE_HOJAS = os.environ.get('RUTA_INDICE_HOJAS', '.cache_alertas/indice_revisar_fechas_hojas.json')
 
 # Configuración
 COLUMNAS_REVISAR = ['I']
 DIAS_ALERTA = 5
 FILA_INICIO = 14  # Empezar desde la fila 14
+HILOS_ESCANEO = 4  # Hojas escaneadas a la vez en el modo --todas-hojas
 
-def log(mensaje):
-    """Registrar mensajes con timestamp"""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"[{timestamp}] {mensaje}")
+# Pasos comunes a los dos scripts (flujo_alertas.py)
+flujo = FlujoAlertas(sys.modules[__name__])
 
 def leer_info_paciente(sheet):
     """Lee la información del paciente desde las celdas específicas"""
@@ -58,11 +67,98 @@ def leer_info_paciente(sheet):
             'telefono': ""
         }
 
-def leer_excel_y_buscar_alertas(ruta_archivo):
-    """Lee el archivo Excel y busca fechas próximas desde la fila 14"""
+def _indice_columna(letras):
+    """'I' -> 9, 'AA' -> 27 (sin openpyxl: el CSV se lee sin cargarlo)"""
+    indice = 0
+    for letra in letras.upper():
+        indice = indice * 26 + ord(letra) - 64
+    return indice
+
+def _letra_columna(indice):
+    """9 -> 'I', 27 -> 'AA'"""
+    letras = ''
+    while indice > 0:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+def iterar_filas(sheet, sin_fecha=None):
+    """Produce las filas con fecha desde la cabecera de la tabla (por defecto COLUMNAS_REVISAR desde FILA_INICIO)"""
+    por_defecto = Esquema(FILA_INICIO, 1, 2, tuple(_indice_columna(col) for col in COLUMNAS_REVISAR))
+    esquema = esquema_de_hoja(sheet, por_defecto)
+    columnas = [(_letra_columna(col_num), col_num) for col_num in esquema.fechas]
+    prevision = crear_prevision()
+    ultima_columna = max(esquema.medicamento, esquema.uso, prevision.ultima_columna if prevision else 0, *esquema.fechas)
+    celda = lambda valores, columna: valores[columna - 1] if len(valores) >= columna else None
+    
+    # Recorrer desde la primera fila bajo la cabecera (la 14 en la plantilla original)
+    filas = sheet.iter_rows(min_row=esquema.fila_inicio, max_col=ultima_columna, values_only=True)
+    for fila, valores in enumerate(filas, esquema.fila_inicio):
+        if prevision:
+            prevision.anotar(fila, valores, esquema.medicamento, esquema.uso)
+        medicamento = celda(valores, esquema.medicamento)
+        uso = celda(valores, esquema.uso)
+        for col_letra, col_num in columnas:
+            valor = celda(valores, col_num)
+            # Acepta fechas de Excel, números de serie y fechas escritas como texto
+            fecha = normalizar_fecha(valor)
+            
+            if fecha:
+                # Nombre del medicamento y uso (columnas A y B en la plantilla original)
+                nombre_medicamento = medicamento or "Medicamento sin nombre"
+                uso_medicamento = uso or "Uso no especificado"
+                yield FilaColumna(fila, fecha, str(nombre_medicamento), str(uso_medicamento), col_letra)
+            elif valor is None and medicamento and sin_fecha is not None:
+                # Puede ser una fórmula guardada sin valor calculado: se evalúa al terminar la hoja
+                sin_fecha.append((col_num, FilaColumna(fila, None, str(medicamento), str(uso or "Uso no especificado"), col_letra)))
+    
+    # Las fechas de agotamiento se calculan juntas, para toda la hoja, al terminar de leerla
+    if prevision:
+        yield from prevision.filas()
+
+def escanear_filas(sheet, sin_fecha=None):
+    """Devuelve todas las filas con fecha de la tabla de medicamentos"""
+    return list(iterar_filas(sheet, sin_fecha))
+
+def iterar_alertas(filas, fecha_hoy=None):
+    """Produce las alertas de cualquier iterable de filas sin esperar a tenerlas todas"""
+    fecha_hoy = fecha_hoy or date.today()
+    for fila in filas:
+        dias_restantes = (fila['fecha'] - fecha_hoy).days
+        if 0 <= dias_restantes <= DIAS_ALERTA:
+            yield alerta_de_fila(fila, dias_restantes)
+
+def filtrar_alertas(filas, fecha_hoy=None):
+    """Devuelve las filas cuya fecha cae dentro de los próximos DIAS_ALERTA días"""
+    log(f"Buscando fechas con menos de {DIAS_ALERTA} días...")
+    
+    alertas = []
+    for alerta in iterar_alertas(filas, fecha_hoy):
+        alertas.append(alerta)
+        log(f"  ⚠️ Alerta: {alerta['medicamento']} - Fila {alerta['fila']}, Columna {alerta['columna']}, Fecha: {alerta['fecha']}, Días: {alerta['dias_restantes']}")
+    
+    log(f"Total de alertas encontradas: {len(alertas)}")
+    return alertas
+
+def iterar_alertas_excel(ruta_archivo, fecha_hoy=None):
+    """Abre el Excel en modo streaming y produce cada alerta en cuanto se lee su fila"""
+    workbook = cargar_libro(ruta_archivo)
+    sheet = workbook.active
+    hoja = {'hoja': sheet.title, 'filas': [], 'sin_fecha': []}
+    try:
+        yield from iterar_alertas(iterar_filas(sheet, hoja['sin_fecha']), fecha_hoy)
+    finally:
+        workbook.close()
+    
+    # Las fechas que solo existen como fórmula llegan al final, tras evaluarlas
+    yield from iterar_alertas(completar_hojas(ruta_archivo, [hoja])[0]['filas'], fecha_hoy)
+
+def leer_excel_y_escanear_filas(ruta_archivo):
+    """Lee el archivo Excel y devuelve todas las filas con fecha desde la fila 14"""
     try:
         log(f"Abriendo archivo Excel: {ruta_archivo}")
-        workbook = openpyxl.load_workbook(ruta_archivo, data_only=True)
+        # Solo lectura: las filas se recorren en streaming sin cargar toda la hoja (también CSV y ODS)
+        workbook = cargar_libro(ruta_archivo)
         sheet = workbook.active
         
         # Leer información del paciente
@@ -70,47 +166,13 @@ def leer_excel_y_buscar_alertas(ruta_archivo):
         log(f"Paciente: {info_paciente['paciente']}")
         log(f"Ubicación: {info_paciente['ubicacion']}")
         
-        alertas = []
-        fecha_hoy = date.today()
-        
-        columnas_numeros = [openpyxl.utils.cell.column_index_from_string(col) for col in COLUMNAS_REVISAR]
-        
-        log(f"Revisando columnas: {', '.join(COLUMNAS_REVISAR)} desde fila {FILA_INICIO}")
-        log(f"Buscando fechas con menos de {DIAS_ALERTA} días...")
-        
-        # Recorrer desde la fila 14 en adelante
-        for fila in range(FILA_INICIO, sheet.max_row + 1):
-            for col_num in columnas_numeros:
-                celda = sheet.cell(row=fila, column=col_num)
-                valor = celda.value
-                
-                if isinstance(valor, datetime):
-                    fecha_celda = valor.date()
-                    dias_restantes = (fecha_celda - fecha_hoy).days
-                    
-                    if 0 <= dias_restantes <= DIAS_ALERTA:
-                        col_letra = openpyxl.utils.cell.get_column_letter(col_num)
-                        
-                        # Obtener nombre del medicamento (columna A)
-                        nombre_medicamento = sheet.cell(row=fila, column=1).value or "Medicamento sin nombre"
-                        
-                        # Obtener uso del medicamento (columna B)
-                        uso_medicamento = sheet.cell(row=fila, column=2).value or "Uso no especificado"
-                        
-                        alerta = {
-                            'fila': fila,
-                            'columna': col_letra,
-                            'fecha': fecha_celda,
-                            'dias_restantes': dias_restantes,
-                            'medicamento': str(nombre_medicamento),
-                            'uso': str(uso_medicamento)
-                        }
-                        alertas.append(alerta)
-                        log(f"  ⚠️ Alerta: {nombre_medicamento} - Fila {fila}, Columna {col_letra}, Fecha: {fecha_celda}, Días: {dias_restantes}")
+        log(f"Revisando la tabla de medicamentos (por defecto columnas {', '.join(COLUMNAS_REVISAR)} desde fila {FILA_INICIO})")
+        hoja = {'hoja': sheet.title, 'sin_fecha': []}
+        hoja['filas'] = escanear_filas(sheet, hoja['sin_fecha'])
         
         workbook.close()
-        log(f"Total de alertas encontradas: {len(alertas)}")
-        return alertas, info_paciente
+        filas = completar_hojas(ruta_archivo, [hoja])[0]['filas']
+        return filas, info_paciente
     
     except FileNotFoundError:
         log(f"❌ ERROR: No se encontró el archivo: {ruta_archivo}")
@@ -121,17 +183,74 @@ def leer_excel_y_buscar_alertas(ruta_archivo):
         traceback.print_exc()
         return None, None
 
+def leer_excel_y_buscar_alertas(ruta_archivo):
+    """Lee el archivo Excel y busca fechas próximas desde la fila 14"""
+    filas, info_paciente = leer_excel_y_escanear_filas(ruta_archivo)
+    if filas is None:
+        return None, None
+    return filtrar_alertas(filas), info_paciente
+
+def hoja_coincide_con_plantilla(sheet):
+    """Una hoja sigue la plantilla si tiene el nombre del paciente en B2"""
+    return bool(sheet['B2'].value)
+
+def leer_excel_todas_las_hojas(ruta_archivo):
+    """Lee el Excel una sola vez y escanea en paralelo todas las hojas que siguen la plantilla"""
+    try:
+        from concurrent.futures import ThreadPoolExecutor
+        
+        log(f"Abriendo archivo Excel: {ruta_archivo}")
+        workbook = cargar_libro(ruta_archivo, read_only=False)
+        hojas = [sheet for sheet in workbook.worksheets if hoja_coincide_con_plantilla(sheet)]
+        log(f"Hojas con la plantilla de paciente: {len(hojas)} de {len(workbook.worksheets)}")
+        
+        def escanear_hoja(sheet):
+            sin_fecha = []
+            filas = escanear_filas(sheet, sin_fecha)
+            return {'hoja': sheet.title, 'filas': filas, 'sin_fecha': sin_fecha, 'info_paciente': leer_info_paciente(sheet)}
+        
+        # Las hojas ya están en memoria: cada hilo solo recorre las celdas de la suya
+        with ThreadPoolExecutor(max_workers=HILOS_ESCANEO) as pool:
+            resultados = list(pool.map(escanear_hoja, hojas))
+        
+        workbook.close()
+        completar_hojas(ruta_archivo, resultados)
+        for resultado in resultados:
+            log(f"Hoja '{resultado['hoja']}': {resultado['info_paciente']['paciente']} - {len(resultado['filas'])} fechas")
+        return resultados
+    
+    except FileNotFoundError:
+        log(f"❌ ERROR: No se encontró el archivo: {ruta_archivo}")
+        return None
+    except Exception as e:
+        log(f"❌ ERROR al leer Excel: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+def parametros_lectura():
+    """Parámetros de plantilla que invalidan el índice en caché si cambian"""
+    return {'fila_inicio': FILA_INICIO, 'columnas_revisar': COLUMNAS_REVISAR, 'fechas_formula': True, 'fechas_texto': True,
+            **parametros_prevision(), **parametros_esquema()}
+
 def crear_html_email_bootstrap(alertas, info_paciente):
     """Crea un email con diseño Bootstrap 5 moderno"""
-    num_alertas = len(alertas)
+    return crear_html_email_varios_pacientes([(alertas, info_paciente)])
+
+def crear_html_email_varios_pacientes(bloques):
+    """Crea un único email con una sección por paciente: bloques = [(alertas, info_paciente)]"""
     fecha_revision = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
     
-    # Agrupar alertas por urgencia
-    alertas_hoy = [a for a in alertas if a['dias_restantes'] == 0]
-    alertas_manana = [a for a in alertas if a['dias_restantes'] == 1]
-    alertas_proximas = [a for a in alertas if a['dias_restantes'] >= 2]
+    html = _html_inicio_email()
+    for alertas, info_paciente in bloques:
+        html += _html_paciente(alertas, info_paciente)
+    html += _html_fin_email(fecha_revision)
     
-    html = f"""
+    return html
+
+def _html_inicio_email():
+    """Cabecera del documento: estilos y título"""
+    return f"""
 <!DOCTYPE html>
 <html lang="es">
 <head>
@@ -382,6 +501,18 @@ def crear_html_email_bootstrap(alertas, info_paciente):
             <div class="subtitle">Control y seguimiento automatizado</div>
         </div>
         
+"""
+
+def _html_paciente(alertas, info_paciente):
+    """Información del paciente, resumen y tarjetas agrupadas por urgencia"""
+    num_alertas = len(alertas)
+    
+    # Agrupar alertas por urgencia
+    alertas_hoy = [a for a in alertas if a['dias_restantes'] == 0]
+    alertas_manana = [a for a in alertas if a['dias_restantes'] == 1]
+    alertas_proximas = [a for a in alertas if a['dias_restantes'] >= 2]
+    
+    html = f"""
         <!-- Información del Paciente -->
         <div class="info-paciente">
             <h3>📋 Información del Paciente</h3>
@@ -468,9 +599,15 @@ def crear_html_email_bootstrap(alertas, info_paciente):
             """
         html += "</div>"
     
-    html += f"""
+    html += """
         </div>
-        
+"""
+    
+    return html
+
+def _html_fin_email(fecha_revision):
+    """Pie del email"""
+    return f"""
         <!-- Footer -->
         <div class="footer">
             <hr>
@@ -485,12 +622,15 @@ def crear_html_email_bootstrap(alertas, info_paciente):
 </body>
 </html>
     """
-    
-    return html
 
-def enviar_whatsapp(telefono, mensaje, info_paciente):
-    """Envía mensaje por WhatsApp usando CallMeBot API (gratis)"""
+def enviar_whatsapp(telefono, mensaje, info_paciente=None, lanzar=False):
+    """
+    Envía mensaje por WhatsApp usando CallMeBot API (gratis); sin info_paciente el mensaje ya es el texto completo.
+    Con lanzar=True el error (también la respuesta no 200 de CallMeBot) se propaga
+    """
     try:
+        import requests
+        
         if not telefono:
             log("⚠️ No se configuró número de WhatsApp")
             return False
@@ -502,16 +642,7 @@ def enviar_whatsapp(telefono, mensaje, info_paciente):
         # Más info: https://www.callmebot.com/blog/free-api-whatsapp-messages/
         
         # Mensaje simplificado para WhatsApp
-        texto = f"""
-🏥 *ALERTA DE MEDICAMENTOS*
-
-👤 Paciente: {info_paciente['paciente']}
-📍 Ubicación: {info_paciente['ubicacion']}
-
-{mensaje}
-
-🤖 Sistema automatizado
-        """.strip()
+        texto = texto_whatsapp(mensaje, info_paciente) if info_paciente else mensaje
         
         # URL de la API de CallMeBot
         url = "https://api.callmebot.com/whatsapp.php"
@@ -529,12 +660,70 @@ def enviar_whatsapp(telefono, mensaje, info_paciente):
             return True
         else:
             log(f"⚠️ Error al enviar WhatsApp: {response.status_code}")
+            if lanzar:
+                raise RuntimeError(f"CallMeBot respondió {response.status_code}: {response.text[:200]}")
             return False
             
     except Exception as e:
         log(f"⚠️ No se pudo enviar WhatsApp: {str(e)}")
+        if lanzar:
+            raise
         return False
 
+def texto_whatsapp(mensaje, info_paciente):
+    """Texto completo del WhatsApp: cabecera del paciente y resumen de alertas"""
+    return f"""
+🏥 *ALERTA DE MEDICAMENTOS*
+
+👤 Paciente: {info_paciente['paciente']}
+📍 Ubicación: {info_paciente['ubicacion']}
+
+{mensaje}
+
+🤖 Sistema automatizado
+    """.strip()
+
+def lineas_whatsapp(alertas, info_paciente):
+    """Una línea por alerta con el nombre del paciente, para agrupar varios pacientes: [(días, fecha ISO, texto)]"""
+    lineas = []
+    for alerta in alertas:
+        if alerta['dias_restantes'] == 0:
+            urgencia = "🔴 HOY"
+        elif alerta['dias_restantes'] == 1:
+            urgencia = "🟠 MAÑANA"
+        else:
+            urgencia = f"🟡 {alerta['dias_restantes']} días"
+        lineas.append((alerta['dias_restantes'], alerta['fecha'].isoformat(),
+                       f"{urgencia} - *{alerta['medicamento']}* ({alerta['fecha'].strftime('%d/%m/%Y')}) - {info_paciente['paciente']}"))
+    return lineas
+
+def crear_mensajes_whatsapp_agrupados(pacientes):
+    """
+    pacientes = [(teléfono, líneas)]: junta las alertas de todos los pacientes de cada
+    teléfono en los menos mensajes posibles. Devuelve {teléfono: [textos]}
+    """
+    from whatsapp_agrupado import agrupar_por_telefono, empaquetar
+    
+    mensajes = {}
+    for telefono, lineas in agrupar_por_telefono(pacientes).items():
+        pacientes_telefono = sum(1 for otro, _ in pacientes if str(otro) == telefono)
+        
+        def cabecera(parte, partes, total=len(lineas), pacientes_telefono=pacientes_telefono):
+            numeracion = f" ({parte}/{partes})" if partes > 1 else ""
+            return (f"🏥 *ALERTA DE MEDICAMENTOS*{numeracion}\n\n"
+                    f"⚠️ *{total} medicamentos* de {pacientes_telefono} pacientes requieren revisión:\n\n")
+        
+        mensajes[telefono] = empaquetar(lineas, cabecera)
+    return mensajes
+
+def notificar_whatsapp_agrupados(pacientes):
+    """Un WhatsApp (o los mínimos que quepan) por teléfono en lugar de uno por paciente"""
+    mensajes = crear_mensajes_whatsapp_agrupados(pacientes)
+    for telefono, textos in mensajes.items():
+        log(f"📱 {len(textos)} WhatsApp para {telefono}")
+        for texto in textos:
+            flujo.despachar_whatsapp(telefono, texto)
+
 def crear_mensaje_whatsapp(alertas):
     """Crea un mensaje resumido para WhatsApp"""
     mensaje = f"⚠️ *{len(alertas)} medicamentos* requieren revisión:\n\n"
@@ -555,38 +744,59 @@ def crear_mensaje_whatsapp(alertas):
     
     return mensaje
 
-def enviar_email(destinatario, asunto, cuerpo_html, archivo_adjunto=None):
-    """Envía un email vía Gmail SMTP"""
+def crear_email(remitente, destinatario, asunto, cuerpo_html, archivo_adjunto=None):
+    """Construye el mensaje MIME (HTML y Excel adjunto) sin enviarlo"""
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+    from email.mime.base import MIMEBase
+    from email import encoders
+    from email.utils import formatdate, make_msgid
+    
+    mensaje = MIMEMultipart()
+    mensaje['From'] = remitente
+    mensaje['To'] = destinatario
+    mensaje['Subject'] = asunto
+    mensaje['Date'] = formatdate(localtime=True)
+    mensaje['Message-ID'] = make_msgid(domain=remitente.rpartition('@')[2] or 'localhost')
+    
+    mensaje.attach(MIMEText(cuerpo_html, 'html', 'utf-8'))
+    
+    adjunto = leer_adjunto(archivo_adjunto)
+    if adjunto:
+        nombre_archivo, datos_archivo = adjunto
+        log(f"Adjuntando archivo: {nombre_archivo}")
+        parte = MIMEBase('application', 'octet-stream')
+        parte.set_payload(datos_archivo)
+        encoders.encode_base64(parte)
+        parte.add_header('Content-Disposition', f'attachment; filename= {nombre_archivo}')
+        mensaje.attach(parte)
+    return mensaje
+
+def enviar_email(destinatario, asunto, cuerpo_html, archivo_adjunto=None, lanzar=False):
+    """Envía un email vía Gmail SMTP; con lanzar=True el error se propaga en lugar de devolver False"""
+    reservada = None   # cuenta a la que ya se cobró este envío y que hay que reintegrar si falla
     try:
-        log("Preparando email...")
+        import smtplib
         
-        mensaje = MIMEMultipart()
-        mensaje['From'] = GMAIL_USUARIO
-        mensaje['To'] = destinatario
-        mensaje['Subject'] = asunto
+        # Con varias cuentas, espera aquí hasta que la cuenta elegida tenga cupo
+        usuario, clave = flujo.cuenta_de_envio(destinatario)
+        reservada = usuario
         
-        mensaje.attach(MIMEText(cuerpo_html, 'html', 'utf-8'))
+        log("Preparando email...")
         
-        if archivo_adjunto and os.path.exists(archivo_adjunto):
-            log(f"Adjuntando archivo: {archivo_adjunto}")
-            with open(archivo_adjunto, 'rb') as archivo:
-                parte = MIMEBase('application', 'octet-stream')
-                parte.set_payload(archivo.read())
-                encoders.encode_base64(parte)
-                nombre_archivo = os.path.basename(archivo_adjunto)
-                parte.add_header('Content-Disposition', f'attachment; filename= {nombre_archivo}')
-                mensaje.attach(parte)
+        mensaje = crear_email(usuario, destinatario, asunto, cuerpo_html, archivo_adjunto)
         
         log("Conectando con Gmail SMTP...")
         servidor = smtplib.SMTP('smtp.gmail.com', 587)
         servidor.starttls()
         
         log("Autenticando...")
-        servidor.login(GMAIL_USUARIO, GMAIL_PASSWORD)
+        servidor.login(usuario, clave)
         
         log("Enviando email...")
         texto = mensaje.as_string()
-        servidor.sendmail(GMAIL_USUARIO, destinatario, texto)
+        servidor.sendmail(usuario, destinatario, texto)
+        reservada = None
         servidor.quit()
         
         log("✅ Email enviado exitosamente!")
@@ -594,60 +804,214 @@ def enviar_email(destinatario, asunto, cuerpo_html, archivo_adjunto=None):
     
     except Exception as e:
         log(f"❌ ERROR al enviar email: {str(e)}")
+        if reservada is not None:
+            flujo.devolver_cuenta(reservada)
         import traceback
         traceback.print_exc()
+        if lanzar:
+            raise
         return False
 
-def main():
-    """Función principal"""
-    log("="*70)
-    log("SISTEMA DE REVISIÓN AUTOMÁTICA - VERSIÓN MEJORADA")
-    log("="*70)
+def notificar_alertas(alertas, info_paciente, ruta_excel):
+    """Envía el email y el WhatsApp con las alertas encontradas"""
+    log(f"\n🚨 Se encontraron {len(alertas)} alertas. Preparando notificaciones...")
     
-    if not all([GMAIL_USUARIO, GMAIL_PASSWORD, EMAIL_DESTINO]):
-        log("❌ ERROR: Faltan variables de entorno")
-        sys.exit(1)
+    # Crear email HTML con Bootstrap
+    cuerpo_html = crear_html_email_bootstrap(alertas, info_paciente)
+    asunto = f"🏥 ALERTAS: {len(alertas)} Medicamentos - {info_paciente['paciente']}"
+    
+    # Enviar email
+    flujo.despachar_email(EMAIL_DESTINO, asunto, cuerpo_html, ruta_excel)
+    
+    # Enviar WhatsApp si hay número configurado
+    if info_paciente['telefono']:
+        mensaje_wa = crear_mensaje_whatsapp(alertas)
+        flujo.despachar_whatsapp(info_paciente['telefono'], mensaje_wa, info_paciente)
+    else:
+        log("ℹ️ No se envió WhatsApp (número no configurado en celda I4)")
+
+def procesar_todas_las_hojas(ruta_excel, destinos=None):
+    """Escanea todas las hojas del Excel y envía un único email con las que tienen alertas"""
+    hojas = flujo.escanear_todas_las_hojas(ruta_excel, destinos)
+    
+    bloques = []
+    for hoja in hojas:
+        log(f"--- Hoja '{hoja['hoja']}' ---")
+        alertas = filtrar_alertas(hoja['filas'])
+        if alertas:
+            bloques.append((alertas, hoja['info_paciente']))
     
+    if not bloques:
+        log("✅ No se encontraron alertas. No se envió ninguna notificación.")
+        return
+    
+    total_alertas = sum(len(alertas) for alertas, _ in bloques)
+    log(f"\n🚨 Se encontraron {total_alertas} alertas en {len(bloques)} de {len(hojas)} hojas. Preparando notificaciones...")
+    
+    cuerpo_html = crear_html_email_varios_pacientes(bloques)
+    asunto = f"🏥 ALERTAS: {total_alertas} Medicamentos - {len(bloques)} pacientes"
+    
+    flujo.despachar_email(EMAIL_DESTINO, asunto, cuerpo_html, ruta_excel)
+    
+    # Un cuidador con varios pacientes recibe sus alertas juntas
+    notificar_whatsapp_agrupados([(info_paciente['telefono'], lineas_whatsapp(alertas, info_paciente))
+                                  for alertas, info_paciente in bloques])
+
+def vigilar_excel(ruta_excel):
+    """Recalcula las alertas cada vez que se guarda el Excel local y notifica las nuevas"""
+    from vigilancia import vigilar_archivo, comparar_alertas
+    
+    estado = {'hash': None, 'alertas': []}
+    
+    def revisar(ruta):
+        libro = LibroEnMemoria.leer(ruta)
+        hash_excel = calcular_hash(libro, parametros_lectura())
+        if hash_excel == estado['hash']:
+            log("Archivo guardado sin cambios de contenido")
+            return
+        
+        filas, info_paciente, _ = flujo.obtener_filas(libro, hash_excel)
+        if filas is None:
+            log("❌ No se pudo leer el archivo Excel")
+            return
+        flujo.registrar_historial(hash_excel, [{'hoja': '', 'filas': filas, 'info_paciente': info_paciente}], libro)
+        
+        alertas = filtrar_alertas(filas)
+        nuevas, resueltas = comparar_alertas(estado['alertas'], alertas)
+        primera_revision = estado['hash'] is None
+        estado.update(hash=hash_excel, alertas=alertas)
+        
+        if primera_revision:
+            return
+        
+        for alerta in resueltas:
+            log(f"  ✓ Resuelta: {alerta['medicamento']} - Fila {alerta['fila']}, Columna {alerta['columna']}")
+        for alerta in nuevas:
+            log(f"  🆕 Nueva: {alerta['medicamento']} - Fila {alerta['fila']}, Columna {alerta['columna']}, Días: {alerta['dias_restantes']}")
+        
+        if nuevas:
+            notificar_alertas(alertas, info_paciente, libro)
+    
+    revisar(ruta_excel)
+    log(f"👀 Vigilando cambios en: {ruta_excel}")
+    vigilar_archivo(ruta_excel, revisar)
+
+def renderizar_libro(ruta_excel, todas_hojas=False):
+    """
+    Escaneo, HTML, WhatsApp y MIME de un libro sin enviar nada (modo --renderizar).
+    Devuelve (mensaje MIME o None si no hay alertas, [(teléfono, texto)], número de alertas)
+    """
+    libro = LibroEnMemoria.leer(ruta_excel)
+    if todas_hojas:
+        hojas = leer_excel_todas_las_hojas(libro) or []
+    else:
+        filas, info_paciente = leer_excel_y_escanear_filas(libro)
+        hojas = [{'filas': filas, 'info_paciente': info_paciente}] if filas is not None else []
+    
+    bloques = [(filtrar_alertas(hoja['filas']), hoja['info_paciente']) for hoja in hojas]
+    bloques = [(alertas, info_paciente) for alertas, info_paciente in bloques if alertas]
+    if not bloques:
+        return None, [], 0
+    
+    total_alertas = sum(len(alertas) for alertas, _ in bloques)
+    if todas_hojas:
+        cuerpo_html = crear_html_email_varios_pacientes(bloques)
+        asunto = f"🏥 ALERTAS: {total_alertas} Medicamentos - {len(bloques)} pacientes"
+    else:
+        cuerpo_html = crear_html_email_bootstrap(*bloques[0])
+        asunto = f"🏥 ALERTAS: {total_alertas} Medicamentos - {bloques[0][1]['paciente']}"
+    
+    mensaje = crear_email(GMAIL_USUARIO or 'alertas@localhost', EMAIL_DESTINO or 'destino@localhost',
+                          asunto, cuerpo_html, libro)
+    if todas_hojas:
+        agrupados = crear_mensajes_whatsapp_agrupados([(info_paciente['telefono'], lineas_whatsapp(alertas, info_paciente))
+                                                       for alertas, info_paciente in bloques])
+        whatsapp = [(telefono, texto) for telefono, textos in agrupados.items() for texto in textos]
+    else:
+        whatsapp = [(info_paciente['telefono'], texto_whatsapp(crear_mensaje_whatsapp(alertas), info_paciente))
+                    for alertas, info_paciente in bloques if info_paciente['telefono']]
+    return mensaje, whatsapp, total_alertas
+
+def procesar(args, destinos):
+    """Ejecuta el modo elegido en la línea de comandos (vigilancia, todas las hojas o un paciente)"""
     if not os.path.exists(RUTA_EXCEL):
         log(f"❌ ERROR: No se encontró el archivo Excel: {RUTA_EXCEL}")
         sys.exit(1)
     
-    # Buscar alertas
-    alertas, info_paciente = leer_excel_y_buscar_alertas(RUTA_EXCEL)
+    if args.vigilar:
+        vigilar_excel(RUTA_EXCEL)
+        return
     
-    if alertas is None:
-        log("❌ No se pudo leer el archivo Excel")
-        sys.exit(1)
+    # Una sola lectura del disco: hash, escaneo, fórmulas y adjunto comparten el buffer
+    libro = LibroEnMemoria.leer(RUTA_EXCEL)
     
-    if len(alertas) > 0:
-        log(f"\n🚨 Se encontraron {len(alertas)} alertas. Preparando notificaciones...")
-        
-        # Crear email HTML con Bootstrap
-        cuerpo_html = crear_html_email_bootstrap(alertas, info_paciente)
-        asunto = f"🏥 ALERTAS: {len(alertas)} Medicamentos - {info_paciente['paciente']}"
+    if args.todas_hojas:
+        procesar_todas_las_hojas(libro, destinos)
+    else:
+        filas, info_paciente = flujo.escanear_libro(libro, destinos)
         
-        # Enviar email
-        resultado_email = enviar_email(EMAIL_DESTINO, asunto, cuerpo_html, RUTA_EXCEL)
+        # Buscar alertas
+        alertas = filtrar_alertas(filas)
         
-        if resultado_email:
-            log(f"✅ Email enviado a: {EMAIL_DESTINO}")
+        if len(alertas) > 0:
+            notificar_alertas(alertas, info_paciente, libro)
+            log(f"✅ Proceso completado")
         else:
-            log("❌ El email no pudo ser enviado")
-        
-        # Enviar WhatsApp si hay número configurado
-        if info_paciente['telefono']:
-            mensaje_wa = crear_mensaje_whatsapp(alertas)
-            enviar_whatsapp(info_paciente['telefono'], mensaje_wa, info_paciente)
-        else:
-            log("ℹ️ No se envió WhatsApp (número no configurado en celda I4)")
-        
-        log(f"✅ Proceso completado")
-    else:
-        log("✅ No se encontraron alertas. No se envió ninguna notificación.")
+            log("✅ No se encontraron alertas. No se envió ninguna notificación.")
+
+def main(argv=None):
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Sistema de revisión automática de fechas")
+    parser.add_argument('--vigilar', action='store_true',
+                        help="Vigila RUTA_EXCEL en disco y recalcula las alertas en cada guardado")
+    parser.add_argument('--todas-hojas', action='store_true',
+                        help="Escanea todas las hojas con la plantilla de paciente (una hoja por paciente)")
+    parser.add_argument('--renderizar', metavar='DIRECTORIO',
+                        help="Solo renderiza: escribe un .eml y el texto de WhatsApp por libro, sin enviar nada")
+    parser.add_argument('--libros', nargs='+', default=[RUTA_EXCEL],
+                        help="Libros o carpetas de libros a renderizar (por defecto RUTA_EXCEL)")
+    parser.add_argument('--procesos', type=int, default=None,
+                        help="Procesos en paralelo del modo --renderizar (por defecto, uno por CPU)")
+    parser.add_argument('--servir', action='store_true',
+                        help="Arranca un servicio HTTP local de consultas sobre las filas del Excel en memoria")
+    parser.add_argument('--puerto', type=int, default=8765, help="Puerto del servicio de consultas")
+    anadir_opciones_exportacion(parser)
+    parser.add_argument('--bandeja', action='store_true',
+                        help="Guarda las notificaciones en la bandeja de salida y las envía en segundo plano con reintentos")
+    parser.add_argument('--drenar-bandeja', action='store_true',
+                        help="Solo reintenta los envíos pendientes de la bandeja de salida")
+    args = parser.parse_args(argv)
+    
+    log("="*70)
+    log("SISTEMA DE REVISIÓN AUTOMÁTICA - VERSIÓN MEJORADA")
+    log("="*70)
+    
+    if args.servir:
+        # Consultas de solo lectura: no hace falta configurar el correo
+        from servidor_consultas import servir
+        if not os.path.exists(RUTA_EXCEL):
+            log(f"❌ ERROR: No se encontró el archivo Excel: {RUTA_EXCEL}")
+            sys.exit(1)
+        servir(RUTA_EXCEL, flujo.obtener_hojas, DIAS_ALERTA, args.puerto)
+        return
+    
+    if args.renderizar:
+        # Sin SMTP ni HTTP: no hace falta configurar el correo
+        from renderizado import renderizar_lote
+        renderizar_lote(args.libros, args.renderizar, renderizar_libro, args.procesos, todas_hojas=args.todas_hojas)
+        return
+    
+    if not EMAIL_DESTINO or not (GMAIL_CUENTAS or (GMAIL_USUARIO and GMAIL_PASSWORD)):
+        log("❌ ERROR: Faltan variables de entorno")
+        sys.exit(1)
+    
+    with flujo.envios(con_bandeja=args.bandeja or args.drenar_bandeja):
+        if not args.drenar_bandeja:
+            procesar(args, destinos_exportacion(args))
     
     log("="*70)
     log("PROCESO FINALIZADO")
     log("="*70)
 
 if __name__ == "__main__":
-    main()
+    main()
\ No newline at end of file
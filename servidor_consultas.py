@@ -0,0 +1,178 @@
+"""
+SERVICIO LOCAL DE CONSULTAS DE ALERTAS
+Mantiene en memoria las filas escaneadas del Excel y responde en JSON
+"qué vence para el paciente X en N días" sin volver a leer el archivo
+"""
+
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import heapq
+import json
+import os
+import threading
+
+from bitacora import log
+
+URGENCIAS = {
+    'hoy': lambda dias: dias == 0,
+    'manana': lambda dias: dias == 1,
+    'proximas': lambda dias: dias >= 2,
+}
+
+def _normalizar(texto):
+    return ' '.join(str(texto).split()).casefold()
+
+class IndiceAlertas:
+    """
+    Filas de todas las hojas ordenadas por fecha, con acceso por paciente.
+    Cada paciente se identifica por (origen, hoja, paciente): dos hojas o dos
+    libros con el mismo nombre de paciente no se mezclan, y las respuestas
+    llevan esa clave para distinguirlos
+    """
+
+    def __init__(self, hojas, hash_libro, origen=''):
+        self.hash_libro = hash_libro
+        self.origen = origen
+        self.cargado = datetime.now().isoformat(timespec='seconds')
+        self.pacientes = {}
+        filas = []
+        for hoja in hojas:
+            info = {clave: valor for clave, valor in hoja['info_paciente'].items() if clave != 'imagen'}
+            clave = (origen, hoja.get('hoja') or '', str(info['paciente']))
+            self.pacientes[clave] = dict(info, origen=clave[0], hoja=clave[1], clave=list(clave))
+            for fila in hoja['filas']:
+                filas.append(dict(fila, origen=clave[0], hoja=clave[1], paciente=clave[2], clave=list(clave)))
+
+        self.filas = sorted(filas, key=lambda fila: fila['fecha'])
+        self.fechas = [fila['fecha'] for fila in self.filas]
+        self.por_paciente = {}
+        for fila in self.filas:
+            self.por_paciente.setdefault(tuple(fila['clave']), []).append(fila)
+        self.fechas_por_paciente = {
+            clave: [fila['fecha'] for fila in filas_paciente] for clave, filas_paciente in self.por_paciente.items()
+        }
+
+    def claves_paciente(self, paciente, hoja=None):
+        """Claves (origen, hoja, paciente) cuyo nombre coincide, opcionalmente solo de una hoja"""
+        nombre = _normalizar(paciente)
+        return [clave for clave in self.pacientes
+                if _normalizar(clave[2]) == nombre and (hoja is None or clave[1] == hoja)]
+
+    def consultar(self, dias, paciente=None, urgencia=None, fecha_hoy=None, hoja=None):
+        """Filas que vencen entre hoy y dentro de `dias` días (incluido)"""
+        fecha_hoy = fecha_hoy or date.today()
+        limite = fecha_hoy + timedelta(days=dias)
+        if paciente:
+            tramos = []
+            for clave in self.claves_paciente(paciente, hoja):
+                fechas = self.fechas_por_paciente.get(clave, [])
+                tramos.append(self.por_paciente.get(clave, [])[bisect_left(fechas, fecha_hoy):
+                                                               bisect_right(fechas, limite)])
+            filas = list(heapq.merge(*tramos, key=lambda fila: fila['fecha']))
+        else:
+            filas = self.filas[bisect_left(self.fechas, fecha_hoy):bisect_right(self.fechas, limite)]
+            if hoja is not None:
+                filas = [fila for fila in filas if fila['hoja'] == hoja]
+
+        resultado = []
+        for fila in filas:
+            dias_restantes = (fila['fecha'] - fecha_hoy).days
+            if urgencia and not URGENCIAS[urgencia](dias_restantes):
+                continue
+            resultado.append(dict(fila, fecha=fila['fecha'].isoformat(), dias_restantes=dias_restantes))
+        return resultado
+
+    def resumen_pacientes(self, fecha_hoy=None):
+        """Pacientes con su próxima fecha pendiente"""
+        fecha_hoy = fecha_hoy or date.today()
+        resumen = []
+        for clave, info in self.pacientes.items():
+            pendientes = [fila['fecha'] for fila in self.por_paciente.get(clave, []) if fila['fecha'] >= fecha_hoy]
+            resumen.append(dict(info, proxima_fecha=min(pendientes).isoformat() if pendientes else None,
+                                fechas_pendientes=len(pendientes)))
+        return resumen
+
+class ServicioConsultas:
+    """Recarga el índice cuando el Excel cambia de contenido (hash distinto)"""
+
+    def __init__(self, ruta_excel, cargar_hojas, dias_por_defecto):
+        self.ruta_excel = ruta_excel
+        self.cargar_hojas = cargar_hojas
+        self.dias_por_defecto = dias_por_defecto
+        self._indice = None
+        self._firma = None
+        self._candado = threading.Lock()
+
+    def indice(self):
+        """Devuelve el índice vigente; solo relee si cambió la fecha de modificación o el tamaño"""
+        estado = os.stat(self.ruta_excel)
+        firma = (estado.st_mtime_ns, estado.st_size)
+        if firma == self._firma:
+            return self._indice
+
+        with self._candado:
+            if firma != self._firma:
+                hojas, hash_libro = self.cargar_hojas(self.ruta_excel)
+                if hojas is None:
+                    raise RuntimeError(f"No se pudo leer {self.ruta_excel}")
+                if self._indice is None or hash_libro != self._indice.hash_libro:
+                    self._indice = IndiceAlertas(hojas, hash_libro, os.path.abspath(self.ruta_excel))
+                    log(f"✓ Índice cargado: {len(self._indice.filas)} filas de {len(self._indice.pacientes)} pacientes")
+                self._firma = firma
+        return self._indice
+
+def _crear_manejador(servicio):
+    class Manejador(BaseHTTPRequestHandler):
+        def _responder(self, codigo, datos):
+            cuerpo = json.dumps(datos, ensure_ascii=False, default=str).encode('utf-8')
+            self.send_response(codigo)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            parametros = {clave: valores[-1] for clave, valores in parse_qs(url.query).items()}
+            try:
+                indice = servicio.indice()
+                if url.path == '/alertas':
+                    urgencia = parametros.get('urgencia')
+                    if urgencia and urgencia not in URGENCIAS:
+                        self._responder(400, {'error': f"urgencia debe ser una de: {', '.join(URGENCIAS)}"})
+                        return
+                    dias = int(parametros.get('dias', servicio.dias_por_defecto))
+                    alertas = indice.consultar(dias, parametros.get('paciente'), urgencia, hoja=parametros.get('hoja'))
+                    self._responder(200, {'dias': dias, 'total': len(alertas), 'alertas': alertas})
+                elif url.path == '/pacientes':
+                    self._responder(200, {'pacientes': indice.resumen_pacientes()})
+                elif url.path == '/estado':
+                    self._responder(200, {'origen': indice.origen, 'hash': indice.hash_libro, 'cargado': indice.cargado,
+                                          'filas': len(indice.filas), 'pacientes': len(indice.pacientes)})
+                else:
+                    self._responder(404, {'error': "Rutas disponibles: /alertas, /pacientes, /estado"})
+            except ValueError as e:
+                self._responder(400, {'error': str(e)})
+            except Exception as e:
+                log(f"❌ ERROR al responder {self.path}: {e}")
+                self._responder(500, {'error': str(e)})
+
+        def log_message(self, formato, *argumentos):
+            pass
+
+    return Manejador
+
+def servir(ruta_excel, cargar_hojas, dias_por_defecto, puerto=8765, host='127.0.0.1'):
+    """Arranca el servicio HTTP; cargar_hojas(ruta) devuelve (hojas, hash_libro)"""
+    servicio = ServicioConsultas(ruta_excel, cargar_hojas, dias_por_defecto)
+    servicio.indice()
+    servidor = ThreadingHTTPServer((host, puerto), _crear_manejador(servicio))
+    log(f"🌐 Servicio de consultas en http://{host}:{puerto} (/alertas, /pacientes, /estado)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
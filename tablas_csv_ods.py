@@ -0,0 +1,315 @@
+"""
+LIBROS EN CSV Y ODS
+Algunos centros exportan la hoja de control como CSV u ODS. En lugar de
+convertirlos antes a .xlsx, se leen directamente: el CSV con el módulo csv en
+streaming y el ODS recorriendo content.xml con iterparse, sin cargar el
+documento entero. Cada hoja ofrece la parte de la interfaz de openpyxl que
+usan los scripts (title, iter_rows, hoja['B5'].value), así que la cabecera,
+la fila de inicio y las columnas se detectan igual que en un .xlsx y las
+filas resultantes son las mismas. El CSV no necesita openpyxl: es el camino
+más rápido
+"""
+
+from datetime import datetime
+from itertools import islice
+from typing import NamedTuple
+import codecs
+import csv
+import io
+import os
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+
+from libro_memoria import LibroEnMemoria, abrir_libro
+
+FORMATOS = {'.csv': 'csv', '.ods': 'ods'}
+SEPARADORES = ';,\t'
+MUESTRA_CSV = 64 * 1024       # bytes que se miran para elegir codificación y separador
+FILAS_EN_MEMORIA = 40         # primeras filas que se guardan para la cabecera y los datos del paciente
+
+# Como openpyxl: '12' y '1.5' son números, pero '0612' (teléfonos, códigos) sigue siendo texto
+_NUMERO = re.compile(r'^-?(?:0|[1-9]\d*)(?:[.,]\d+)?$')
+_COORDENADA = re.compile(r'^([A-Z]+)(\d+)$')
+
+TABLA = '{urn:oasis:names:tc:opendocument:xmlns:table:1.0}'
+OFFICE = '{urn:oasis:names:tc:opendocument:xmlns:office:1.0}'
+TEXTO = '{urn:oasis:names:tc:opendocument:xmlns:text:1.0}'
+CONFIG = '{urn:oasis:names:tc:opendocument:xmlns:config:1.0}'
+# Nombres ya compuestos: se comparan cientos de miles de veces por libro
+ODS_HOJA, ODS_FILA = f'{TABLA}table', f'{TABLA}table-row'
+ODS_CELDAS = (f'{TABLA}table-cell', f'{TABLA}covered-table-cell')
+ODS_REPETIR_FILA, ODS_REPETIR_CELDA = f'{TABLA}number-rows-repeated', f'{TABLA}number-columns-repeated'
+ODS_TIPO, ODS_VALOR, ODS_FECHA = f'{OFFICE}value-type', f'{OFFICE}value', f'{OFFICE}date-value'
+ODS_BOOLEANO, ODS_TEXTO = f'{OFFICE}boolean-value', f'{OFFICE}string-value'
+ODS_PARRAFO, ODS_ESPACIOS, ODS_REPETIR_ESPACIO = f'{TEXTO}p', f'{TEXTO}s', f'{TEXTO}c'
+
+class Celda(NamedTuple):
+    value: object
+
+def formato_tabla(libro):
+    """'csv' u 'ods' según la extensión del libro (ruta o LibroEnMemoria); None para .xlsx"""
+    nombre = libro.nombre if isinstance(libro, LibroEnMemoria) else str(libro)
+    return FORMATOS.get(os.path.splitext(nombre)[1].lower())
+
+def _coordenada(coordenada):
+    """'B5' -> (columna 2, fila 5)"""
+    letras, fila = _COORDENADA.match(coordenada.upper()).groups()
+    columna = 0
+    for letra in letras:
+        columna = columna * 26 + ord(letra) - ord('A') + 1
+    return columna, int(fila)
+
+class HojaTabla:
+    """
+    Hoja de un CSV u ODS con lo que los scripts usan de una hoja de openpyxl.
+    abrir_filas(min_row, max_col) produce las filas desde min_row cada vez que se llama
+    """
+    max_row = None
+    max_column = None
+
+    def __init__(self, title, abrir_filas):
+        self.title = title
+        self._abrir_filas = abrir_filas
+        self._primeras = None
+
+    def _primeras_filas(self):
+        # Cabecera y datos del paciente salen de aquí sin volver a leer el archivo
+        if self._primeras is None:
+            self._primeras = list(islice(self._abrir_filas(1, None), FILAS_EN_MEMORIA))
+        return self._primeras
+
+    def __getitem__(self, coordenada):
+        columna, fila = _coordenada(coordenada)
+        filas = self._primeras_filas() if fila <= FILAS_EN_MEMORIA else list(islice(self._abrir_filas(1, None), fila))
+        valores = filas[fila - 1] if len(filas) >= fila else ()
+        return Celda(valores[columna - 1] if len(valores) >= columna else None)
+
+    def iter_rows(self, min_row=1, max_row=None, max_col=None, values_only=True):
+        """Solo valores, como iter_rows(values_only=True); las filas pueden ser más cortas que max_col"""
+        if max_row is not None and max_row <= FILAS_EN_MEMORIA:
+            filas = (valores[:max_col] for valores in self._primeras_filas()[min_row - 1:max_row])
+        else:
+            filas = self._abrir_filas(min_row, max_col)
+            if max_row is not None:
+                filas = islice(filas, max(max_row - min_row + 1, 0))
+        yield from filas
+
+class LibroTabla:
+    """Libro de hojas HojaTabla con la interfaz de un workbook de openpyxl"""
+
+    def __init__(self, hojas, activa=None):
+        self.worksheets = hojas
+        self.active = activa or (hojas[0] if hojas else None)
+
+    def close(self):
+        pass
+
+# --- CSV ---
+
+def valor_csv(texto):
+    """Valor de una celda del CSV: None si está vacía, número si lo parece, si no el texto"""
+    if not texto:
+        return None
+    if _NUMERO.match(texto):
+        numero = texto.replace(',', '.')
+        return float(numero) if '.' in numero else int(numero)
+    return texto
+
+def _muestra(libro):
+    if isinstance(libro, LibroEnMemoria):
+        return libro.datos[:MUESTRA_CSV]
+    with open(libro, 'rb') as archivo:
+        return archivo.read(MUESTRA_CSV)
+
+def formato_csv(libro):
+    """(codificación, separador) del CSV: UTF-8 (con o sin BOM) o, si no lo es, Windows-1252"""
+    muestra = _muestra(libro)
+    if muestra.startswith(codecs.BOM_UTF8):
+        codificacion = 'utf-8-sig'
+    else:
+        try:
+            # Incremental: un carácter cortado al final de la muestra no cuenta como error
+            codecs.getincrementaldecoder('utf-8')().decode(muestra, final=False)
+            codificacion = 'utf-8'
+        except UnicodeDecodeError:
+            codificacion = 'cp1252'
+
+    texto = muestra.decode(codificacion, errors='ignore')
+    try:
+        separador = csv.Sniffer().sniff(texto, delimiters=SEPARADORES).delimiter
+    except csv.Error:
+        separador = max(SEPARADORES, key=texto.count)
+    return codificacion, separador
+
+def _abrir_texto(libro, codificacion):
+    if isinstance(libro, LibroEnMemoria):
+        return io.TextIOWrapper(libro.abrir(), encoding=codificacion, newline='')
+    return open(libro, 'r', encoding=codificacion, newline='')
+
+def libro_csv(libro):
+    """El CSV como un libro de una sola hoja, leída en streaming"""
+    codificacion, separador = formato_csv(libro)
+
+    def abrir_filas(min_row, max_col):
+        with _abrir_texto(libro, codificacion) as archivo:
+            filas = csv.reader(archivo, delimiter=separador)
+            # Las filas anteriores a min_row se saltan sin convertir sus celdas
+            for campos in islice(filas, min_row - 1, None):
+                yield tuple(map(valor_csv, campos[:max_col]))
+
+    nombre = libro.nombre if isinstance(libro, LibroEnMemoria) else os.path.basename(libro)
+    return LibroTabla([HojaTabla(os.path.splitext(nombre)[0], abrir_filas)])
+
+# --- ODS ---
+
+def _texto_ods(elemento):
+    """Texto de un <text:p> con sus espacios repetidos, tabuladores y saltos de línea"""
+    partes = [elemento.text or '']
+    for hijo in elemento:
+        if hijo.tag == ODS_ESPACIOS:
+            partes.append(' ' * int(hijo.get(ODS_REPETIR_ESPACIO, 1)))
+        elif hijo.tag == f'{TEXTO}tab':
+            partes.append('\t')
+        elif hijo.tag == f'{TEXTO}line-break':
+            partes.append('\n')
+        else:
+            partes.append(_texto_ods(hijo))
+        partes.append(hijo.tail or '')
+    return ''.join(partes)
+
+def valor_ods(celda):
+    """Valor de una <table:table-cell> como lo daría openpyxl con data_only=True"""
+    tipo = celda.get(ODS_TIPO)
+    if tipo is None:
+        return None
+    if tipo in ('float', 'percentage', 'currency'):
+        numero = float(celda.get(ODS_VALOR))
+        return int(numero) if numero.is_integer() else numero
+    if tipo == 'date':
+        texto = celda.get(ODS_FECHA)
+        try:
+            return datetime.fromisoformat(texto)
+        except ValueError:
+            return texto
+    if tipo == 'boolean':
+        return celda.get(ODS_BOOLEANO) == 'true'
+    texto = celda.get(ODS_TEXTO)
+    if texto is None:
+        # Solo los párrafos de la celda: los de sus comentarios (office:annotation) no cuentan
+        texto = '\n'.join(_texto_ods(parrafo) for parrafo in celda.findall(ODS_PARRAFO))
+    return texto or None
+
+def _valores_fila(fila, max_col):
+    """Valores de una <table:table-row>, sin las celdas vacías del final"""
+    valores = []
+    vacias = 0
+    for celda in fila:
+        if celda.tag not in ODS_CELDAS:
+            continue
+        repeticiones = int(celda.get(ODS_REPETIR_CELDA, 1))
+        valor = valor_ods(celda)
+        if valor is None:
+            # Las vacías solo se añaden si detrás hay algo: las del final de la fila se repiten miles de veces
+            vacias += repeticiones
+            continue
+        valores.extend([None] * vacias)
+        valores.extend([valor] * repeticiones)
+        vacias = 0
+        if max_col is not None and len(valores) >= max_col:
+            return tuple(valores[:max_col])
+    return tuple(valores)
+
+def _eventos_ods(libro, max_col=None):
+    """
+    Recorre content.xml en streaming y produce ('hoja', nombre) al empezar cada hoja y
+    ('fila', valores) por cada fila; las filas vacías del final de cada hoja no se producen
+    """
+    with zipfile.ZipFile(abrir_libro(libro)) as archivo_zip, archivo_zip.open('content.xml') as contenido:
+        vacias = 0
+        for evento, elemento in ET.iterparse(contenido, events=('start', 'end')):
+            if elemento.tag == ODS_HOJA:
+                if evento == 'start':
+                    vacias = 0
+                    yield 'hoja', elemento.get(f'{TABLA}name')
+                else:
+                    elemento.clear()
+            elif evento == 'end' and elemento.tag == ODS_FILA:
+                repeticiones = int(elemento.get(ODS_REPETIR_FILA, 1))
+                valores = _valores_fila(elemento, max_col)
+                elemento.clear()
+                if not valores:
+                    vacias += repeticiones
+                    continue
+                for _ in range(vacias):
+                    yield 'fila', ()
+                vacias = 0
+                for _ in range(repeticiones):
+                    yield 'fila', valores
+
+def hoja_activa_ods(libro):
+    """Nombre de la hoja activa según settings.xml, o None si no lo indica"""
+    try:
+        with zipfile.ZipFile(abrir_libro(libro)) as archivo_zip:
+            if 'settings.xml' not in archivo_zip.namelist():
+                return None
+            configuracion = ET.fromstring(archivo_zip.read('settings.xml'))
+    except (zipfile.BadZipFile, ET.ParseError):
+        return None
+    for elemento in configuracion.iter(f'{CONFIG}config-item'):
+        if elemento.get(f'{CONFIG}name') == 'ActiveTable':
+            return elemento.text
+    return None
+
+def _filas_de_hoja_ods(libro, nombre_hoja, min_row, max_col):
+    """Filas de una hoja del ODS (la primera si nombre_hoja es None); deja de leer al terminarla"""
+    dentro = False
+    fila = 0
+    for tipo, dato in _eventos_ods(libro, max_col):
+        if tipo == 'hoja':
+            if dentro:
+                return
+            dentro = nombre_hoja is None or dato == nombre_hoja
+        elif dentro:
+            fila += 1
+            if fila >= min_row:
+                yield dato
+
+def libro_ods(libro, read_only=True):
+    """
+    El ODS como libro. En solo lectura, la hoja activa se recorre en streaming cada vez
+    que se pide; si no, todas las hojas se leen en una sola pasada y quedan en memoria
+    """
+    if read_only:
+        activa = hoja_activa_ods(libro)
+        abrir_filas = lambda min_row, max_col: _filas_de_hoja_ods(libro, activa, min_row, max_col)
+        return LibroTabla([HojaTabla(activa or '', abrir_filas)])
+
+    filas_por_hoja = {}
+    for tipo, dato in _eventos_ods(libro):
+        if tipo == 'hoja':
+            filas = filas_por_hoja.setdefault(dato, [])
+        else:
+            filas.append(dato)
+
+    def hoja(nombre, filas):
+        abrir_filas = lambda min_row, max_col: (valores[:max_col] for valores in filas[min_row - 1:])
+        return HojaTabla(nombre, abrir_filas)
+
+    hojas = [hoja(nombre, filas) for nombre, filas in filas_por_hoja.items()]
+    activa = hoja_activa_ods(libro)
+    return LibroTabla(hojas, next((h for h in hojas if h.title == activa), None))
+
+def cargar_libro(libro, read_only=True):
+    """
+    Abre el libro según su formato: CSV y ODS con los lectores de este módulo y el
+    resto con openpyxl (data_only=True), en streaming si read_only
+    """
+    formato = formato_tabla(libro)
+    if formato == 'csv':
+        return libro_csv(libro)
+    if formato == 'ods':
+        return libro_ods(libro, read_only)
+
+    import openpyxl
+    return openpyxl.load_workbook(abrir_libro(libro), read_only=read_only, data_only=True)
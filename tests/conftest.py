@@ -0,0 +1,20 @@
+"""
+Configuración común de las pruebas: los módulos del proyecto se importan desde
+la raíz del repositorio y las cachés, esquemas e historial van a un directorio
+temporal en lugar de .cache_alertas
+"""
+
+import os
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+_DIRECTORIO_CACHE = tempfile.mkdtemp(prefix='pruebas_alertas_')
+for variable, archivo in [('RUTA_ESQUEMAS', 'esquemas_columnas.json'), ('RUTA_AGENDA', 'agenda_revisiones.json'),
+                          ('RUTA_INDICE_ALERTAS', 'indice.json'), ('RUTA_INDICE_HOJAS', 'indice_hojas.json'),
+                          ('RUTA_BANDEJA_SALIDA', 'bandeja_salida.db'), ('RUTA_CUOTAS_ENVIO', 'cuotas_envio.json'),
+                          ('RESULTADOS_FRAGMENTOS', 'fragmentos')]:
+    os.environ.setdefault(variable, os.path.join(_DIRECTORIO_CACHE, archivo))
+os.environ.setdefault('RUTA_HISTORIAL', '')
@@ -0,0 +1,66 @@
+from datetime import date, timedelta
+import os
+
+from agenda_revisiones import AgendaRevisiones, firma_entrada, ruta_agenda
+
+HOY = date(2026, 3, 10)
+
+def _hojas(*dias):
+    return [{'filas': [{'fecha': HOY + timedelta(days=dia)} for dia in dias]}]
+
+def _agenda_programada(ruta, entradas, rutas):
+    agenda = AgendaRevisiones(ruta, dias_alerta=1)
+    agenda.pendientes(entradas, lambda entrada: entrada['ruta'], fecha_hoy=HOY - timedelta(days=1))
+    for entrada in entradas:
+        agenda.programar(entrada, rutas[entrada['id']], _hojas(0), fecha_hoy=HOY - timedelta(days=1))
+    agenda.guardar()
+    return AgendaRevisiones(ruta, dias_alerta=1)
+
+def test_fragmento_conserva_los_libros_de_otros_fragmentos(tmp_path):
+    rutas = {}
+    for id_libro in ('a', 'b'):
+        rutas[id_libro] = str(tmp_path / f'{id_libro}.xlsx')
+        with open(rutas[id_libro], 'wb') as archivo:
+            archivo.write(id_libro.encode())
+    entradas = [{'id': 'a', 'ruta': rutas['a']}, {'id': 'b', 'ruta': rutas['b']}]
+    agenda = _agenda_programada(str(tmp_path / 'agenda.json'), entradas, rutas)
+
+    # El fragmento solo ve 'a': 'b' vence hoy pero no se saca ni se olvida
+    pendientes = agenda.pendientes(entradas[:1], lambda entrada: entrada['ruta'], fecha_hoy=HOY, ids_manifiesto=['a', 'b'])
+    assert [entrada['id'] for entrada in pendientes] == ['a']
+    assert 'b' in agenda.libros
+    assert [HOY.isoformat(), 'b'] in agenda.cola
+
+    # La ejecución de 'b' lo sigue encontrando vencido
+    pendientes = agenda.pendientes(entradas[1:], lambda entrada: entrada['ruta'], fecha_hoy=HOY, ids_manifiesto=['a', 'b'])
+    assert [entrada['id'] for entrada in pendientes] == ['b']
+
+def test_sin_manifiesto_completo_se_olvidan_los_que_faltan(tmp_path):
+    ruta = str(tmp_path / 'a.xlsx')
+    with open(ruta, 'wb') as archivo:
+        archivo.write(b'a')
+    entradas = [{'id': 'a', 'ruta': ruta}, {'id': 'b', 'ruta': ruta}]
+    agenda = _agenda_programada(str(tmp_path / 'agenda.json'), entradas, {'a': ruta, 'b': ruta})
+    agenda.pendientes(entradas[:1], lambda entrada: entrada['ruta'], fecha_hoy=HOY)
+    assert set(agenda.libros) == {'a'}
+
+def test_firma_local_no_depende_de_la_fecha_del_archivo(tmp_path):
+    ruta = str(tmp_path / 'libro.xlsx')
+    with open(ruta, 'wb') as archivo:
+        archivo.write(b'contenido')
+    entrada = {'id': 'libro', 'ruta': ruta}
+    firma = firma_entrada(entrada, ruta)
+
+    # Un checkout nuevo reescribe el archivo con otra fecha pero el mismo contenido
+    os.utime(ruta, ns=(1, 1))
+    assert firma_entrada(entrada, ruta) == firma
+
+    with open(ruta, 'wb') as archivo:
+        archivo.write(b'contenidO')
+    assert firma_entrada(entrada, ruta) != firma
+    assert firma_entrada(entrada, str(tmp_path / 'no_existe.xlsx')) == 'ausente'
+
+def test_ruta_agenda_por_fragmento():
+    assert ruta_agenda() != ruta_agenda((1, 2))
+    assert ruta_agenda((1, 2)) != ruta_agenda((2, 2))
+    assert ruta_agenda((2, 4)).endswith('_fragmento_2_de_4.json')
@@ -0,0 +1,102 @@
+import sqlite3
+import time
+
+import pytest
+
+import bandeja_salida
+from bandeja_salida import BandejaSalida, TrabajadoresBandeja
+
+@pytest.fixture
+def bandeja(tmp_path):
+    return BandejaSalida(str(tmp_path / 'bandeja.db'))
+
+def fila(bandeja, identificador):
+    with sqlite3.connect(bandeja.ruta_db) as conexion:
+        return conexion.execute("SELECT estado, intentos, proximo_intento, ultimo_error FROM mensajes WHERE id = ?",
+                                (identificador,)).fetchone()
+
+def test_reintentos_con_espera_exponencial_y_tope(bandeja):
+    identificador = bandeja.encolar('email', 'a@b.c', {'asunto': 'x'})
+    esperas = []
+    for intentos in range(bandeja_salida.MAX_INTENTOS - 1):
+        antes = time.time()
+        estado, espera = bandeja.marcar_fallido(identificador, intentos, 'fallo')
+        assert estado == 'pendiente'
+        nominal = min(bandeja_salida.ESPERA_MAXIMA, bandeja_salida.ESPERA_BASE * 2 ** intentos)
+        assert 0.8 * nominal <= espera <= 1.2 * nominal
+        assert fila(bandeja, identificador)[2] >= antes + espera
+        esperas.append(nominal)
+    assert esperas == [30, 60, 120, 240, 480]
+    # Mientras no venza la espera no se vuelve a reclamar
+    assert bandeja.reclamar() is None
+
+def test_pasa_a_muerto_con_el_error_real(bandeja):
+    identificador = bandeja.encolar('email', 'a@b.c', {'asunto': 'x'})
+    enviador = {'email': lambda destinatario, carga, adjunto: (_ for _ in ()).throw(
+        ConnectionRefusedError("smtp.gmail.com:587 rechazó la conexión"))}
+    trabajadores = TrabajadoresBandeja(bandeja, enviador, hilos=1)
+
+    mensaje = bandeja.reclamar()
+    mensaje['intentos'] = bandeja_salida.MAX_INTENTOS - 1
+    trabajadores._enviar(mensaje)
+
+    estado, intentos, _, error = fila(bandeja, identificador)
+    assert (estado, intentos) == ('muerto', bandeja_salida.MAX_INTENTOS)
+    assert 'rechazó la conexión' in error
+    assert bandeja.resumen() == {'muerto': 1}
+
+def test_envio_correcto_y_mensajes_interrumpidos(bandeja, tmp_path):
+    primero = bandeja.encolar('whatsapp', '600', {'mensaje': 'hola'}, ('libro.xlsx', b'datos'))
+    segundo = bandeja.encolar('whatsapp', '601', {'mensaje': 'hola'})
+    enviados = []
+    trabajadores = TrabajadoresBandeja(bandeja, {'whatsapp': lambda *mensaje: enviados.append(mensaje) or True})
+    mensaje = bandeja.reclamar()
+    assert mensaje['adjunto'] == ('libro.xlsx', b'datos')
+    trabajadores._enviar(mensaje)
+    assert fila(bandeja, primero)[:2] == ('enviado', 1)
+
+    # Un mensaje 'enviando' reciente puede ser de otra ejecución en marcha: al reabrir no se toca
+    assert bandeja.reclamar()['id'] == segundo
+    assert BandejaSalida(bandeja.ruta_db).resumen() == {'enviado': 1, 'enviando': 1}
+
+    # Pasado el plazo se da por interrumpido y vuelve a pendiente
+    with sqlite3.connect(bandeja.ruta_db) as conexion:
+        conexion.execute("UPDATE mensajes SET actualizado = '2026-01-01T00:00:00' WHERE id = ?", (segundo,))
+    assert BandejaSalida(bandeja.ruta_db).resumen() == {'enviado': 1, 'pendiente': 1}
+
+def test_cerrar_no_empieza_envios_pasado_el_plazo(bandeja, monkeypatch):
+    mensajes = []
+    monkeypatch.setattr(bandeja_salida, 'log', mensajes.append)
+    for telefono in ('600', '601', '602'):
+        bandeja.encolar('whatsapp', telefono, {'mensaje': 'hola'})
+    enviados = []
+
+    def enviar_lento(telefono, carga, adjunto):
+        time.sleep(0.5)
+        enviados.append(telefono)
+        return True
+
+    trabajadores = TrabajadoresBandeja(bandeja, {'whatsapp': enviar_lento}, hilos=1)
+    trabajadores.iniciar()
+    time.sleep(0.1)
+    resumen = trabajadores.cerrar(0.2)
+
+    # El envío en curso queda 'enviando' y los demás pendientes, y se avisa de ello
+    assert resumen == {'enviando': 1, 'pendiente': 2}
+    assert any('3 mensajes quedan sin enviar' in mensaje for mensaje in mensajes)
+    time.sleep(1)
+    assert enviados == ['600']
+    assert bandeja.resumen() == {'enviado': 1, 'pendiente': 2}
+
+def test_cada_operacion_cierra_su_conexion(bandeja, monkeypatch):
+    abiertas = []
+    conectar = bandeja._conectar
+    monkeypatch.setattr(bandeja, '_conectar', lambda: abiertas.append(conectar()) or abiertas[-1])
+    identificador = bandeja.encolar('email', 'a@b.c', {'asunto': 'x'})
+    bandeja.marcar_enviado(bandeja.reclamar()['id'])
+    bandeja.pendientes_vencidos(time.time())
+    bandeja.resumen()
+    assert identificador and len(abiertas) == 5
+    for conexion in abiertas:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conexion.execute("SELECT 1")
@@ -0,0 +1,126 @@
+"""Descargas contra un servidor HTTP local configurado con URL_DESCARGA_DRIVE"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import base64
+import hashlib
+import importlib
+import os
+import re
+import threading
+
+import pytest
+
+CONTENIDO = bytes(range(256)) * 4000   # 1 MB: el corte llega tras varios bloques de TAMANO_BLOQUE
+
+class Manejador(BaseHTTPRequestHandler):
+    """
+    Sirve /<modo>: 'normal', 'corte' (la primera petición se corta a medias),
+    'sin-rango' (ignora Range), 'md5-malo' (X-Goog-Hash que no cuadra) y 'html'
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        modo = self.path.strip('/')
+        self.server.peticiones.append((modo, self.headers.get('Range')))
+        rango = re.match(r'bytes=(\d+)-', self.headers.get('Range') or '')
+        inicio = int(rango.group(1)) if rango and modo != 'sin-rango' else 0
+
+        if inicio >= len(CONTENIDO):
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{len(CONTENIDO)}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        cuerpo = CONTENIDO[inicio:]
+        if modo == 'html':
+            cuerpo = b'<html>Necesitas permiso</html>'
+        self.send_response(206 if inicio else 200)
+        self.send_header('Content-Type', 'text/html' if modo == 'html' else 'application/octet-stream')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        if inicio:
+            self.send_header('Content-Range', f'bytes {inicio}-{len(CONTENIDO) - 1}/{len(CONTENIDO)}')
+        md5 = hashlib.md5(b'otro' if modo == 'md5-malo' else CONTENIDO).digest()
+        self.send_header('X-Goog-Hash', f'crc32c=AAAAAA==,md5={base64.b64encode(md5).decode()}')
+        self.end_headers()
+
+        if modo == 'corte' and len(self.server.peticiones) == 1:
+            # Manda un tercio y cierra la conexión: el cliente ve una lectura incompleta
+            self.wfile.write(cuerpo[:len(cuerpo) // 3])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *argumentos):
+        pass
+
+@pytest.fixture
+def servidor():
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), Manejador)
+    servidor.peticiones = []
+    hilo = threading.Thread(target=servidor.serve_forever, args=(0.05,), daemon=True)
+    hilo.start()
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+@pytest.fixture
+def drive(servidor, monkeypatch):
+    """El módulo recargado con URL_DESCARGA_DRIVE apuntando al servidor local"""
+    import descargas_drive
+    monkeypatch.setenv('URL_DESCARGA_DRIVE', f'http://127.0.0.1:{servidor.server_address[1]}/{{file_id}}')
+    modulo = importlib.reload(descargas_drive)
+    monkeypatch.setattr(modulo.time, 'sleep', lambda segundos: None)
+    yield modulo
+    monkeypatch.delenv('URL_DESCARGA_DRIVE')
+    importlib.reload(descargas_drive)
+
+def sha256(datos):
+    return hashlib.sha256(datos).hexdigest()
+
+def descargar(drive, file_id, ruta, **trabajo):
+    return list(drive.descargar_varios([dict(trabajo, file_id=file_id, ruta=str(ruta))]))[0][1]
+
+def test_reanuda_con_range_tras_un_corte(drive, servidor, tmp_path):
+    destino = tmp_path / 'libros' / 'corte.xlsx'
+    assert descargar(drive, 'corte', destino, sha256=sha256(CONTENIDO)) == str(destino)
+    assert destino.read_bytes() == CONTENIDO
+    assert not os.path.exists(f"{destino}.part")
+
+    # La segunda petición continúa desde los bloques que ya estaban en el .part
+    (_, primera), (_, segunda) = servidor.peticiones
+    assert primera is None
+    reanudado = int(re.match(r'bytes=(\d+)-$', segunda).group(1))
+    assert 0 < reanudado <= len(CONTENIDO) // 3
+
+def test_part_completo_y_416(drive, servidor, tmp_path):
+    destino = tmp_path / 'completo.xlsx'
+    (tmp_path / 'completo.xlsx.part').write_bytes(CONTENIDO)
+    assert descargar(drive, 'normal', destino, sha256=sha256(CONTENIDO)) == str(destino)
+    assert servidor.peticiones == [('normal', f'bytes={len(CONTENIDO)}-')]
+    assert destino.read_bytes() == CONTENIDO
+    assert not (tmp_path / 'completo.xlsx.part').exists()
+
+def test_servidor_sin_range_empieza_de_cero(drive, tmp_path):
+    destino = tmp_path / 'sin_rango.xlsx'
+    (tmp_path / 'sin_rango.xlsx.part').write_bytes(CONTENIDO[:1000])
+    assert descargar(drive, 'sin-rango', destino) == str(destino)
+    assert destino.read_bytes() == CONTENIDO
+
+@pytest.mark.parametrize('modo, trabajo', [
+    ('normal', {'sha256': sha256(b'otro contenido')}),
+    ('md5-malo', {}),
+])
+def test_checksum_distinto_no_deja_destino_ni_part(drive, tmp_path, modo, trabajo):
+    destino = tmp_path / 'malo.xlsx'
+    assert descargar(drive, modo, destino, **trabajo) is None
+    assert not destino.exists()
+    assert not (tmp_path / 'malo.xlsx.part').exists()
+
+def test_pagina_html_no_se_guarda(drive, tmp_path):
+    destino = tmp_path / 'privado.xlsx'
+    with pytest.raises(drive.ErrorDescarga):
+        drive.descargar_archivo(drive.url_descarga('html'), str(destino), reintentos=1)
+    assert not destino.exists()
+    assert not (tmp_path / 'privado.xlsx.part').exists()
@@ -0,0 +1,71 @@
+from datetime import date, datetime, timedelta
+import json
+
+import pytest
+
+import alerta_medicamentos
+import manifiesto
+
+def libro(ruta, *pacientes):
+    """Libro con la plantilla de alerta_medicamentos.py: una hoja por (paciente, teléfono, días hasta la fecha)"""
+    import openpyxl
+
+    hoy = datetime.combine(date.today(), datetime.min.time())
+    workbook = openpyxl.Workbook()
+    workbook.remove(workbook.active)
+    for nombre, telefono, dias in pacientes:
+        sheet = workbook.create_sheet(nombre)
+        sheet['B5'], sheet['B9'], sheet['I9'] = nombre, f"RESPONSABLE DE {nombre}", telefono
+        sheet['A18'], sheet['B18'], sheet['J18'] = f"MED {nombre}", 'USO', hoy + timedelta(days=dias)
+    workbook.save(ruta)
+    return str(ruta)
+
+@pytest.fixture
+def envios(tmp_path, monkeypatch):
+    monkeypatch.setattr(manifiesto, 'DIRECTORIO_CACHE', str(tmp_path / 'cache'))
+    monkeypatch.setattr(alerta_medicamentos, 'log', lambda mensaje: None)
+    monkeypatch.setattr(alerta_medicamentos, 'EMAIL_DESTINO', 'central@ejemplo.org')
+    enviados = {'email': [], 'whatsapp': []}
+    monkeypatch.setattr(alerta_medicamentos, 'enviar_email',
+                        lambda destinatario, asunto, cuerpo_html, adjunto=None:
+                        enviados['email'].append((destinatario, asunto, cuerpo_html)) or True)
+    monkeypatch.setattr(alerta_medicamentos, 'enviar_whatsapp',
+                        lambda telefono, mensaje, info_paciente=None: enviados['whatsapp'].append((telefono, mensaje)))
+    return enviados
+
+def test_un_email_por_destinatario_con_todos_sus_pacientes(tmp_path, envios):
+    entradas = [
+        {'id': 'residencia', 'email': 'a@ejemplo.org',
+         'ruta': libro(tmp_path / 'residencia.xlsx', ('ANA', '600', 1), ('PEDRO', '602', 30))},
+        {'id': 'luis', 'email': 'a@ejemplo.org', 'ruta': libro(tmp_path / 'luis.xlsx', ('LUIS', '600', 0))},
+        {'id': 'marta', 'email': 'b@ejemplo.org', 'ruta': libro(tmp_path / 'marta.xlsx', ('MARTA', '601', 2))},
+        {'id': 'sin_email', 'ruta': libro(tmp_path / 'sin_email.xlsx', ('JUAN', '603', 1))},
+    ]
+    ruta_manifiesto = tmp_path / 'manifiesto.json'
+    ruta_manifiesto.write_text(json.dumps(entradas), encoding='utf-8')
+
+    alerta_medicamentos.procesar_digest(str(ruta_manifiesto))
+
+    emails = {destinatario: (asunto, html) for destinatario, asunto, html in envios['email']}
+    assert len(envios['email']) == 3
+    assert sorted(emails) == ['a@ejemplo.org', 'b@ejemplo.org', 'central@ejemplo.org']
+
+    asunto, html = emails['a@ejemplo.org']
+    assert '2 Medicamentos - 2 pacientes, 2 responsables' in asunto
+    assert 'MED ANA' in html and 'MED LUIS' in html
+    # Sin alertas no aparece, y cada paciente solo en el email de su destinatario
+    assert 'PEDRO' not in html and 'MARTA' not in html and 'JUAN' not in html
+    assert 'MED MARTA' in emails['b@ejemplo.org'][1] and 'MED JUAN' in emails['central@ejemplo.org'][1]
+
+    # Los WhatsApp se agrupan por teléfono aunque los pacientes vayan en libros distintos
+    telefonos = sorted(telefono for telefono, _ in envios['whatsapp'])
+    assert telefonos == ['600', '601', '603']
+    mensaje_600 = next(mensaje for telefono, mensaje in envios['whatsapp'] if telefono == '600')
+    assert 'ANA' in mensaje_600 and 'LUIS' in mensaje_600
+
+def test_digest_sin_alertas_no_envia_nada(tmp_path, envios):
+    ruta_manifiesto = tmp_path / 'manifiesto.json'
+    ruta_manifiesto.write_text(json.dumps([{'id': 'ana', 'ruta': libro(tmp_path / 'ana.xlsx', ('ANA', '600', 30))}]),
+                               encoding='utf-8')
+    alerta_medicamentos.procesar_digest(str(ruta_manifiesto))
+    assert envios == {'email': [], 'whatsapp': []}
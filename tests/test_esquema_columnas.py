@@ -0,0 +1,16 @@
+from datetime import datetime
+
+from esquema_columnas import Esquema, detectar_esquema
+
+def test_detecta_la_fila_de_titulos():
+    filas = [('Paciente', 'ANA'), (), ('Nombre del fármaco', 'Indicación', 'Fecha inicio', 'Próxima reposición')]
+    esquema, fila, _ = detectar_esquema(filas)
+    assert (esquema, fila) == (Esquema(4, 1, 2, (4,)), 3)
+
+def test_una_fila_de_datos_no_es_una_cabecera():
+    # 'sin receta' parece un título de fecha y 'MEDICAMENTO 48' uno de medicamento
+    con_fecha = ('MEDICAMENTO 48', 'DOLOR', None, datetime(2026, 3, 1), 'sin receta')
+    solo_texto = ('MEDICAMENTO 48', 'DOLOR', 'sin receta')
+    assert detectar_esquema([con_fecha]) is None
+    assert detectar_esquema([solo_texto]) is None
+    assert detectar_esquema([('Medicamento', 'Uso', 'Receta'), con_fecha])[1] == 1
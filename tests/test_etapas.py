@@ -0,0 +1,60 @@
+from datetime import date, timedelta
+
+import pytest
+
+from etapas import GrafoEtapas
+from registros import FilaMedicamento
+
+def test_etapas_perezosas_y_calculadas_una_sola_vez():
+    llamadas = []
+
+    def etapa(nombre, resultado):
+        def funcion(*argumentos):
+            llamadas.append(nombre)
+            return resultado(*argumentos)
+        return funcion
+
+    grafo = GrafoEtapas()
+    grafo.valor('filas', [1, 2, 3])
+    grafo.etapa('alertas', etapa('alertas', lambda filas: [fila for fila in filas if fila > 1]), 'filas')
+    grafo.etapa('total', etapa('total', len), 'alertas')
+    grafo.etapa('imagen', etapa('imagen', lambda: 'foto'))
+    grafo.etapa('html', etapa('html', lambda alertas, imagen: f"{imagen}:{alertas}"), 'alertas', 'imagen')
+
+    # Registrar no calcula nada
+    assert llamadas == [] and not grafo.calculada('alertas')
+
+    # Pedir una etapa calcula solo sus dependencias, y cada una una vez aunque la pidan varias
+    assert grafo['total'] == 2
+    assert llamadas == ['alertas', 'total']
+    assert grafo['html'] == "foto:[2, 3]"
+    assert grafo['total'] == 2 and grafo['html'] == "foto:[2, 3]"
+    assert llamadas == ['alertas', 'total', 'imagen', 'html']
+
+    with pytest.raises(KeyError):
+        grafo['no_existe']
+
+def test_volver_a_registrar_una_etapa_descarta_su_resultado():
+    grafo = GrafoEtapas()
+    grafo.etapa('valor', lambda: 1)
+    assert grafo['valor'] == 1
+    grafo.etapa('valor', lambda: 2)
+    assert not grafo.calculada('valor') and grafo['valor'] == 2
+
+def test_sin_alertas_no_se_lee_la_foto_ni_se_renderiza(monkeypatch):
+    import alerta_medicamentos
+
+    leidas = []
+    hoy = date.today()
+    filas = [FilaMedicamento(18, hoy + timedelta(days=30), 'ENALAPRIL', 'TENSION')]
+    grafo = alerta_medicamentos.crear_grafo_etapas('libro.xlsx', filas, {'paciente': 'ANA', 'telefono': None},
+                                                   obtener_imagen=lambda: leidas.append(1) or 'foto')
+    assert grafo['alertas'] == []
+    assert leidas == [] and not grafo.calculada('html') and not grafo.calculada('mensaje_whatsapp')
+
+    # Con alertas, la foto se lee una vez para el HTML aunque se pidan más etapas
+    grafo = alerta_medicamentos.crear_grafo_etapas(
+        'libro.xlsx', [FilaMedicamento(18, hoy + timedelta(days=1), 'ENALAPRIL', 'TENSION')],
+        {'paciente': 'ANA', 'responsable': 'LUIS', 'telefono': '600'}, obtener_imagen=lambda: leidas.append(1) or None)
+    assert 'ENALAPRIL' in grafo['html'] and grafo['info_con_imagen']['imagen'] is None
+    assert grafo['mensaje_whatsapp'] and leidas == [1]
@@ -0,0 +1,38 @@
+from datetime import date
+import sqlite3
+
+import exportacion
+
+HOY = date(2026, 3, 1)
+
+def hojas(medicamento):
+    fila = {'fila': 18, 'fecha': date(2026, 3, 3), 'medicamento': medicamento, 'uso': 'TENSION'}
+    return [{'hoja': 'Hoja1', 'filas': [fila], 'info_paciente': {'paciente': 'ANA'}}]
+
+def libros(ruta):
+    with sqlite3.connect(ruta) as conexion:
+        return sorted(conexion.execute("SELECT hash_libro, origen FROM libros").fetchall())
+
+def medicamentos(ruta):
+    with sqlite3.connect(ruta) as conexion:
+        return sorted(conexion.execute("SELECT hash_libro, medicamento FROM medicamentos").fetchall())
+
+def test_dos_origenes_con_el_mismo_libro_no_se_pisan(tmp_path):
+    ruta = str(tmp_path / 'export.db')
+    exportacion.exportar_sqlite(ruta, 'h1', hojas('A'), '/pacientes/ana.xlsx', HOY)
+    exportacion.exportar_sqlite(ruta, 'h1', hojas('A'), '/pacientes/luis.xlsx', HOY)
+    assert libros(ruta) == [('h1', '/pacientes/ana.xlsx'), ('h1', '/pacientes/luis.xlsx')]
+
+    # Uno de los dos cambia: las filas del contenido compartido siguen para el otro
+    exportacion.exportar_sqlite(ruta, 'h2', hojas('B'), '/pacientes/luis.xlsx', HOY)
+    assert libros(ruta) == [('h1', '/pacientes/ana.xlsx'), ('h2', '/pacientes/luis.xlsx')]
+    assert medicamentos(ruta) == [('h1', 'A'), ('h2', 'B')]
+
+    # Al cambiar también el primero, el contenido que ya nadie usa desaparece
+    exportacion.exportar_sqlite(ruta, 'h3', hojas('C'), '/pacientes/ana.xlsx', HOY)
+    assert medicamentos(ruta) == [('h2', 'B'), ('h3', 'C')]
+
+def test_mismo_libro_el_mismo_dia_no_reescribe(tmp_path):
+    ruta = str(tmp_path / 'export.db')
+    assert exportacion.exportar_sqlite(ruta, 'h1', hojas('A'), 'ana.xlsx', HOY) == 1
+    assert exportacion.exportar_sqlite(ruta, 'h1', hojas('A'), 'ana.xlsx', HOY) == 0
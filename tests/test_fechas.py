@@ -0,0 +1,53 @@
+from datetime import date, datetime
+
+import pytest
+
+from fechas import SERIAL_MAXIMO, SERIAL_MINIMO, fecha_de_texto, normalizar_fecha
+
+FECHA = date(2026, 3, 12)
+
+def test_datetime_como_antes():
+    # Lo único que se aceptaba antes: la celda con formato de fecha, sin la hora
+    assert normalizar_fecha(datetime(2026, 3, 12, 17, 45)) == FECHA
+    assert normalizar_fecha(FECHA) == FECHA
+
+@pytest.mark.parametrize('serial', [46093, 46093.0, 46093.75])
+def test_numero_de_serie(serial):
+    assert normalizar_fecha(serial) == FECHA
+
+@pytest.mark.parametrize('texto', [
+    '12/03/2026', '12/3/2026', '12-03-26', '12.03.2026', ' 12/03/2026 ', '12/03/2026 00:00',
+    '2026-03-12', '2026/3/12', '2026-03-12T00:00:00',
+    '12 de marzo de 2026', '12 de Marzo de 2026', '12-mar-26', '12 MAR 2026', '12/marzo/2026', '12-mar.-2026',
+])
+def test_fecha_escrita_como_texto(texto):
+    assert normalizar_fecha(texto) == FECHA
+
+def test_nombres_de_mes_y_anios_de_dos_cifras():
+    assert normalizar_fecha('1 de septiembre de 2026') == date(2026, 9, 1)
+    assert normalizar_fecha('1 de setiembre de 2026') == date(2026, 9, 1)
+    assert normalizar_fecha('5 de diciembre de 2026') == normalizar_fecha('5-dic-26') == date(2026, 12, 5)
+    assert normalizar_fecha('7 de febrero de 2026') == normalizar_fecha('7 feb 2026')
+    # Pivote de Excel: 00-29 son 2000-2029 y 30-99 son 1930-1999
+    assert normalizar_fecha('01/01/29') == date(2029, 1, 1)
+    assert normalizar_fecha('01/01/30') == date(1930, 1, 1)
+
+@pytest.mark.parametrize('valor', [
+    None, '', '   ', 'pendiente', 'sin fecha', '31/02/2026', '12/13/2026', '32 de marzo de 2026',
+    '12 de foo de 2026', '2026-13-01', '12/03', '12/03/202', True, False, [FECHA],
+])
+def test_valores_no_validos(valor):
+    assert normalizar_fecha(valor) is None
+
+def test_numeros_fuera_de_rango_son_cantidades():
+    assert normalizar_fecha(SERIAL_MINIMO) is not None
+    assert normalizar_fecha(SERIAL_MAXIMO) is not None
+    for numero in (0, 1, 30, 500, SERIAL_MINIMO - 1, SERIAL_MAXIMO + 1, -46093):
+        assert normalizar_fecha(numero) is None
+
+def test_cada_texto_se_interpreta_una_vez():
+    fecha_de_texto.cache_clear()
+    for _ in range(100):
+        normalizar_fecha('12 de marzo de 2026')
+    informacion = fecha_de_texto.cache_info()
+    assert (informacion.misses, informacion.hits) == (1, 99)
@@ -0,0 +1,51 @@
+import importlib
+
+import pytest
+
+import flujo_alertas
+
+def libro_csv(ruta, fila_cabecera, columna_fecha, fecha):
+    """CSV con la plantilla del script: cabecera en fila_cabecera y la fecha en columna_fecha (1 = A)"""
+    filas = [['Paciente', 'Juan']] + [[] for _ in range(fila_cabecera - 2)]
+    cabecera = ['MEDICAMENTO', 'USO'] + [''] * (columna_fecha - 3) + ['FECHA']
+    datos = ['Paracetamol', 'Dolor'] + [''] * (columna_fecha - 3) + [fecha]
+    ruta.write_text('\n'.join(';'.join(fila) for fila in filas + [cabecera, datos]), encoding='utf-8')
+    return str(ruta)
+
+@pytest.mark.parametrize('modulo, fila_cabecera, columna_fecha', [
+    ('alerta_medicamentos', 17, 10),
+    ('revisar_fechas', 13, 9),
+])
+def test_cada_script_usa_su_plantilla_e_indice(tmp_path, monkeypatch, modulo, fila_cabecera, columna_fecha):
+    script = importlib.import_module(modulo)
+    assert isinstance(script.flujo, flujo_alertas.FlujoAlertas) and script.flujo.script is script
+    monkeypatch.setattr(script, 'RUTA_INDICE', str(tmp_path / 'indice.json'))
+    ruta = libro_csv(tmp_path / 'libro.csv', fila_cabecera, columna_fecha, '2026-03-12')
+
+    filas, info_paciente, hash_excel = script.flujo.obtener_filas(ruta)
+    assert [(fila['fila'], fila['medicamento'], str(fila['fecha'])) for fila in filas] == \
+        [(fila_cabecera + 1, 'Paracetamol', '2026-03-12')]
+
+    # La segunda vez sale del índice del script, sin volver a leer el libro
+    def sin_leer(ruta_excel):
+        raise AssertionError("el libro no ha cambiado: debía usarse el índice")
+    monkeypatch.setattr(script, 'leer_excel_y_escanear_filas', sin_leer)
+    assert script.flujo.obtener_filas(ruta) == (filas, info_paciente, hash_excel)
+
+def test_la_bandeja_envia_con_el_enviador_del_script(tmp_path, monkeypatch):
+    import revisar_fechas
+    flujo = flujo_alertas.FlujoAlertas(revisar_fechas)
+    monkeypatch.setattr(flujo_alertas, 'RUTA_BANDEJA', str(tmp_path / 'bandeja.db'))
+    monkeypatch.setattr(revisar_fechas, 'GMAIL_CUENTAS', '')
+    enviados = []
+    def enviar_email(destinatario, asunto, cuerpo_html, adjunto, lanzar=False):
+        enviados.append((destinatario, asunto, adjunto, lanzar))
+        return True
+    monkeypatch.setattr(revisar_fechas, 'enviar_email', enviar_email)
+
+    adjunto = tmp_path / 'libro.xlsx'
+    adjunto.write_bytes(b'datos')
+    with flujo.envios(con_bandeja=True):
+        flujo.despachar_email('a@ejemplo.org', 'Asunto', '<p>hola</p>', str(adjunto))
+    assert enviados == [('a@ejemplo.org', 'Asunto', ('libro.xlsx', b'datos'), True)]
+    assert flujo.planificador is None
@@ -0,0 +1,69 @@
+from datetime import date, datetime
+
+import pytest
+
+from formulas_fecha import EvaluadorFechas, completar_hojas
+from registros import FilaMedicamento
+
+def fecha(celdas, fila=18, columna=10):
+    return EvaluadorFechas(celdas).fecha(fila, columna)
+
+def test_date_se_desborda_como_en_excel():
+    assert fecha({(18, 10): '=DATE(2026,13,1)'}) == date(2027, 1, 1)
+    assert fecha({(18, 10): '=DATE(2026,3,32)'}) == date(2026, 4, 1)
+    assert fecha({(18, 10): '=DATE(2026,0,1)'}) == date(2025, 12, 1)
+    assert fecha({(18, 10): '=DATE(2026,3,1)+G18*7', (18, 7): 2}) == date(2026, 3, 15)
+
+def test_edate_suma_meses_sin_pasarse_de_fin_de_mes():
+    assert fecha({(18, 10): '=EDATE(H18,1)', (18, 8): datetime(2026, 1, 31)}) == date(2026, 2, 28)
+    assert fecha({(18, 10): '=EDATE(H18,1)', (18, 8): date(2028, 1, 31)}) == date(2028, 2, 29)
+    assert fecha({(18, 10): '=EDATE(H18,-1)', (18, 8): date(2026, 3, 31)}) == date(2026, 2, 28)
+    assert fecha({(18, 10): '=_xlfn.EDATE(H18,12)', (18, 8): date(2026, 3, 15)}) == date(2027, 3, 15)
+
+def test_referencias_relativas_y_fijas():
+    celdas = {(18, 10): '=H18+30', (19, 10): '=H19+$H$1', (18, 8): date(2026, 3, 1),
+              (19, 8): date(2026, 3, 2), (1, 8): 10}
+    assert fecha(celdas) == date(2026, 3, 31)
+    assert fecha(celdas, 19) == date(2026, 3, 12)
+
+def test_referencia_circular_no_da_fecha():
+    assert fecha({(18, 10): '=J19+1', (19, 10): '=J18+1'}) is None
+    assert fecha({(18, 10): '=J18+1'}) is None
+
+def test_fecha_escrita_como_texto():
+    assert fecha({(18, 10): '=H18+30', (18, 8): '15/03/2026'}) == date(2026, 4, 14)
+    assert fecha({(18, 10): '=H18+30', (18, 8): '15 de marzo de 2026'}) == date(2026, 4, 14)
+    assert fecha({(18, 10): '=H18+30', (18, 8): 'pendiente'}) is None
+
+def test_referencia_a_celda_vacia_no_da_fecha():
+    # Excel daría el 29/01/1900 y el 30/12/1899: no son fechas de caducidad
+    assert fecha({(18, 10): '=H18+30'}) is None
+    assert fecha({(18, 10): '=H18'}) is None
+    assert fecha({(18, 10): '=DATE(2026,3,1)+G18*7'}) is None
+
+def test_resultado_fuera_del_rango_de_fechas():
+    assert fecha({(18, 10): '=5+5'}) is None
+    assert fecha({(18, 10): '=H18*1000', (18, 8): date(2026, 3, 1)}) is None
+
+def test_funciones_y_simbolos_no_soportados():
+    assert fecha({(18, 10): '=VLOOKUP(H18,A1:B2,2)'}) is None
+    assert fecha({(18, 10): '=H18+'}) is None
+    assert fecha({(18, 10): '=DATE(2026,3)'}) is None
+
+def test_completar_hojas_omite_las_filas_con_referencias_vacias(tmp_path):
+    openpyxl = pytest.importorskip('openpyxl')
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet['H18'] = date(2026, 3, 1)
+    sheet['J18'] = '=H18+30'
+    sheet['J19'] = '=H19+30'
+    ruta = str(tmp_path / 'libro.xlsx')
+    workbook.save(ruta)
+
+    hojas = [{'hoja': sheet.title, 'filas': [], 'sin_fecha': [
+        (10, FilaMedicamento(18, None, 'Paracetamol', 'Dolor')),
+        (10, FilaMedicamento(19, None, 'Ibuprofeno', 'Dolor')),
+    ]}]
+    completar_hojas(ruta, hojas)
+    assert [(fila['fila'], fila['fecha']) for fila in hojas[0]['filas']] == [(18, date(2026, 3, 31))]
+    assert 'sin_fecha' not in hojas[0]
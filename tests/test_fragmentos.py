@@ -0,0 +1,71 @@
+import json
+import os
+
+import pytest
+
+import fragmentos
+from fragmentos import cargar_resultados, entradas_del_fragmento, fragmento_de, guardar_resultados, leer_fragmento
+
+@pytest.fixture(autouse=True)
+def sin_log(monkeypatch):
+    monkeypatch.setattr(fragmentos, 'log', lambda mensaje: None)
+
+def paciente(libro, hoja='', nombre='ANA'):
+    return {'libro': libro, 'hoja': hoja, 'email': None, 'info_paciente': {'paciente': nombre}}
+
+def test_leer_fragmento():
+    assert leer_fragmento('2/4') == (2, 4)
+    assert leer_fragmento('1/1') == (1, 1)
+    for texto in ('0/4', '5/4', '2', '2/x', '1/2/3', ''):
+        with pytest.raises(ValueError):
+            leer_fragmento(texto)
+
+def test_fragmento_de_es_estable_y_reparte_todas_las_entradas():
+    # Valores fijos: no pueden depender de PYTHONHASHSEED ni del orden del manifiesto
+    assert [fragmento_de(clave, 4) for clave in ('ana', 'luis', 'marta', 'libro-1')] == [3, 2, 2, 3]
+    assert [fragmento_de(clave, 7) for clave in ('ana', 'luis', 'marta', 'libro-1')] == [7, 5, 5, 5]
+    assert fragmento_de(123, 4) == fragmento_de('123', 4)
+    assert fragmento_de('ana', 1) == 1
+
+    entradas = [{'id': f"libro-{numero}"} for numero in range(200)]
+    repartos = [entradas_del_fragmento(entradas, indice, 4) for indice in range(1, 5)]
+    assert sorted(entrada['id'] for reparto in repartos for entrada in reparto) == sorted(e['id'] for e in entradas)
+    assert all(reparto for reparto in repartos)
+    assert entradas_del_fragmento(list(reversed(entradas)), 2, 4) == list(reversed(repartos[1]))
+
+def test_combinar_sin_duplicados_y_con_los_que_faltan(tmp_path):
+    directorio = str(tmp_path)
+    guardar_resultados(directorio, 1, 3, [paciente('a'), paciente('b', 'Hoja1')], ejecucion='run-7')
+    guardar_resultados(directorio, 2, 3, [paciente('b', 'Hoja1', 'LUIS'), paciente('b', 'Hoja2')], ejecucion='run-7')
+
+    pacientes, faltan = cargar_resultados(directorio, 'run-7')
+    assert faltan == ['3/3']
+    # El mismo libro y hoja solo una vez, con el resultado más reciente
+    assert sorted((p['libro'], p['hoja'], p['info_paciente']['paciente']) for p in pacientes) == [
+        ('a', '', 'ANA'), ('b', 'Hoja1', 'LUIS'), ('b', 'Hoja2', 'ANA')]
+
+def test_los_resultados_de_otra_ejecucion_cuentan_como_que_faltan(tmp_path):
+    directorio = str(tmp_path)
+    guardar_resultados(directorio, 1, 2, [paciente('a')], ejecucion='2026-03-01')
+    guardar_resultados(directorio, 2, 2, [paciente('viejo')], ejecucion='2026-02-28')
+
+    pacientes, faltan = cargar_resultados(directorio, '2026-03-01')
+    assert [p['libro'] for p in pacientes] == ['a']
+    assert faltan == ['2/2']
+
+    # Archivos de antes, sin id de ejecución: no se reenvía nada y faltan todos
+    ruta = fragmentos.ruta_resultados(directorio, 1, 2)
+    with open(ruta, encoding='utf-8') as archivo:
+        datos = json.load(archivo)
+    del datos['ejecucion']
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        json.dump(datos, archivo)
+    assert cargar_resultados(directorio, '2026-03-01') == ([], ['1/2', '2/2'])
+
+def test_la_ejecucion_por_defecto_es_el_dia(tmp_path, monkeypatch):
+    monkeypatch.setattr(fragmentos, 'EJECUCION', '')
+    ruta = guardar_resultados(str(tmp_path), 1, 1, [])
+    with open(ruta, encoding='utf-8') as archivo:
+        assert json.load(archivo)['ejecucion'] == fragmentos.date.today().isoformat()
+    assert cargar_resultados(str(tmp_path)) == ([], [])
+    assert not os.path.exists(f"{ruta}.tmp")
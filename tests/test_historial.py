@@ -0,0 +1,108 @@
+from datetime import date
+import os
+
+import pytest
+
+import historial
+from registros import FilaMedicamento
+
+LUNES, MARTES, MIERCOLES, JUEVES = (date(2026, 1, dia) for dia in (5, 6, 7, 8))
+LUNES_SIGUIENTE = date(2026, 1, 12)
+# Con DIAS_DETALLE = 35 quedan compactados el lunes y el martes; del miércoles en adelante, detalle
+COMPACTACION = date(2026, 2, 11)
+
+@pytest.fixture
+def ruta(tmp_path, monkeypatch):
+    monkeypatch.setattr(historial, 'log', lambda mensaje: None)
+    monkeypatch.setattr(historial, 'DIAS_DETALLE', 35)
+    return str(tmp_path / 'historial.db')
+
+def hojas(paciente, *fechas):
+    filas = [FilaMedicamento(18 + numero, fecha, f"Med {numero}", 'USO') for numero, fecha in enumerate(fechas)]
+    return [{'hoja': '', 'filas': filas, 'info_paciente': {'paciente': paciente}}]
+
+# Una fecha ya vencida todos los días, una que entra en la ventana de 3 días y otra lejana
+ANA = hojas('ANA', date(2026, 1, 2), date(2026, 1, 7), date(2026, 1, 20))
+# El lunes se corrige el libro y añade una fila más en la ventana
+ANA_CORREGIDO = hojas('ANA', date(2026, 1, 2), date(2026, 1, 7), date(2026, 1, 20), date(2026, 1, 6))
+LUIS = hojas('LUIS', date(2026, 1, 7))
+
+def registrar(ruta, hash_libro, hojas_libro, origen, dia):
+    return historial.registrar(hash_libro, hojas_libro, origen, 3, ruta_db=ruta, fecha_hoy=dia)
+
+def poblar(ruta):
+    registrar(ruta, 'ana-1', ANA, 'ana.xlsx', LUNES)
+    registrar(ruta, 'ana-2', ANA_CORREGIDO, 'ana.xlsx', LUNES)
+    registrar(ruta, 'luis-1', LUIS, 'luis.xlsx', MARTES)
+    for dia in (MARTES, MIERCOLES, JUEVES, LUNES_SIGUIENTE):
+        registrar(ruta, 'ana-2', ANA_CORREGIDO, 'ana.xlsx', dia)
+
+def test_registrar_no_repite_el_mismo_libro_el_mismo_dia(ruta):
+    assert registrar(ruta, 'ana-1', ANA, 'ana.xlsx', LUNES) == 3
+    assert registrar(ruta, 'ana-1', ANA, 'ana.xlsx', LUNES) == 0
+    # El mismo libro otro día, o cambiado el mismo día, sí se registra
+    assert registrar(ruta, 'ana-1', ANA, 'ana.xlsx', MARTES) == 3
+    assert registrar(ruta, 'ana-2', ANA_CORREGIDO, 'ana.xlsx', MARTES) == 4
+
+    with historial.conectar(ruta) as conexion:
+        ejecuciones = conexion.execute("SELECT dia, hash_libro, origen FROM ejecuciones ORDER BY id").fetchall()
+        alertas = conexion.execute("SELECT fila, dias_restantes, alerta FROM filas WHERE ejecucion = 1").fetchall()
+    assert ejecuciones == [('2026-01-05', 'ana-1', os.path.abspath('ana.xlsx')),
+                           ('2026-01-06', 'ana-1', os.path.abspath('ana.xlsx')),
+                           ('2026-01-06', 'ana-2', os.path.abspath('ana.xlsx'))]
+    assert alertas == [(18, -3, 0), (19, 2, 1), (20, 15, 0)]
+
+def test_compactar_dias_enteros_antes_del_plazo(ruta):
+    poblar(ruta)
+    conexion = historial.conectar(ruta)
+    try:
+        # Con margen, el detalle aún no lleva una semana vencido: no se toca nada
+        assert historial.compactar(conexion, COMPACTACION, margen=historial.COMPACTAR_CADA) == 0
+        assert historial.compactar(conexion, COMPACTACION) == 2
+
+        resumen = conexion.execute("SELECT * FROM resumen_diario ORDER BY dia, paciente").fetchall()
+        assert resumen == [
+            # Las dos versiones del lunes: cuenta la de más alertas y se suman las ejecuciones
+            ('2026-01-05', os.path.abspath('ana.xlsx'), '', 'ANA', 4, 2, 1, 2),
+            ('2026-01-06', os.path.abspath('ana.xlsx'), '', 'ANA', 4, 2, 1, 1),
+            ('2026-01-06', os.path.abspath('luis.xlsx'), '', 'LUIS', 1, 1, 0, 1),
+        ]
+        # El miércoles es justo el límite: sigue en detalle
+        assert conexion.execute("SELECT MIN(dia) FROM ejecuciones").fetchone() == ('2026-01-07',)
+        assert conexion.execute("SELECT COUNT(*) FROM filas").fetchone() == (12,)
+
+        # Detalle que llega tarde a un día ya compactado: se funde con MAX y suma ejecuciones
+        registrar(ruta, 'ana-3', hojas('ANA', date(2026, 1, 1), date(2026, 1, 2), date(2026, 1, 6)), 'ana.xlsx', LUNES)
+        assert historial.compactar(conexion, COMPACTACION) == 1
+        assert conexion.execute(
+            "SELECT filas, alertas, vencidas, ejecuciones FROM resumen_diario WHERE dia = '2026-01-05'"
+        ).fetchall() == [(4, 2, 2, 3)]
+    finally:
+        conexion.close()
+
+def test_consultas_iguales_antes_y_despues_de_compactar(ruta):
+    poblar(ruta)
+    conexion = historial.conectar(ruta)
+    try:
+        def consultas():
+            return (historial.vencimientos_paciente(conexion, 'ANA'),
+                    historial.vencimientos_paciente(conexion, 'ANA', desde='2026-01-06'),
+                    historial.vencimientos_paciente(conexion, 'LUIS'),
+                    historial.alertas_por_semana(conexion, semanas=2, fecha_hoy=date(2026, 1, 14)),
+                    historial.alertas_por_semana(conexion, semanas=1, fecha_hoy=date(2026, 1, 14)))
+
+        antes = consultas()
+        assert antes == (
+            [('2026-01-05', 1), ('2026-01-06', 1), ('2026-01-07', 2), ('2026-01-08', 3), ('2026-01-12', 3)],
+            [('2026-01-06', 1), ('2026-01-07', 2), ('2026-01-08', 3), ('2026-01-12', 3)],
+            [],
+            # Semana del 5: lunes 2 (ANA), martes 2 (ANA) + 1 (LUIS), miércoles 1 (ANA), jueves 0
+            [('2026-01-05', 6, 2), ('2026-01-12', 0, 0)],
+            [('2026-01-12', 0, 0)],
+        )
+
+        # La semana del 5 queda repartida entre el resumen (lunes y martes) y el detalle
+        assert historial.compactar(conexion, COMPACTACION) == 2
+        assert consultas() == antes
+    finally:
+        conexion.close()
@@ -0,0 +1,63 @@
+import io
+import re
+import zipfile
+
+import pytest
+
+openpyxl = pytest.importorskip('openpyxl')
+PIL = pytest.importorskip('PIL.Image')
+
+import imagenes_excel
+
+def png(color):
+    datos = io.BytesIO()
+    PIL.new('RGB', (4, 4), color).save(datos, 'PNG')
+    datos.seek(0)
+    return datos
+
+def libro_con_fotos(celdas, segunda_en_dos_celdas=False):
+    """xlsx con una imagen por celda; opcionalmente la segunda anclada con twoCellAnchor"""
+    from openpyxl.drawing.image import Image
+    libro = openpyxl.Workbook()
+    for celda, color in celdas:
+        libro.active.add_image(Image(png(color)), celda)
+    datos = io.BytesIO()
+    libro.save(datos)
+    if not segunda_en_dos_celdas:
+        return datos.getvalue()
+
+    salida = io.BytesIO()
+    with zipfile.ZipFile(datos) as origen, zipfile.ZipFile(salida, 'w') as destino:
+        for entrada in origen.infolist():
+            contenido = origen.read(entrada)
+            if entrada.filename == 'xl/drawings/drawing1.xml':
+                texto = contenido.decode('utf-8')
+                primera, segunda = texto.split('</oneCellAnchor>', 1)
+                segunda = re.sub(r'<ext [^>]*/>', '<to><col>14</col><colOff>0</colOff><row>8</row><rowOff>0</rowOff></to>',
+                                 segunda.replace('<oneCellAnchor>', '<twoCellAnchor>', 1), count=1)
+                contenido = (primera + '</oneCellAnchor>' + segunda.replace('</oneCellAnchor>', '</twoCellAnchor>', 1)).encode('utf-8')
+            destino.writestr(entrada, contenido)
+    return salida.getvalue()
+
+def anclas_openpyxl(datos):
+    hoja = openpyxl.load_workbook(io.BytesIO(datos)).active
+    return [(imagen.anchor._from.col, imagen.anchor._from.row) for imagen in hoja._images]
+
+def test_anclas_en_el_orden_del_documento_como_openpyxl():
+    datos = libro_con_fotos([('L5', 'red'), ('M6', 'blue')], segunda_en_dos_celdas=True)
+    with zipfile.ZipFile(io.BytesIO(datos)) as libro:
+        hojas, activa = imagenes_excel.hojas_del_libro(libro)
+        anclas = [(col, fila) for col, fila, _ in imagenes_excel.imagenes_ancladas(libro, hojas[activa])]
+    assert anclas == anclas_openpyxl(datos) == [(11, 4), (12, 5)]
+
+    # Con dos imágenes en la zona gana la primera del documento, aunque la otra sea twoCellAnchor
+    foto = imagenes_excel.fotos_de_hojas(io.BytesIO(datos))[activa]
+    assert foto == png('red').getvalue()
+
+def test_zona_de_la_foto_incluye_la_fila_13_y_la_columna_n(capsys):
+    datos = libro_con_fotos([('N13', 'green')])
+    assert imagenes_excel.fotos_de_hojas(io.BytesIO(datos))['Sheet'] == png('green').getvalue()
+
+    fuera = libro_con_fotos([('N14', 'green')])
+    assert imagenes_excel.fotos_de_hojas(io.BytesIO(fuera))['Sheet'] is None
+    assert 'zona L-N, filas 5-13' in capsys.readouterr().out
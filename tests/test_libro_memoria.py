@@ -0,0 +1,61 @@
+from datetime import date, datetime, timedelta
+import email
+from email import policy
+import io
+import os
+
+import alerta_medicamentos
+from cache_alertas import calcular_hash
+from libro_memoria import LibroEnMemoria, abrir_libro, origen_libro
+
+def libro_con_foto(ruta):
+    """Plantilla de alerta_medicamentos.py con una alerta para mañana y la foto del paciente en L6"""
+    import openpyxl
+    from openpyxl.drawing.image import Image
+    from PIL import Image as ImagenPIL
+
+    buffer = io.BytesIO()
+    ImagenPIL.new('RGB', (80, 100), (200, 30, 30)).save(buffer, format='PNG')
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet['B5'], sheet['B9'], sheet['I9'] = 'ANA', 'LUIS', '600'
+    sheet['A18'], sheet['B18'] = 'ENALAPRIL', 'TENSION'
+    sheet['J18'] = datetime.combine(date.today(), datetime.min.time()) + timedelta(days=1)
+    foto = Image(buffer)
+    foto.anchor = 'L6'
+    sheet.add_image(foto)
+    workbook.save(ruta)
+    return str(ruta)
+
+def test_todo_sale_de_una_sola_lectura_del_disco(tmp_path, monkeypatch):
+    monkeypatch.setattr(alerta_medicamentos, 'log', lambda mensaje: None)
+    monkeypatch.setattr(alerta_medicamentos, 'RUTA_INDICE', str(tmp_path / 'indice.json'))
+    ruta = libro_con_foto(tmp_path / 'ana.xlsx')
+    hash_del_archivo = calcular_hash(ruta, alerta_medicamentos.parametros_lectura())
+
+    libro = LibroEnMemoria.leer(ruta)
+    # A partir de aquí el disco ya no hace falta: cualquier otra lectura fallaría
+    os.remove(ruta)
+
+    hash_excel = calcular_hash(libro, alerta_medicamentos.parametros_lectura())
+    assert hash_excel == hash_del_archivo
+
+    filas, info_paciente, hash_obtenido = alerta_medicamentos.flujo.obtener_filas(libro, hash_excel)
+    assert hash_obtenido == hash_excel
+    assert [fila['medicamento'] for fila in filas] == ['ENALAPRIL']
+
+    grafo = alerta_medicamentos.crear_grafo_etapas(libro, filas, info_paciente)
+    assert grafo['imagen'] and 'ENALAPRIL' in grafo['html']
+
+    # El adjunto del email son los mismos bytes
+    mensaje = alerta_medicamentos.crear_email('a@ejemplo.org', 'b@ejemplo.org', 'Asunto', grafo['html'], libro)
+    mensaje = email.message_from_bytes(mensaje.as_bytes(), policy=policy.default)
+    adjunto, = mensaje.iter_attachments()
+    assert adjunto.get_filename() == 'ana.xlsx' and adjunto.get_content() == libro.datos
+
+def test_abrir_y_origen():
+    libro = LibroEnMemoria(b'datos', 'ana.xlsx', 'https://drive.google.com/uc?id=1')
+    assert abrir_libro(libro).read() == b'datos' and len(libro) == 5
+    assert origen_libro(libro) == 'https://drive.google.com/uc?id=1'
+    assert abrir_libro('ana.xlsx') == 'ana.xlsx' and origen_libro('ana.xlsx') == os.path.abspath('ana.xlsx')
+    assert LibroEnMemoria(b'', 'ana.xlsx').origen == 'ana.xlsx'
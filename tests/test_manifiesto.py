@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+from manifiesto import ruta_libro
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_ruta_libro_conserva_la_extension_de_drive():
+    assert ruta_libro({'id': 'maria', 'file_id': '1AbC'}).endswith(os.path.join('libros', 'maria.xlsx'))
+    assert ruta_libro({'id': 'juan', 'file_id': '2XyZ', 'formato': 'csv'}).endswith('juan.csv')
+    assert ruta_libro({'id': 'ana', 'file_id': '3Qw', 'nombre': 'Control Ana.ODS'}).endswith('ana.ods')
+    # Una extensión que no se sabe leer no cambia el nombre: se intenta como .xlsx
+    assert ruta_libro({'id': 'luis', 'file_id': '4Er', 'nombre': 'luis.pdf'}).endswith('luis.xlsx')
+    assert ruta_libro({'id': 'local', 'ruta': 'pacientes/local.csv', 'formato': 'ods'}) == 'pacientes/local.csv'
+
+def test_revisar_fechas_lee_csv_sin_openpyxl(tmp_path):
+    ruta = tmp_path / 'control.csv'
+    filas = [['Paciente', 'Juan']] + [[] for _ in range(11)]
+    filas.append(['MEDICAMENTO', 'USO', '', '', '', '', '', '', 'FECHA'])
+    filas.append(['Paracetamol', 'Dolor', '', '', '', '', '', '', '2026-03-12'])
+    ruta.write_text('\n'.join(';'.join(fila) for fila in filas), encoding='utf-8')
+
+    # Si algo importa openpyxl el proceso falla con ImportError
+    codigo = textwrap.dedent(f"""
+        import sys
+        sys.modules['openpyxl'] = None
+        import revisar_fechas
+        filas, info = revisar_fechas.leer_excel_y_escanear_filas({str(ruta)!r})
+        print([(fila['fila'], fila['medicamento'], fila['columna'], str(fila['fecha'])) for fila in filas])
+    """)
+    salida = subprocess.run([sys.executable, '-c', codigo], cwd=RAIZ, capture_output=True, text=True, check=True)
+    assert "[(14, 'Paracetamol', 'I', '2026-03-12')]" in salida.stdout
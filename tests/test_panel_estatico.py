@@ -0,0 +1,96 @@
+from datetime import date
+import os
+
+import pytest
+
+import panel_estatico
+from panel_estatico import generar_panel, nombre_pagina
+from registros import FilaMedicamento
+
+HOY = date(2026, 3, 1)
+
+class Panel:
+    """Libros falsos en memoria y registro de lo que lee y escribe generar_panel"""
+
+    def __init__(self, directorio):
+        self.directorio = directorio
+        self.libros = {}            # ruta -> [{'hoja', 'filas', 'info_paciente'}] o None
+        self.fotos_leidas = []
+        self.renderizadas = []
+
+    def poner(self, ruta, **pacientes):
+        """Un libro con una hoja por paciente: hoja=(nombre, [fechas])"""
+        self.libros[ruta] = [
+            {'hoja': hoja, 'info_paciente': {'paciente': nombre, 'responsable': 'R', 'telefono': '600'},
+             'filas': [FilaMedicamento(18 + numero, fecha, f"Med {numero}", 'USO') for numero, fecha in enumerate(fechas)]}
+            for hoja, (nombre, fechas) in pacientes.items()
+        ]
+
+    def leer_hojas(self, ruta):
+        hojas = self.libros[ruta]
+        return hojas, (None if hojas is None else str(hash(repr(hojas))))
+
+    def leer_fotos(self, ruta, hojas):
+        self.fotos_leidas.append(ruta)
+        return {hoja: f"foto-{ruta}-{hoja}" for hoja in hojas}
+
+    def renderizar_pagina(self, filas, info_paciente):
+        self.renderizadas.append(info_paciente['paciente'])
+        return f"<h1>{info_paciente['paciente']}</h1>{[str(fila['fecha']) for fila in filas]}"
+
+    def generar(self):
+        self.fotos_leidas, self.renderizadas = [], []
+        return generar_panel([(ruta, ruta) for ruta in self.libros], self.directorio, self.leer_hojas,
+                             self.leer_fotos, self.renderizar_pagina, lambda resumenes: repr(resumenes), HOY)
+
+    def paginas(self):
+        return sorted(archivo for archivo in os.listdir(self.directorio) if archivo.endswith('.html')
+                      and archivo != panel_estatico.ARCHIVO_INDICE)
+
+@pytest.fixture
+def panel(tmp_path, monkeypatch):
+    monkeypatch.setattr(panel_estatico, 'log', lambda mensaje: None)
+    panel = Panel(str(tmp_path / 'panel'))
+    panel.poner('a.xlsx', H1=('ANA', [date(2026, 3, 3)]), H2=('LUIS', [date(2026, 3, 10)]))
+    panel.poner('b.xlsx', H1=('MARTA', [date(2026, 2, 20), date(2026, 4, 1)]))
+    assert panel.generar() == (3, 0)
+    return panel
+
+def test_libro_sin_cambios_no_se_reescribe_ni_lee_fotos(panel):
+    marcas = {archivo: os.stat(os.path.join(panel.directorio, archivo)).st_mtime_ns for archivo in panel.paginas()}
+    assert panel.generar() == (0, 3)
+    assert panel.fotos_leidas == [] and panel.renderizadas == []
+    assert {archivo: os.stat(os.path.join(panel.directorio, archivo)).st_mtime_ns
+            for archivo in panel.paginas()} == marcas
+
+def test_fila_cambiada_solo_reescribe_su_pagina(panel):
+    panel.poner('a.xlsx', H1=('ANA', [date(2026, 3, 4)]), H2=('LUIS', [date(2026, 3, 10)]))
+    assert panel.generar() == (1, 2)
+    # Las fotos se leen solo del libro que cambió
+    assert panel.fotos_leidas == ['a.xlsx']
+    assert panel.renderizadas == ['ANA']
+    with open(os.path.join(panel.directorio, nombre_pagina('a.xlsx', 'H1', 'ANA')), encoding='utf-8') as archivo:
+        assert '2026-03-04' in archivo.read()
+
+def test_paciente_que_desaparece_pierde_su_pagina(panel):
+    panel.poner('a.xlsx', H1=('ANA', [date(2026, 3, 3)]))
+    assert panel.generar() == (0, 2)
+    assert nombre_pagina('a.xlsx', 'H2', 'LUIS') not in panel.paginas()
+    assert len(panel.paginas()) == 2
+
+    # Un libro entero que sale de la lista también
+    del panel.libros['b.xlsx']
+    panel.generar()
+    assert panel.paginas() == [nombre_pagina('a.xlsx', 'H1', 'ANA')]
+
+def test_libro_ilegible_conserva_sus_paginas(panel):
+    antes = panel.paginas()
+    panel.libros['b.xlsx'] = None
+    assert panel.generar() == (0, 2)
+    assert panel.paginas() == antes
+
+    # Vuelve a leerse con el mismo contenido que antes del fallo: ni siquiera se leen sus fotos
+    panel.poner('b.xlsx', H1=('MARTA', [date(2026, 2, 20), date(2026, 4, 1)]))
+    assert panel.generar() == (0, 3)
+    assert panel.fotos_leidas == []
+    assert panel.paginas() == antes
@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+import planificador_envios
+from planificador_envios import CuboTokens, CuotaAgotada, PlanificadorEnvios
+
+DESTINATARIOS = [f"familia{numero}@ejemplo.org" for numero in range(2000)]
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self):
+        return self.ahora
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(planificador_envios.time, 'monotonic', reloj)
+    return reloj
+
+def cuentas(*usuarios):
+    return [(usuario, f"clave-{usuario}") for usuario in usuarios]
+
+def asignacion(planificador):
+    return {destinatario: planificador.cuentas_para(destinatario)[0] for destinatario in DESTINATARIOS}
+
+def test_cubo_permite_la_rafaga_y_luego_se_rellena_con_el_tiempo(reloj):
+    cubo = CuboTokens(por_segundo=2, rafaga=3)
+    assert [cubo.reservar() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert cubo.reservar() == pytest.approx(0.5)
+
+    reloj.ahora += 10   # se rellena, pero nunca por encima de la ráfaga
+    assert cubo.reservar() == 0.0
+    assert cubo.tokens == pytest.approx(2)
+
+    cubo.devolver()
+    cubo.devolver()
+    assert cubo.tokens == 3
+
+def test_hash_consistente_estable_al_anadir_y_quitar_cuentas(tmp_path):
+    tres = asignacion(PlanificadorEnvios(cuentas('a', 'b', 'c'), str(tmp_path / 'c1.json')))
+    cuatro = asignacion(PlanificadorEnvios(cuentas('a', 'b', 'c', 'd'), str(tmp_path / 'c2.json')))
+    dos = asignacion(PlanificadorEnvios(cuentas('a', 'c'), str(tmp_path / 'c3.json')))
+
+    # Al añadir 'd' solo se mueven destinatarios hacia 'd', aproximadamente una cuarta parte
+    movidos = [destinatario for destinatario in DESTINATARIOS if tres[destinatario] != cuatro[destinatario]]
+    assert all(cuatro[destinatario] == 'd' for destinatario in movidos)
+    assert 0.15 < len(movidos) / len(DESTINATARIOS) < 0.35
+
+    # Al quitar 'b' solo cambian de cuenta los que estaban en 'b'
+    assert all(dos[destinatario] == tres[destinatario]
+               for destinatario in DESTINATARIOS if tres[destinatario] != 'b')
+
+def test_cuota_diaria_pasa_a_la_siguiente_cuenta_y_el_fallo_se_devuelve(tmp_path, reloj):
+    ruta = str(tmp_path / 'cuotas.json')
+    planificador = PlanificadorEnvios(cuentas('a', 'b'), ruta, cuota_diaria=1, rafaga=10)
+    destinatario = DESTINATARIOS[0]
+    primera, segunda = planificador.cuentas_para(destinatario)
+
+    assert planificador.adquirir(destinatario)[0] == primera
+    assert planificador.adquirir(destinatario)[0] == segunda
+    with pytest.raises(CuotaAgotada):
+        planificador.adquirir(destinatario)
+
+    # Un envío que falla no gasta cuota: la cuenta preferida vuelve a estar disponible
+    planificador.devolver(primera)
+    with open(ruta, 'r', encoding='utf-8') as archivo:
+        assert json.load(archivo)['enviados'] == {primera: 0, segunda: 1}
+    assert planificador.adquirir(destinatario)[0] == primera
+
+@pytest.mark.parametrize('modulo', ['alerta_medicamentos', 'revisar_fechas'])
+def test_el_email_que_falla_en_smtp_no_gasta_cuota(tmp_path, monkeypatch, modulo):
+    import importlib
+    import smtplib
+    script = importlib.import_module(modulo)
+
+    planificador = PlanificadorEnvios(cuentas('a'), str(tmp_path / 'cuotas.json'), cuota_diaria=1)
+    monkeypatch.setattr(script.flujo, 'planificador', planificador)
+
+    def smtp_caido(*argumentos, **opciones):
+        raise ConnectionRefusedError("smtp.gmail.com no responde")
+    monkeypatch.setattr(smtplib, 'SMTP', smtp_caido)
+
+    assert script.enviar_email('x@ejemplo.org', 'Asunto', '<p>hola</p>') is False
+    with pytest.raises(ConnectionRefusedError):
+        script.enviar_email('x@ejemplo.org', 'Asunto', '<p>hola</p>', lanzar=True)
+    assert planificador.cuotas._enviados == {'a': 0}
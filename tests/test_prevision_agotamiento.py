@@ -0,0 +1,52 @@
+from datetime import date
+import math
+import sys
+
+import pytest
+
+from prevision_agotamiento import (DIAS_MAXIMOS, PrevisionAgotamiento, agotamiento_python, a_numero,
+                                   fechas_agotamiento)
+
+HOY = date(2026, 3, 1)
+
+# Existencias, dosis y fecha de recuento: casos normales y todos los que no dan fecha
+EXISTENCIAS = [30, 10, 0, 5, 7, -3, math.nan, 1e12, 2.5, 3]
+DOSIS = [1, 3, 2, 0, -1, 1, 1, 1e-9, 0.5, math.nan]
+REFERENCIAS = [HOY, date(2026, 2, 20), HOY, HOY, HOY, HOY, HOY, HOY, date(2024, 2, 28), HOY]
+ESPERADAS = [date(2026, 3, 31), date(2026, 2, 23), HOY, None, None, None, None,
+             date.fromordinal(HOY.toordinal() + DIAS_MAXIMOS), date(2024, 3, 4), None]
+
+def en_python(existencias, dosis, referencias):
+    ordinales = agotamiento_python(existencias, dosis, [referencia.toordinal() for referencia in referencias])
+    return [date.fromordinal(ordinal) if ordinal is not None else None for ordinal in ordinales]
+
+def test_numpy_da_lo_mismo_que_el_bucle():
+    pytest.importorskip('numpy')
+    assert en_python(EXISTENCIAS, DOSIS, REFERENCIAS) == ESPERADAS
+    assert fechas_agotamiento(EXISTENCIAS, DOSIS, REFERENCIAS) == ESPERADAS
+    assert fechas_agotamiento([], [], []) == []
+
+def test_sin_numpy_se_usa_el_bucle(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'numpy', None)
+    assert fechas_agotamiento(EXISTENCIAS, DOSIS, REFERENCIAS) == ESPERADAS
+
+def test_a_numero():
+    assert a_numero(3) == 3.0 and a_numero(' 2,5 ') == 2.5
+    for valor in (None, True, '', 'diez', [1]):
+        assert math.isnan(a_numero(valor))
+
+def test_prevision_sin_fecha_de_recuento_cuenta_desde_la_referencia():
+    # Columnas: A medicamento, B uso, C existencias, D dosis, E fecha de recuento
+    prevision = PrevisionAgotamiento('C', 'D', 'E', fecha_referencia=HOY)
+    prevision.anotar(18, ('Enalapril', 'TENSION', 30, 1, '20/02/2026'))
+    prevision.anotar(19, ('Metformina', None, '10', '2', None))
+    prevision.anotar(20, ('Insulina', 'AZUCAR', 0, 0, None))
+    prevision.anotar(21, (None, 'sin medicamento', 30, 1, None))
+    prevision.anotar(22, ('Omeprazol', 'ESTOMAGO'))
+
+    filas = prevision.filas()
+    assert [(fila['fila'], fila['fecha'], fila['uso'], fila['columna']) for fila in filas] == [
+        (18, date(2026, 3, 22), 'TENSION (agotamiento previsto)', 'C'),
+        (19, date(2026, 3, 6), 'Uso no especificado (agotamiento previsto)', 'C'),
+    ]
+    assert prevision.ultima_columna == 5
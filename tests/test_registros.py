@@ -0,0 +1,48 @@
+from datetime import date
+import json
+
+import pytest
+
+from cache_alertas import _deserializar_filas, _serializar_hoja, cargar_indice, guardar_indice
+from registros import FilaColumna, FilaMedicamento, alerta_de_fila
+
+FECHA = date(2026, 3, 3)
+
+def test_una_sola_columna_mantiene_la_forma_de_siempre():
+    fila = FilaMedicamento(18, FECHA, 'Enalapril', 'TENSION')
+    alerta = alerta_de_fila(fila, 2)
+    assert dict(alerta) == {'fila': 18, 'fecha': FECHA, 'dias_restantes': 2, 'medicamento': 'Enalapril',
+                            'uso': 'TENSION'}
+    assert alerta.get('columna') is None
+
+def test_varias_columnas_llevan_la_letra():
+    alerta = alerta_de_fila(FilaColumna(14, FECHA, 'Insulina', 'AZUCAR', 'K'), 0)
+    assert alerta['columna'] == 'K'
+    assert list(alerta.keys()) == ['fila', 'fecha', 'dias_restantes', 'medicamento', 'uso', 'columna']
+
+def test_la_cache_conserva_la_forma_de_cada_fila():
+    filas = [FilaMedicamento(18, FECHA, 'A', 'X'), FilaColumna(18, FECHA, 'A', 'X (agotamiento previsto)', 'K')]
+    guardadas = _serializar_hoja(filas, {'paciente': 'ANA', 'imagen': 'x'})
+    assert 'columna' not in guardadas['filas'][0]
+    assert _deserializar_filas(guardadas['filas']) == filas
+    assert [type(fila) for fila in _deserializar_filas(guardadas['filas'])] == [FilaMedicamento, FilaColumna]
+
+def test_los_indices_de_otra_version_se_descartan(tmp_path):
+    ruta = str(tmp_path / 'indice.json')
+    guardar_indice(ruta, 'h1', [FilaMedicamento(18, FECHA, 'A', 'X')], {'paciente': 'ANA'})
+    assert cargar_indice(ruta, 'h1') == ([FilaMedicamento(18, FECHA, 'A', 'X')], {'paciente': 'ANA'})
+
+    with open(ruta, encoding='utf-8') as archivo:
+        datos = json.load(archivo)
+    del datos['version']
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        json.dump(datos, archivo)
+    assert cargar_indice(ruta, 'h1') is None
+
+def test_el_acceso_por_clave_solo_admite_campos():
+    fila = FilaMedicamento(18, FECHA, 'A', 'X')
+    for clave in ('count', 'index', 'columna', '_fields'):
+        with pytest.raises(KeyError):
+            fila[clave]
+        assert fila.get(clave) is None
+    assert fila[0] == 18 and fila['uso'] == 'X'
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+import email
+from email import policy
+import os
+
+import pytest
+
+import renderizado
+from renderizado import _nombres_salida, renderizar_lote
+
+@pytest.fixture(autouse=True)
+def sin_log(monkeypatch):
+    monkeypatch.setattr(renderizado, 'log', lambda mensaje: None)
+
+def libro_con_alerta(ruta):
+    """Plantilla de alerta_medicamentos.py con un medicamento que vence mañana y otro lejano"""
+    import openpyxl
+
+    manana = datetime.combine(datetime.today().date(), datetime.min.time()) + timedelta(days=1)
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet['B5'], sheet['B9'], sheet['I9'] = 'ANA PÉREZ', 'LUIS PÉREZ', 611131467
+    sheet['A18'], sheet['B18'], sheet['J18'] = 'ENALAPRIL', 'TENSION', manana
+    sheet['A19'], sheet['B19'], sheet['J19'] = 'METFORMINA', 'AZUCAR', manana + timedelta(days=60)
+    workbook.save(ruta)
+    return str(ruta)
+
+def test_renderiza_eml_con_adjunto_y_whatsapp(tmp_path):
+    import alerta_medicamentos
+
+    ruta = libro_con_alerta(tmp_path / 'ana.xlsx')
+    salida = tmp_path / 'salida'
+    renderizar_lote([ruta], str(salida), alerta_medicamentos.renderizar_libro, procesos=1)
+    assert sorted(os.listdir(salida)) == ['ana.eml', 'ana.whatsapp.txt']
+
+    datos = (salida / 'ana.eml').read_bytes()
+    # Fines de línea CRLF en todo el mensaje, como viaja por SMTP
+    assert b'\r\n' in datos and b'\n' not in datos.replace(b'\r\n', b'')
+
+    mensaje = email.message_from_bytes(datos, policy=policy.default)
+    assert 'ANA PÉREZ' in mensaje['Subject'] and '1 Medicamentos' in mensaje['Subject']
+    html = mensaje.get_body(('html',)).get_content()
+    assert 'ENALAPRIL' in html and 'METFORMINA' not in html
+    adjuntos = list(mensaje.iter_attachments())
+    assert [adjunto.get_filename() for adjunto in adjuntos] == ['ana.xlsx']
+    with open(ruta, 'rb') as archivo:
+        assert adjuntos[0].get_content() == archivo.read()
+
+    whatsapp = (salida / 'ana.whatsapp.txt').read_text(encoding='utf-8')
+    assert whatsapp.startswith('Para: 611131467\n\n')
+    assert 'ENALAPRIL' in whatsapp and 'METFORMINA' not in whatsapp
+
+def test_libro_sin_alertas_no_escribe_nada(tmp_path):
+    import alerta_medicamentos
+    import openpyxl
+
+    workbook = openpyxl.Workbook()
+    workbook.active['B5'] = 'ANA'
+    workbook.save(tmp_path / 'vacio.xlsx')
+    salida = tmp_path / 'salida'
+    renderizar_lote([str(tmp_path / 'vacio.xlsx')], str(salida), alerta_medicamentos.renderizar_libro, procesos=1)
+    assert os.listdir(salida) == []
+
+def test_nombres_salida_sin_choques():
+    libros = ['a/ana.xlsx', 'b/ana.xlsx', 'ana.csv', 'c/ana_2.xlsx', 'luis.ods', 'd/ana.xlsx']
+    nombres = _nombres_salida(libros)
+    assert len(set(nombres)) == len(libros)
+    assert nombres == ['ana', 'ana_2', 'ana_3', 'ana_2_2', 'luis', 'ana_4']
@@ -0,0 +1,31 @@
+from datetime import date
+
+from servidor_consultas import IndiceAlertas
+
+HOY = date(2026, 3, 1)
+
+def hoja(nombre, paciente, *dias):
+    filas = [{'fila': 18 + i, 'fecha': date(2026, 3, 1 + dia), 'medicamento': f'M{dia}', 'uso': ''}
+             for i, dia in enumerate(dias)]
+    return {'hoja': nombre, 'filas': filas, 'info_paciente': {'paciente': paciente, 'imagen': 'x'}}
+
+def test_pacientes_con_el_mismo_nombre_no_se_mezclan():
+    indice = IndiceAlertas([hoja('Hoja1', 'ANA ROS', 1, 5), hoja('Hoja2', 'ANA ROS', 3)], 'h', '/datos/libro.xlsx')
+    assert len(indice.pacientes) == 2
+    claves = sorted(tuple(info['clave']) for info in indice.resumen_pacientes(HOY))
+    assert claves == [('/datos/libro.xlsx', 'Hoja1', 'ANA ROS'), ('/datos/libro.xlsx', 'Hoja2', 'ANA ROS')]
+
+    # Por nombre salen las filas de las dos hojas, en orden de fecha y con su clave
+    alertas = indice.consultar(7, 'ana  ros', fecha_hoy=HOY)
+    assert [(alerta['hoja'], alerta['dias_restantes']) for alerta in alertas] == [
+        ('Hoja1', 1), ('Hoja2', 3), ('Hoja1', 5)]
+    assert alertas[0]['clave'] == ['/datos/libro.xlsx', 'Hoja1', 'ANA ROS']
+
+    # Y con la hoja solo las de ese paciente
+    assert [alerta['dias_restantes'] for alerta in indice.consultar(7, 'ANA ROS', fecha_hoy=HOY, hoja='Hoja2')] == [3]
+
+def test_consulta_general_por_ventana_y_urgencia():
+    indice = IndiceAlertas([hoja('Hoja1', 'ANA', 0, 1, 9), hoja('Hoja2', 'LUIS', 2)], 'h')
+    assert [alerta['dias_restantes'] for alerta in indice.consultar(7, fecha_hoy=HOY)] == [0, 1, 2]
+    assert [alerta['paciente'] for alerta in indice.consultar(7, urgencia='manana', fecha_hoy=HOY)] == ['ANA']
+    assert 'imagen' not in indice.resumen_pacientes(HOY)[0]
@@ -0,0 +1,62 @@
+from datetime import date, datetime, timedelta
+import importlib
+
+import pytest
+
+# Celdas de paciente y teléfono, primera fila de datos y columna de la fecha de cada plantilla
+PLANTILLAS = {
+    'alerta_medicamentos': ('B5', 'I9', 18, 'J'),
+    'revisar_fechas': ('B2', 'I4', 14, 'I'),
+}
+
+def libro_varios_pacientes(ruta, modulo, pacientes):
+    """Una hoja por paciente con (nombre, teléfono, [días hasta cada fecha]) y una hoja de notas en medio"""
+    import openpyxl
+
+    celda_paciente, celda_telefono, fila_inicio, columna_fecha = PLANTILLAS[modulo]
+    hoy = datetime.combine(date.today(), datetime.min.time())
+    workbook = openpyxl.Workbook()
+    workbook.remove(workbook.active)
+    for numero, (nombre, telefono, dias) in enumerate(pacientes):
+        sheet = workbook.create_sheet(f"Hoja {numero}")
+        sheet[celda_paciente], sheet[celda_telefono] = nombre, telefono
+        for fila, dias_hasta in enumerate(dias, fila_inicio):
+            sheet[f"A{fila}"], sheet[f"B{fila}"] = f"{nombre} MED {fila}", 'USO'
+            sheet[f"{columna_fecha}{fila}"] = hoy + timedelta(days=dias_hasta)
+        if numero == 1:
+            workbook.create_sheet('Notas')['A1'] = 'Sin plantilla de paciente'
+    workbook.save(ruta)
+    return str(ruta)
+
+@pytest.mark.parametrize('modulo', sorted(PLANTILLAS))
+def test_cada_hoja_con_su_paciente(tmp_path, monkeypatch, modulo):
+    script = importlib.import_module(modulo)
+    monkeypatch.setattr(script, 'log', lambda mensaje: None)
+    # Más hojas que hilos de escaneo
+    pacientes = [(f"PACIENTE {numero}", f"600 00{numero}", list(range(numero + 1))) for numero in range(7)]
+    ruta = libro_varios_pacientes(tmp_path / 'pacientes.xlsx', modulo, pacientes)
+
+    hojas = script.leer_excel_todas_las_hojas(ruta)
+
+    assert [hoja['hoja'] for hoja in hojas] == [f"Hoja {numero}" for numero in range(7)]
+    for hoja, (nombre, telefono, dias) in zip(hojas, pacientes):
+        assert hoja['info_paciente']['paciente'] == nombre
+        assert hoja['info_paciente']['telefono'] == telefono.replace(' ', '')
+        # Las filas son las de su hoja, no las de otra
+        assert [fila['medicamento'] for fila in hoja['filas']] == \
+            [f"{nombre} MED {fila}" for fila in range(PLANTILLAS[modulo][2], PLANTILLAS[modulo][2] + len(dias))]
+        assert [(fila['fecha'] - date.today()).days for fila in hoja['filas']] == dias
+
+@pytest.mark.parametrize('modulo', sorted(PLANTILLAS))
+def test_todas_las_hojas_desde_el_indice(tmp_path, monkeypatch, modulo):
+    script = importlib.import_module(modulo)
+    monkeypatch.setattr(script, 'log', lambda mensaje: None)
+    ruta = libro_varios_pacientes(tmp_path / 'pacientes.xlsx', modulo, [('ANA', '600', [1]), ('LUIS', '601', [2, 40])])
+
+    hojas, hash_excel = script.flujo.obtener_hojas(ruta, str(tmp_path / 'indice_hojas.json'))
+    monkeypatch.setattr(script, 'leer_excel_todas_las_hojas', lambda ruta: pytest.fail("debía usarse el índice"))
+    en_cache, hash_cache = script.flujo.obtener_hojas(ruta, str(tmp_path / 'indice_hojas.json'))
+
+    assert hash_cache == hash_excel
+    assert [(hoja['hoja'], hoja['info_paciente']['paciente'], hoja['filas']) for hoja in en_cache] == \
+        [(hoja['hoja'], hoja['info_paciente']['paciente'], hoja['filas']) for hoja in hojas]
@@ -0,0 +1,51 @@
+"""Verificación diferencial de los caminos de lectura, incluida la línea base con openpyxl"""
+
+from datetime import datetime, timedelta
+import random
+
+import pytest
+
+pytest.importorskip('openpyxl')
+pytest.importorskip('PIL')
+
+import verificar_backends
+
+@pytest.fixture
+def aislado(tmp_path, monkeypatch):
+    """verificar() silencia los módulos y cambia sus rutas de índice: se restauran al terminar"""
+    import alerta_medicamentos
+    import esquema_columnas
+    import flujo_alertas
+    import formulas_fecha
+    import imagenes_excel
+    import revisar_fechas
+    for modulo in (alerta_medicamentos, revisar_fechas, flujo_alertas, esquema_columnas, formulas_fecha, imagenes_excel):
+        monkeypatch.setattr(modulo, 'log', modulo.log)
+    for modulo in (alerta_medicamentos, revisar_fechas):
+        monkeypatch.setattr(modulo, 'RUTA_INDICE', modulo.RUTA_INDICE)
+    monkeypatch.setattr(esquema_columnas, 'cache_esquemas', esquema_columnas.CacheEsquemas(str(tmp_path / 'esquemas.json')))
+    # Los libros con diferencias se copian al directorio actual
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+@pytest.mark.parametrize('plantilla', ['alerta', 'revisar'])
+def test_todos_los_caminos_coinciden(aislado, plantilla):
+    assert verificar_backends.verificar(12, semilla=2, filas_maximas=40, plantillas=[plantilla]) == 0
+    assert not list(aislado.glob('fallo_*.xlsx'))
+
+def test_la_linea_base_lee_como_los_scripts_originales(tmp_path):
+    ruta = str(tmp_path / 'libro.xlsx')
+    verificar_backends.crear_libro_aleatorio(ruta, random.Random(5), 30, 'revisar', basico=True)
+
+    import openpyxl
+    workbook = openpyxl.load_workbook(ruta)
+    sheet = workbook.active
+    hoy = datetime.combine(datetime.today().date(), datetime.min.time())
+    sheet['A14'], sheet['B14'], sheet['I14'] = 'Insulina', None, hoy + timedelta(days=5)
+    sheet['A15'], sheet['I15'] = 'Omeprazol', hoy + timedelta(days=6)
+    workbook.save(ruta)
+
+    alertas, info = verificar_backends.linea_base(ruta, 'revisar', 14, ['I'], 5, True)
+    assert alertas[0] == (14, hoy.date() + timedelta(days=5), 5, 'Insulina', 'Uso no especificado', 'I')
+    assert all(alerta[0] != 15 for alerta in alertas)
+    assert set(info) == {'paciente', 'ubicacion', 'telefono'}
@@ -0,0 +1,85 @@
+import io
+import sys
+import threading
+import time
+import zipfile
+
+import pytest
+
+import vigilancia
+from vigilancia import comparar_alertas, esperar_zip_completo, vigilar_archivo
+
+def alerta(fila, fecha='2026-03-01', medicamento='Ibuprofeno', columna=None, dias_restantes=1):
+    return {'fila': fila, 'columna': columna, 'fecha': fecha, 'medicamento': medicamento,
+            'dias_restantes': dias_restantes}
+
+def xlsx_minimo():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archivo_zip:
+        archivo_zip.writestr('[Content_Types].xml', '<Types/>')
+        archivo_zip.writestr('xl/workbook.xml', '<workbook/>' * 200)
+    return buffer.getvalue()
+
+def test_comparar_alertas_nuevas_y_resueltas_por_clave():
+    anteriores = [alerta(18), alerta(19), alerta(20, columna='I')]
+    # Los días restantes cambian de un día a otro sin que la alerta sea nueva
+    actuales = [alerta(18, dias_restantes=0), alerta(19, fecha='2026-03-05'), alerta(20, columna='J'), alerta(21)]
+
+    nuevas, resueltas = comparar_alertas(anteriores, actuales)
+
+    assert [(a['fila'], a['fecha'], a['columna']) for a in nuevas] == [
+        (19, '2026-03-05', None), (20, '2026-03-01', 'J'), (21, '2026-03-01', None)]
+    assert [(a['fila'], a['fecha'], a['columna']) for a in resueltas] == [
+        (19, '2026-03-01', None), (20, '2026-03-01', 'I')]
+    assert comparar_alertas([], []) == ([], [])
+
+def test_esperar_zip_completo_con_archivo_terminado(tmp_path):
+    ruta = tmp_path / 'libro.xlsx'
+    ruta.write_bytes(xlsx_minimo())
+    assert esperar_zip_completo(str(ruta), espera_maxima=1)
+
+def test_esperar_zip_completo_espera_a_que_termine_de_escribirse(tmp_path):
+    ruta = tmp_path / 'libro.xlsx'
+    datos = xlsx_minimo()
+    ruta.write_bytes(datos[:len(datos) // 2])
+
+    def terminar():
+        time.sleep(0.3)
+        ruta.write_bytes(datos)
+
+    hilo = threading.Thread(target=terminar)
+    inicio = time.monotonic()
+    hilo.start()
+    assert esperar_zip_completo(str(ruta), espera_maxima=3)
+    hilo.join()
+    assert time.monotonic() - inicio >= 0.3
+
+def test_esperar_zip_completo_se_rinde_con_archivo_corrupto_o_ausente(tmp_path):
+    ruta = tmp_path / 'libro.xlsx'
+    ruta.write_bytes(b'esto no es un zip')
+    assert not esperar_zip_completo(str(ruta), espera_maxima=0.3)
+    assert not esperar_zip_completo(str(tmp_path / 'no_existe.xlsx'), espera_maxima=0.3)
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason="inotify solo existe en Linux")
+def test_un_error_al_revisar_no_termina_la_vigilancia(tmp_path, monkeypatch):
+    monkeypatch.setattr(vigilancia, 'log', lambda mensaje: None)
+    ruta = tmp_path / 'libro.xlsx'
+    revisiones = []
+    segunda = threading.Event()
+
+    def revisar(ruta_cambiada):
+        revisiones.append(ruta_cambiada)
+        if len(revisiones) == 1:
+            raise FileNotFoundError(ruta_cambiada)
+        segunda.set()
+
+    hilo = threading.Thread(target=vigilar_archivo, args=(str(ruta), revisar, 0.05), daemon=True)
+    hilo.start()
+    time.sleep(0.2)
+    for _ in range(2):
+        ruta.write_bytes(xlsx_minimo())
+        time.sleep(0.5)
+
+    assert segunda.wait(5)
+    assert hilo.is_alive()
+    assert revisiones == [str(ruta)] * 2
@@ -0,0 +1,40 @@
+from whatsapp_agrupado import agrupar_por_telefono, empaquetar, longitud_url, trocear
+
+def cabecera(parte, partes):
+    numeracion = f" ({parte}/{partes})" if partes > 1 else ""
+    return f"🏥 ALERTA MEDICAMENTOS{numeracion}\n\n"
+
+def linea(dias, texto):
+    return (dias, f'2026-03-{1 + dias:02d}', texto)
+
+def test_el_limite_se_mide_en_la_url_codificada():
+    # 40 líneas con emoji y tildes: en caracteres caben en un mensaje, codificadas no
+    lineas = [linea(dias % 7, f"🟡 {dias % 7} días - Enalapril {numero} (03/03/2026) - José Pérez")
+              for numero, dias in enumerate(range(40))]
+    mensajes = empaquetar(lineas, cabecera, limite=1500)
+    assert sum(len(mensaje) for mensaje in mensajes) < 1500 * len(mensajes)
+    assert len(mensajes) > 1
+    assert all(longitud_url(mensaje) <= 1500 for mensaje in mensajes)
+    assert mensajes[0].startswith(f"🏥 ALERTA MEDICAMENTOS (1/{len(mensajes)})")
+    # Todas las alertas, de la más urgente a la menos
+    cuerpo = [texto for mensaje in mensajes for texto in mensaje.split('\n\n', 1)[1].split('\n')]
+    assert sorted(cuerpo) == sorted(texto for _, _, texto in lineas)
+    assert cuerpo[0].startswith('🟡 0 días')
+
+def test_una_linea_demasiado_larga_se_parte_sin_perder_texto():
+    larga = ' '.join(f"Medicamentó{numero}" for numero in range(200))
+    mensajes = empaquetar([linea(0, 'corta'), linea(1, larga)], cabecera, limite=400)
+    assert all(longitud_url(mensaje) <= 400 for mensaje in mensajes)
+    trozos = [texto for mensaje in mensajes for texto in mensaje.split('\n\n', 1)[1].split('\n')]
+    assert trozos[0] == 'corta'
+    assert ' '.join(trozos[1:]) == larga
+
+def test_palabra_sin_espacios_se_corta_por_caracteres():
+    palabra = '💊' * 30
+    trozos = trocear(palabra, 50)
+    assert ''.join(trozos) == palabra
+    assert all(longitud_url(trozo) <= 50 for trozo in trozos)
+
+def test_agrupar_por_telefono_ignora_los_que_no_tienen():
+    pacientes = [(600111222, [linea(0, 'a')]), ('', [linea(1, 'b')]), ('600111222', [linea(2, 'c')])]
+    assert agrupar_por_telefono(pacientes) == {'600111222': [linea(0, 'a'), linea(2, 'c')]}
@@ -0,0 +1,556 @@
+"""
+VERIFICACIÓN DIFERENCIAL DE LOS CAMINOS DE LECTURA
+Genera libros aleatorios (fechas de todo tipo, celdas vacías, fórmulas sin
+valor calculado, celdas combinadas, fotos dentro y fuera de su zona, hojas
+extra y cabeceras movidas) con las plantillas de alerta_medicamentos.py y de
+revisar_fechas.py, y comprueba que cada camino rápido (streaming, libro en
+memoria, índice en caché, todas las hojas, grafo de etapas, y el mismo libro
+exportado a CSV y ODS) devuelve exactamente las mismas alertas e información
+del paciente que leer_excel_y_buscar_alertas.
+
+Ese lector también es uno de los caminos optimizados, así que la mitad de los
+libros se generan solo con lo que entendía la versión original (fechas de
+Excel en las columnas fijas) y se contrastan además con una línea base
+independiente: openpyxl cargando el libro entero, como al principio, y las
+columnas J o I desde FILA_INICIO. Al final muestra cuánto tarda cada camino
+
+Uso:
+    python verificar_backends.py --libros 200 --semilla 7
+    python verificar_backends.py --plantilla revisar
+"""
+
+from datetime import datetime, timedelta
+import argparse
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+# Dónde pone cada script los datos del paciente y la tabla de medicamentos
+PLANTILLAS = {
+    'alerta': {'celdas': {'paciente': 'B5', 'responsable': 'B9', 'telefono': 'I9'}, 'cabecera': 17,
+               'columnas': {'medicamento': 'A', 'uso': 'B', 'fecha': 'J', 'auxiliar': 'H'}, 'fotos': True},
+    'revisar': {'celdas': {'paciente': 'B2', 'ubicacion': 'B3', 'telefono': 'I4'}, 'cabecera': 13,
+                'columnas': {'medicamento': 'A', 'uso': 'B', 'fecha': 'I', 'auxiliar': 'H'}, 'fotos': False},
+}
+
+MESES = ['enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio', 'julio',
+         'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre']
+
+def silenciar(*modulos):
+    """Los caminos se ejecutan cientos de veces: sin sus mensajes de progreso"""
+    for modulo in modulos:
+        modulo.log = lambda mensaje: None
+
+def valor_fecha(azar, hoy, fila, basico=False):
+    """
+    Contenido aleatorio para la celda de fecha de una fila (puede no ser una fecha).
+    basico: solo valores que la versión original ya trataba igual (sin texto, serie ni fórmula)
+    """
+    fecha = hoy + timedelta(days=azar.randint(-6, 12))
+    if basico:
+        tipos = ['datetime', 'datetime', 'datetime', 'vacia', 'blanco', 'palabra', 'cantidad']
+    else:
+        tipos = ['datetime', 'datetime', 'texto', 'texto_largo', 'serial', 'vacia',
+                 'blanco', 'palabra', 'cantidad', 'formula_celda', 'formula_hoy']
+    tipo = azar.choice(tipos)
+    if tipo == 'datetime':
+        return fecha
+    if tipo == 'texto':
+        return fecha.strftime('%d/%m/%Y')
+    if tipo == 'texto_largo':
+        return f"{fecha.day} de {MESES[fecha.month - 1]} de {fecha.year}"
+    if tipo == 'serial':
+        return (fecha.date() - datetime(1899, 12, 30).date()).days
+    if tipo == 'vacia':
+        return None
+    if tipo == 'blanco':
+        return '   '
+    if tipo == 'palabra':
+        return azar.choice(['pendiente', 'N/A', 'sin receta'])
+    if tipo == 'cantidad':
+        return azar.choice([3, 250, 1.5, 999999])
+    if tipo == 'formula_celda':
+        return f"=H{fila}+{azar.randint(0, 5)}"
+    return f"=TODAY()+{azar.randint(-2, 6)}"
+
+def foto(azar, tamano):
+    """Imagen PNG de un color al azar, lista para insertar con openpyxl"""
+    import io
+    from PIL import Image as ImagenPIL
+    from openpyxl.drawing.image import Image
+
+    datos = io.BytesIO()
+    ImagenPIL.new('RGB', tamano, tuple(azar.randint(0, 255) for _ in range(3))).save(datos, format='PNG')
+    return Image(datos)
+
+def rellenar_hoja(sheet, azar, hoy, filas, plantilla='alerta', basico=False):
+    """Escribe una hoja con la plantilla de alerta_medicamentos o de revisar_fechas y contenido aleatorio"""
+    datos = PLANTILLAS[plantilla]
+    for campo, celda in datos['celdas'].items():
+        if campo == 'paciente':
+            sheet[celda] = azar.choice(['MARIA DEL CARMEN CALDERON', 'José Núñez', 'PACIENTE 7'])
+        elif campo == 'telefono':
+            sheet[celda] = azar.choice(['611 131 467', '+34-611-131-467', 611131467, None])
+        else:
+            sheet[celda] = azar.choice(['OVIDIA RONDON', None, 'Planta 2'])
+
+    # Unas veces sin cabecera (columnas fijas), otras con la plantilla original o con columnas movidas;
+    # la línea base solo conoce las columnas fijas
+    disposicion = azar.choice(['fija', 'fija', 'cabecera'] + ([] if basico else ['movida']))
+    if disposicion == 'movida':
+        cabecera, columnas = 20, {'medicamento': 'C', 'uso': 'D', 'fecha': 'G', 'auxiliar': 'F'}
+        sheet['C20'], sheet['D20'], sheet['F20'], sheet['G20'] = 'Nombre del fármaco', 'Indicación', 'Fecha inicio', 'Próxima reposición'
+    else:
+        cabecera, columnas = datos['cabecera'], datos['columnas']
+        if disposicion == 'cabecera':
+            sheet[f"{columnas['medicamento']}{cabecera}"] = 'MEDICAMENTO'
+            sheet[f"{columnas['uso']}{cabecera}"] = 'USO'
+            sheet[f"{columnas['fecha']}{cabecera}"] = 'FECHA DE REVISIÓN'
+
+    for fila in range(cabecera + 1, cabecera + 1 + filas):
+        if azar.random() < 0.85:
+            sheet[f"{columnas['medicamento']}{fila}"] = f"MEDICAMENTO {azar.randint(1, 99)}"
+        if azar.random() < 0.7:
+            sheet[f"{columnas['uso']}{fila}"] = azar.choice(['TENSION', 'AZUCAR', 'DOLOR'])
+        sheet[f"{columnas['auxiliar']}{fila}"] = hoy + timedelta(days=azar.randint(-5, 5))
+        valor = valor_fecha(azar, hoy, fila, basico)
+        if isinstance(valor, str) and valor.startswith('=H'):
+            valor = valor.replace('=H', f"={columnas['auxiliar']}")
+        sheet[f"{columnas['fecha']}{fila}"] = valor
+
+    # Celdas combinadas: nombre y uso en una sola celda, o una fecha que ocupa dos filas
+    for _ in range(azar.randint(0, 3) if filas else 0):
+        fila = azar.randint(cabecera + 1, cabecera + filas)
+        if azar.random() < 0.5:
+            sheet.merge_cells(f"{columnas['medicamento']}{fila}:{columnas['uso']}{fila}")
+        elif fila < cabecera + filas:
+            sheet.merge_cells(f"{columnas['fecha']}{fila}:{columnas['fecha']}{fila + 1}")
+
+    # Fotos: dentro de la zona L5:N13, fuera de ella o ninguna
+    for ancla in azar.sample(['L6', 'M8', 'A1', 'P20'], azar.randint(0, 2) if datos['fotos'] else 0):
+        imagen = foto(azar, (azar.randint(50, 400), azar.randint(50, 400)))
+        imagen.anchor = ancla
+        sheet.add_image(imagen)
+
+def crear_libro_aleatorio(ruta, azar, filas_maximas, plantilla='alerta', basico=False):
+    """Libro con una o varias hojas de paciente y, a veces, hojas que no siguen la plantilla"""
+    import openpyxl
+
+    hoy = datetime.combine(datetime.today().date(), datetime.min.time())
+    workbook = openpyxl.Workbook()
+    rellenar_hoja(workbook.active, azar, hoy, azar.randint(0, filas_maximas), plantilla, basico)
+    for numero in range(azar.randint(0, 2)):
+        sheet = workbook.create_sheet(f"Extra {numero}")
+        if azar.random() < 0.5:
+            rellenar_hoja(sheet, azar, hoy, azar.randint(0, filas_maximas), plantilla, basico)
+        else:
+            sheet['A1'] = 'Notas'
+    workbook.active = azar.randrange(len(workbook.worksheets))
+    workbook.save(ruta)
+
+def valor_exportado(valor, sheet, hoy):
+    """Lo que escribe la hoja de cálculo al exportar: las fórmulas ya calculadas"""
+    if not isinstance(valor, str) or not valor.startswith('='):
+        return valor
+    encontrado = re.match(r'^=TODAY\(\)\+(-?\d+)$', valor)
+    if encontrado:
+        return hoy + timedelta(days=int(encontrado.group(1)))
+    encontrado = re.match(r'^=([A-Z]+\d+)\+(\d+)$', valor)
+    return sheet[encontrado.group(1)].value + timedelta(days=int(encontrado.group(2)))
+
+def filas_exportadas(sheet, hoy):
+    """Valores de la hoja fila a fila, como quedan al exportarla a CSV u ODS"""
+    filas = []
+    for fila in sheet.iter_rows(values_only=True):
+        # openpyxl no guarda el valor calculado de las fórmulas y el camino .xlsx solo evalúa las
+        # de filas con medicamento: en las demás la fórmula se exporta vacía, como la ve ese camino
+        con_medicamento = any(isinstance(valor, str) and valor.startswith('MEDICAMENTO ') for valor in fila)
+        filas.append([valor_exportado(valor, sheet, hoy) if con_medicamento or not str(valor).startswith('=') else None
+                      for valor in fila])
+    return filas
+
+def exportar_csv(ruta_xlsx, ruta_csv, azar):
+    """Hoja activa en CSV, con el separador, la codificación y el formato de fecha de distintas exportaciones"""
+    import csv
+    import openpyxl
+
+    hoy = datetime.combine(datetime.today().date(), datetime.min.time())
+    separador = azar.choice([';', ',', '\t'])
+    codificacion = azar.choice(['utf-8', 'utf-8-sig', 'cp1252'])
+    formato_fecha = azar.choice(['%d/%m/%Y', '%Y-%m-%d %H:%M:%S', '%d/%m/%Y %H:%M'])
+
+    def texto(valor):
+        if valor is None:
+            return ''
+        if isinstance(valor, datetime):
+            return valor.strftime(formato_fecha)
+        if isinstance(valor, float) and separador == ';':
+            return str(valor).replace('.', ',')
+        return str(valor)
+
+    workbook = openpyxl.load_workbook(ruta_xlsx)
+    with open(ruta_csv, 'w', encoding=codificacion, newline='') as archivo:
+        escritor = csv.writer(archivo, delimiter=separador)
+        for fila in filas_exportadas(workbook.active, hoy):
+            escritor.writerow([texto(valor) for valor in fila])
+
+def _celda_ods(valor, cubierta=False):
+    from xml.sax.saxutils import escape
+
+    etiqueta = 'table:covered-table-cell' if cubierta else 'table:table-cell'
+    if valor is None:
+        return f'<{etiqueta}/>'
+    if isinstance(valor, datetime):
+        return f'<{etiqueta} office:value-type="date" office:date-value="{valor.isoformat()}"><text:p>{valor:%d/%m/%Y}</text:p></{etiqueta}>'
+    if isinstance(valor, (int, float)):
+        return f'<{etiqueta} office:value-type="float" office:value="{valor!r}"><text:p>{valor}</text:p></{etiqueta}>'
+    if not valor.strip():
+        return f'<{etiqueta} office:value-type="string"><text:p><text:s text:c="{len(valor)}"/></text:p></{etiqueta}>'
+    return f'<{etiqueta} office:value-type="string"><text:p>{escape(valor)}</text:p></{etiqueta}>'
+
+def exportar_ods(ruta_xlsx, ruta_ods):
+    """Todas las hojas en un ODS escrito como LibreOffice: celdas y filas vacías repetidas y hoja activa en settings.xml"""
+    import zipfile
+    import openpyxl
+    from xml.sax.saxutils import quoteattr
+
+    hoy = datetime.combine(datetime.today().date(), datetime.min.time())
+    workbook = openpyxl.load_workbook(ruta_xlsx)
+    tablas = []
+    for sheet in workbook.worksheets:
+        cubiertas = {(fila, columna) for rango in sheet.merged_cells.ranges
+                     for fila, columna in rango.cells if (fila, columna) != (rango.min_row, rango.min_col)}
+        filas = []
+        for numero, valores in enumerate(filas_exportadas(sheet, hoy), 1):
+            if all(valor is None for valor in valores):
+                filas.append('<table:table-row table:number-rows-repeated="1"><table:table-cell table:number-columns-repeated="1024"/></table:table-row>')
+                continue
+            celdas = ''.join(_celda_ods(valor, (numero, columna) in cubiertas) for columna, valor in enumerate(valores, 1))
+            filas.append(f'<table:table-row>{celdas}<table:table-cell table:number-columns-repeated="1000"/></table:table-row>')
+        filas.append('<table:table-row table:number-rows-repeated="1048000"><table:table-cell table:number-columns-repeated="1024"/></table:table-row>')
+        tablas.append(f'<table:table table:name={quoteattr(sheet.title)}>{"".join(filas)}</table:table>')
+
+    espacios = ('xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+                'xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0" '
+                'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0" '
+                'xmlns:config="urn:oasis:names:tc:opendocument:xmlns:config:1.0"')
+    with zipfile.ZipFile(ruta_ods, 'w', zipfile.ZIP_DEFLATED) as archivo:
+        archivo.writestr(zipfile.ZipInfo('mimetype'), 'application/vnd.oasis.opendocument.spreadsheet')
+        archivo.writestr('content.xml', f'<?xml version="1.0" encoding="UTF-8"?><office:document-content {espacios}>'
+                                        f'<office:body><office:spreadsheet>{"".join(tablas)}</office:spreadsheet></office:body>'
+                                        '</office:document-content>')
+        archivo.writestr('settings.xml', f'<?xml version="1.0" encoding="UTF-8"?><office:document-settings {espacios}>'
+                                         '<office:settings><config:config-item-set config:name="ooo:view-settings">'
+                                         f'<config:config-item config:name="ActiveTable" config:type="string">{workbook.active.title}'
+                                         '</config:config-item></config:config-item-set></office:settings></office:document-settings>')
+
+def foto_con_openpyxl(ruta):
+    """Referencia independiente de la foto: openpyxl carga el libro y busca la imagen en la zona"""
+    import openpyxl
+    from imagenes_excel import COLUMNAS_FOTO, FILAS_FOTO
+
+    workbook = openpyxl.load_workbook(ruta)
+    try:
+        for imagen in workbook.active._images:
+            desde = imagen.anchor._from
+            if COLUMNAS_FOTO[0] <= desde.col <= COLUMNAS_FOTO[1] and FILAS_FOTO[0] <= desde.row <= FILAS_FOTO[1]:
+                return imagen._data()
+        return None
+    finally:
+        workbook.close()
+
+def linea_base(ruta, plantilla, fila_inicio, columnas, dias_alerta, incluir_ultimo_dia):
+    """
+    Referencia independiente de los caminos optimizados, como leían el Excel los
+    scripts originales: openpyxl carga el libro entero (sin read_only) y se
+    recorren las columnas fijas desde fila_inicio aceptando solo fechas de
+    Excel. Devuelve (alertas como tuplas, info_paciente)
+    """
+    import openpyxl
+    from openpyxl.utils.cell import column_index_from_string
+
+    workbook = openpyxl.load_workbook(ruta, data_only=True)
+    try:
+        sheet = workbook.active
+        info = {}
+        for campo, celda in PLANTILLAS[plantilla]['celdas'].items():
+            valor = sheet[celda].value
+            if campo == 'telefono':
+                info[campo] = str(valor).replace(" ", "").replace("-", "").replace("+", "") if valor else ""
+            else:
+                info[campo] = valor or ("No especificada" if campo == 'ubicacion' else "No especificado")
+
+        alertas = []
+        fecha_hoy = datetime.today().date()
+        for fila in range(fila_inicio, sheet.max_row + 1):
+            for letra in columnas:
+                valor = sheet.cell(row=fila, column=column_index_from_string(letra)).value
+                if not isinstance(valor, datetime):
+                    continue
+                dias_restantes = (valor.date() - fecha_hoy).days
+                if 0 <= dias_restantes and (dias_restantes <= dias_alerta if incluir_ultimo_dia else dias_restantes < dias_alerta):
+                    alerta = (fila, valor.date(), dias_restantes,
+                              str(sheet.cell(row=fila, column=1).value or "Medicamento sin nombre"),
+                              str(sheet.cell(row=fila, column=2).value or "Uso no especificado"))
+                    # revisar_fechas.py siempre indicó la columna; alerta_medicamentos.py nunca
+                    alertas.append(alerta + (letra,) if plantilla == 'revisar' else alerta)
+        return alertas, info
+    finally:
+        workbook.close()
+
+def comparable(alertas, info_paciente):
+    """Alertas como tuplas y la información del paciente sin la foto (que se compara aparte)"""
+    info = None if info_paciente is None else {clave: valor for clave, valor in info_paciente.items() if clave != 'imagen'}
+    return [tuple(alerta) for alerta in alertas], info
+
+def caminos(alerta_medicamentos, directorio_indices):
+    """
+    Cada camino devuelve (alertas, info_paciente sin foto o None si no la da, foto o
+    False si no la da). El primero es la referencia
+    """
+    from libro_memoria import LibroEnMemoria
+
+    am = alerta_medicamentos
+
+    def referencia(ruta):
+        alertas, info = am.leer_excel_y_buscar_alertas(ruta)
+        return (*comparable(alertas, info), info.get('imagen') if alertas else None)
+
+    def streaming(ruta):
+        # Las fechas de fórmula llegan al final: se comparan las mismas alertas sin mirar el orden
+        return sorted(tuple(alerta) for alerta in am.iterar_alertas_excel(ruta)), None, False
+
+    def en_memoria(ruta):
+        alertas, info = am.leer_excel_y_buscar_alertas(LibroEnMemoria.leer(ruta))
+        return (*comparable(alertas, info), info.get('imagen') if alertas else None)
+
+    ruta_indice = os.path.join(directorio_indices, 'indice.json')
+    ruta_indice_hojas = os.path.join(directorio_indices, 'indice_hojas.json')
+
+    def con_indice(ruta):
+        am.RUTA_INDICE = ruta_indice
+        filas, info, _ = am.flujo.obtener_filas(ruta)
+        alertas = am.filtrar_alertas(filas)
+        return (*comparable(alertas, info), am.extraer_imagen_paciente(ruta) if alertas else None)
+
+    def indice_nuevo(ruta):
+        # Sin índice previo: escanea el Excel y guarda el índice que usa el camino siguiente
+        if os.path.exists(ruta_indice):
+            os.remove(ruta_indice)
+        return con_indice(ruta)
+
+    def con_indice_hojas(ruta):
+        import openpyxl
+        workbook = openpyxl.load_workbook(ruta, read_only=True)
+        activa = workbook.active.title
+        workbook.close()
+
+        hojas, _ = am.flujo.obtener_hojas(ruta, ruta_indice_hojas)
+        hoja = next((hoja for hoja in hojas if hoja['hoja'] == activa), None)
+        if hoja is None:
+            # La hoja activa no sigue la plantilla: este camino no la escanea
+            return None
+        grafo = next((grafo for grafo in am.crear_grafos_hojas(ruta, hojas) if grafo['hoja'] == activa), None)
+        alertas = am.filtrar_alertas(hoja['filas'])
+        return (*comparable(alertas, hoja['info_paciente']), grafo['info_con_imagen']['imagen'] if grafo else None)
+
+    def todas_las_hojas(ruta):
+        if os.path.exists(ruta_indice_hojas):
+            os.remove(ruta_indice_hojas)
+        return con_indice_hojas(ruta)
+
+    def grafo_etapas(ruta):
+        filas, info = am.leer_excel_y_escanear_filas(ruta)
+        grafo = am.crear_grafo_etapas(ruta, filas, info)
+        alertas = grafo['alertas']
+        return (*comparable(alertas, info), grafo['info_con_imagen']['imagen'] if alertas else None)
+
+    def exportado(extension, todas_hojas=False):
+        # Mismas alertas y datos del paciente desde la exportación a CSV u ODS (sin foto)
+        def camino(ruta):
+            ruta_exportada = f"{os.path.splitext(ruta)[0]}{extension}"
+            if todas_hojas:
+                from tablas_csv_ods import hoja_activa_ods
+                activa = hoja_activa_ods(ruta_exportada)
+                hoja = next((hoja for hoja in am.leer_excel_todas_las_hojas(ruta_exportada) if hoja['hoja'] == activa), None)
+                if hoja is None:
+                    return None
+                return (*comparable(am.filtrar_alertas(hoja['filas']), hoja['info_paciente']), False)
+            alertas, info = am.leer_excel_y_buscar_alertas(ruta_exportada)
+            return (*comparable(alertas, info), False)
+        return camino
+
+    return [
+        ('referencia', referencia),
+        ('streaming', streaming),
+        ('libro en memoria', en_memoria),
+        ('índice nuevo', indice_nuevo),
+        ('índice en caché', con_indice),
+        ('todas las hojas', todas_las_hojas),
+        ('hojas en caché', con_indice_hojas),
+        ('grafo de etapas', grafo_etapas),
+        ('csv', exportado('.csv')),
+        ('ods', exportado('.ods')),
+        ('ods todas las hojas', exportado('.ods', todas_hojas=True)),
+    ]
+
+def caminos_revisar(revisar_fechas, directorio_indices):
+    """Los caminos de revisar_fechas.py, con el mismo formato que caminos(); esta plantilla no lleva foto"""
+    from libro_memoria import LibroEnMemoria
+
+    rf = revisar_fechas
+    ruta_indice = os.path.join(directorio_indices, 'indice_revisar.json')
+
+    def referencia(ruta):
+        return (*comparable(*rf.leer_excel_y_buscar_alertas(ruta)), False)
+
+    def streaming(ruta):
+        return sorted(tuple(alerta) for alerta in rf.iterar_alertas_excel(ruta)), None, False
+
+    def en_memoria(ruta):
+        return (*comparable(*rf.leer_excel_y_buscar_alertas(LibroEnMemoria.leer(ruta))), False)
+
+    def con_indice(ruta):
+        rf.RUTA_INDICE = ruta_indice
+        filas, info, _ = rf.flujo.obtener_filas(ruta)
+        return (*comparable(rf.filtrar_alertas(filas), info), False)
+
+    def indice_nuevo(ruta):
+        if os.path.exists(ruta_indice):
+            os.remove(ruta_indice)
+        return con_indice(ruta)
+
+    def exportado(extension):
+        def camino(ruta):
+            return (*comparable(*rf.leer_excel_y_buscar_alertas(f"{os.path.splitext(ruta)[0]}{extension}")), False)
+        return camino
+
+    return [
+        ('referencia', referencia),
+        ('streaming', streaming),
+        ('libro en memoria', en_memoria),
+        ('índice nuevo', indice_nuevo),
+        ('índice en caché', con_indice),
+        ('csv', exportado('.csv')),
+        ('ods', exportado('.ods')),
+    ]
+
+def diferencias(esperado, obtenido):
+    """Lista de diferencias legibles entre el resultado de referencia y el de un camino"""
+    nombres = ('alertas', 'info_paciente', 'foto')
+    resultado = []
+    for nombre, a, b in zip(nombres, esperado, obtenido):
+        if b is False or (b is None and nombre == 'info_paciente'):
+            continue
+        if a != b:
+            resultado.append(f"{nombre}: esperado {str(a)[:200]} / obtenido {str(b)[:200]}")
+    return resultado
+
+def verificar(libros, semilla, filas_maximas, plantillas=('alerta', 'revisar')):
+    """Genera los libros, ejecuta todos los caminos y devuelve el número de libros con diferencias"""
+    directorio = tempfile.mkdtemp(prefix='verificar_backends_')
+    # Índices, esquemas e historial de la verificación no se mezclan con los reales
+    os.environ['RUTA_ESQUEMAS'] = os.path.join(directorio, 'esquemas.json')
+    os.environ['RUTA_HISTORIAL'] = ''
+
+    import alerta_medicamentos
+    import esquema_columnas
+    import flujo_alertas
+    import formulas_fecha
+    import imagenes_excel
+    import revisar_fechas
+    silenciar(alerta_medicamentos, revisar_fechas, flujo_alertas, esquema_columnas, formulas_fecha, imagenes_excel)
+
+    am, rf = alerta_medicamentos, revisar_fechas
+    configuracion = {
+        'alerta': (am, caminos(am, directorio), (am.FILA_INICIO, ['J'], am.DIAS_ALERTA, False)),
+        'revisar': (rf, caminos_revisar(rf, directorio), (rf.FILA_INICIO, ['I'], rf.DIAS_ALERTA, True)),
+    }
+    azar = random.Random(semilla)
+    fallos = 0
+
+    try:
+        for plantilla in plantillas:
+            _, lista, parametros_base = configuracion[plantilla]
+            tiempos = {nombre: 0.0 for nombre, _ in lista}
+            tiempos['línea base'] = 0.0
+            fallos_plantilla = fotos_distintas = alertas_totales = fotos = comparados_base = 0
+
+            for numero in range(libros):
+                # La mitad de los libros, solo con lo que entendía la versión original
+                basico = numero % 2 == 0
+                ruta = os.path.join(directorio, f"{plantilla}_{numero}.xlsx")
+                crear_libro_aleatorio(ruta, azar, filas_maximas, plantilla, basico)
+                exportar_csv(ruta, ruta.replace('.xlsx', '.csv'), azar)
+                exportar_ods(ruta, ruta.replace('.xlsx', '.ods'))
+
+                resultados = {}
+                for nombre, camino in lista:
+                    inicio = time.perf_counter()
+                    resultados[nombre] = camino(ruta)
+                    tiempos[nombre] += time.perf_counter() - inicio
+
+                esperado = resultados['referencia']
+                alertas_totales += len(esperado[0])
+                fotos += esperado[2] not in (None, False)
+                problemas = [f"{nombre}: {diferencia}"
+                             for nombre, obtenido in resultados.items() if obtenido is not None and nombre not in ('referencia', 'streaming')
+                             for diferencia in diferencias(esperado, obtenido)]
+                problemas += [f"streaming: {diferencia}" for diferencia in
+                              diferencias((sorted(esperado[0]),) + esperado[1:], resultados['streaming'])]
+
+                if basico:
+                    inicio = time.perf_counter()
+                    base = linea_base(ruta, plantilla, *parametros_base)
+                    tiempos['línea base'] += time.perf_counter() - inicio
+                    comparados_base += 1
+                    # Esperado lo que da la línea base; la foto ya se contrasta aparte con openpyxl
+                    problemas += [f"línea base: {diferencia}" for diferencia in diferencias(base, esperado[:2])]
+
+                if PLANTILLAS[plantilla]['fotos']:
+                    # La foto de referencia también se contrasta con la búsqueda de openpyxl
+                    datos = foto_con_openpyxl(ruta)
+                    foto_openpyxl = am.imagen_a_base64(datos) if datos and esperado[0] else None
+                    if foto_openpyxl != esperado[2]:
+                        fotos_distintas += 1
+                        problemas.append("foto: la lectura del zip no coincide con openpyxl")
+
+                if problemas:
+                    fallos_plantilla += 1
+                    copia = f"fallo_{plantilla}_{semilla}_{numero}.xlsx"
+                    shutil.copy(ruta, copia)
+                    print(f"✗ Libro {numero} de {plantilla} (guardado en {copia}):")
+                    for problema in problemas:
+                        print(f"    {problema}")
+
+            fallos += fallos_plantilla
+            print(f"\n[{plantilla}] {libros} libros aleatorios (semilla {semilla}): {libros - fallos_plantilla} idénticos, "
+                  f"{fallos_plantilla} con diferencias" + (f" ({fotos_distintas} por la foto)" if fotos_distintas else ""))
+            print(f"Comparadas {alertas_totales} alertas y {fotos} fotos; {comparados_base} libros también con la línea base")
+            base = tiempos['referencia']
+            for nombre, segundos in tiempos.items():
+                veces = libros if nombre != 'línea base' else max(comparados_base, 1)
+                print(f"  {nombre:<18} {segundos / veces * 1000:8.1f} ms/libro  {base / libros / (segundos / veces) if segundos else 0:5.2f}x")
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    return fallos
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--libros', type=int, default=50, help="Libros aleatorios a generar")
+    parser.add_argument('--semilla', type=int, default=0, help="Semilla para repetir una misma serie de libros")
+    parser.add_argument('--filas', type=int, default=40, help="Filas de medicamentos máximas por hoja")
+    parser.add_argument('--plantilla', choices=sorted(PLANTILLAS), help="Verificar solo una de las dos plantillas")
+    args = parser.parse_args()
+
+    plantillas = [args.plantilla] if args.plantilla else list(PLANTILLAS)
+    sys.exit(1 if verificar(args.libros, args.semilla, args.filas, plantillas) else 0)
+
+if __name__ == "__main__":
+    main()
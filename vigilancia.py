@@ -0,0 +1,111 @@
+"""
+VIGILANCIA DEL EXCEL EN DISCO
+Usa inotify (Linux) para reaccionar en cuanto se guarda el archivo, sin sondeo
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+import zipfile
+
+from bitacora import log
+
+# Eventos de inotify (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+
+# Ráfagas de escritura más cercanas que esto se agrupan en un solo cambio
+ESPERA_RAFAGA = 0.25
+ESPERA_ZIP_MAXIMA = 5.0
+
+_EVENTO = struct.Struct('iIII')
+
+def _iniciar_inotify(directorio):
+    """Crea el descriptor de inotify vigilando el directorio del archivo"""
+    libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    if not hasattr(libc, 'inotify_init1'):
+        raise OSError("inotify no está disponible en este sistema (solo Linux)")
+
+    descriptor = libc.inotify_init1(os.O_CLOEXEC)
+    if descriptor < 0:
+        raise OSError(ctypes.get_errno(), "No se pudo iniciar inotify")
+
+    # Se vigila el directorio porque Excel y LibreOffice guardan en un temporal y renombran
+    mascara = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+    if libc.inotify_add_watch(descriptor, os.fsencode(directorio), mascara) < 0:
+        os.close(descriptor)
+        raise OSError(ctypes.get_errno(), f"No se pudo vigilar {directorio}")
+    return descriptor
+
+def _eventos_del_archivo(datos, nombre):
+    """Indica si algún evento leído de inotify corresponde al archivo vigilado"""
+    desplazamiento = 0
+    while desplazamiento < len(datos):
+        _, _, _, longitud = _EVENTO.unpack_from(datos, desplazamiento)
+        inicio = desplazamiento + _EVENTO.size
+        nombre_evento = datos[inicio:inicio + longitud].rstrip(b'\0')
+        if nombre_evento == nombre:
+            return True
+        desplazamiento = inicio + longitud
+    return False
+
+def esperar_zip_completo(ruta, espera_maxima=ESPERA_ZIP_MAXIMA):
+    """Espera a que el .xlsx esté escrito del todo (tamaño estable y directorio zip legible)"""
+    limite = time.monotonic() + espera_maxima
+    tamano_anterior = -1
+    while time.monotonic() < limite:
+        try:
+            tamano = os.path.getsize(ruta)
+            if tamano == tamano_anterior and zipfile.is_zipfile(ruta):
+                with zipfile.ZipFile(ruta) as archivo_zip:
+                    if '[Content_Types].xml' in archivo_zip.namelist():
+                        return True
+            tamano_anterior = tamano
+        except (OSError, zipfile.BadZipFile):
+            tamano_anterior = -1
+        time.sleep(0.05)
+    return False
+
+def vigilar_archivo(ruta, al_cambiar, espera_rafaga=ESPERA_RAFAGA):
+    """Llama a al_cambiar(ruta) cada vez que el archivo termina de guardarse"""
+    ruta = os.path.abspath(ruta)
+    nombre = os.fsencode(os.path.basename(ruta))
+    descriptor = _iniciar_inotify(os.path.dirname(ruta))
+
+    try:
+        while True:
+            select.select([descriptor], [], [])
+            if not _eventos_del_archivo(os.read(descriptor, 64 * 1024), nombre):
+                continue
+
+            # Agrupar la ráfaga de escrituras de un mismo guardado
+            while select.select([descriptor], [], [], espera_rafaga)[0]:
+                os.read(descriptor, 64 * 1024)
+
+            if not esperar_zip_completo(ruta):
+                log(f"⚠️ {os.path.basename(ruta)} no terminó de guardarse, se espera al siguiente cambio")
+                continue
+
+            # Un archivo que desaparece o un zip corrupto no deben terminar la vigilancia
+            try:
+                al_cambiar(ruta)
+            except Exception as e:
+                log(f"❌ Error al revisar {os.path.basename(ruta)}: {e}")
+    finally:
+        os.close(descriptor)
+
+def clave_alerta(alerta):
+    """Identifica una alerta entre dos escaneos del mismo archivo"""
+    return (alerta['fila'], alerta.get('columna'), alerta['fecha'], alerta['medicamento'])
+
+def comparar_alertas(anteriores, actuales):
+    """Devuelve (nuevas, resueltas) entre dos listas de alertas"""
+    claves_anteriores = {clave_alerta(alerta) for alerta in anteriores}
+    claves_actuales = {clave_alerta(alerta) for alerta in actuales}
+    nuevas = [alerta for alerta in actuales if clave_alerta(alerta) not in claves_anteriores]
+    resueltas = [alerta for alerta in anteriores if clave_alerta(alerta) not in claves_actuales]
+    return nuevas, resueltas
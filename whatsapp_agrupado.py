@@ -0,0 +1,84 @@
+"""
+WHATSAPP AGRUPADO POR TELÉFONO
+Cuando un mismo teléfono (un cuidador) tiene varios pacientes con alertas,
+junta todas sus alertas, ordenadas por urgencia, en los menos mensajes
+posibles sin pasar del límite de longitud del proveedor
+"""
+
+from urllib.parse import quote
+import os
+
+# Longitud máxima de cada mensaje una vez codificado: CallMeBot recibe el texto
+# en la URL, donde un emoji ocupa 12 caracteres, una tilde 6 y un espacio 3
+LIMITE_WHATSAPP = int(os.environ.get('LIMITE_WHATSAPP', '1500'))
+# Lo más largo que puede ocupar un carácter codificado (4 bytes UTF-8)
+MAXIMO_CARACTER = 12
+
+def longitud_url(texto):
+    """Longitud del texto codificado para la URL, que es lo que cuenta para el límite"""
+    return len(quote(texto, safe=''))
+
+SEPARADOR = longitud_url('\n')
+ESPACIO = longitud_url(' ')
+
+def agrupar_por_telefono(pacientes):
+    """[(teléfono, líneas)] -> {teléfono: líneas de todos sus pacientes}; sin teléfono no se agrupa nada"""
+    por_telefono = {}
+    for telefono, lineas in pacientes:
+        if telefono:
+            por_telefono.setdefault(str(telefono), []).extend(lineas)
+    return por_telefono
+
+def trocear(texto, espacio):
+    """Parte una línea que no cabe en un mensaje en trozos que sí, cortando por espacios si se puede"""
+    trozos, actual, usado = [], [], 0
+    for palabra in texto.split(' '):
+        longitud = longitud_url(palabra)
+        if actual and usado + ESPACIO + longitud > espacio:
+            trozos.append(' '.join(actual))
+            actual, usado = [], 0
+        if longitud <= espacio:
+            usado += (ESPACIO if actual else 0) + longitud
+            actual.append(palabra)
+            continue
+        # Una palabra que no cabe sola se corta por caracteres
+        letras, usado_palabra = '', 0
+        for letra in palabra:
+            longitud_letra = longitud_url(letra)
+            if usado_palabra + longitud_letra > espacio:
+                trozos.append(letras)
+                letras, usado_palabra = '', 0
+            letras += letra
+            usado_palabra += longitud_letra
+        actual, usado = [letras], usado_palabra
+    if actual:
+        trozos.append(' '.join(actual))
+    return trozos
+
+def empaquetar(lineas, cabecera, limite=LIMITE_WHATSAPP):
+    """
+    lineas = [(días restantes, fecha ISO, texto)]; cabecera(parte, partes) da el
+    encabezado de cada mensaje. Devuelve los textos, con lo más urgente primero.
+    Las longitudes se miden ya codificadas para la URL; una línea que no cabe
+    en un mensaje se reparte en varias en lugar de recortarse
+    """
+    ordenadas = [texto for _, _, texto in sorted(lineas, key=lambda linea: (linea[0], linea[1]))]
+    # Se reserva sitio para la cabecera más larga posible antes de saber cuántas partes habrá.
+    # Al trocear puede haber más líneas que alertas: se mide con un número de partes holgado
+    maximo_partes = sum(longitud_url(texto) for texto in ordenadas) + len(ordenadas)
+    espacio = max(MAXIMO_CARACTER, limite - longitud_url(cabecera(maximo_partes, maximo_partes)))
+
+    partes, actual, usado = [], [], 0
+    for texto in ordenadas:
+        longitud = longitud_url(texto)
+        for trozo in (trocear(texto, espacio) if longitud > espacio else [texto]):
+            longitud = longitud_url(trozo)
+            if actual and usado + SEPARADOR + longitud > espacio:
+                partes.append(actual)
+                actual, usado = [], 0
+            usado += (SEPARADOR if actual else 0) + longitud
+            actual.append(trozo)
+    if actual:
+        partes.append(actual)
+
+    return [cabecera(numero, len(partes)) + '\n'.join(parte) for numero, parte in enumerate(partes, 1)]